@@ -0,0 +1,302 @@
+import asyncio
+import ipaddress
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from metricas import Histograma, _rotulos, metricas
+
+# Controle de admissão das requisições (ver MiddlewareAdmissao), configurável pelo .env
+# ADMISSAO_ATIVA: liga/desliga todo o controle
+# LIMITE_RELATOS_POR_MINUTO / LIMITE_RELATOS_RAJADA: balde de tokens de cada IP no envio de relatos (um token por relato)
+# ADMISSAO_PROXIES_CONFIAVEIS: IPs ou redes (ex.: "10.0.0.0/8,127.0.0.1") dos proxies cujo X-Forwarded-For é
+# aceito; vazio usa sempre o endereço da conexão (o cabeçalho pode ser forjado por qualquer cliente)
+# LIMITE_LEITURAS_SIMULTANEAS / LIMITE_ESCRITAS_SIMULTANEAS: requisições em execução por classe; a soma
+# não deve passar de DB_POOL_SIZE + DB_MAX_OVERFLOW, para que as escritas nunca tomem as conexões das leituras
+# ESPERA_MAXIMA_*_S: tempo máximo na fila por uma vaga antes do 503; FILA_MAXIMA_*: requisições esperando
+# PRIORIDADE_ESPERA_MAXIMA_S: quanto um job de gamificação espera enquanto há leituras na fila
+ADMISSAO_ATIVA = os.getenv("ADMISSAO_ATIVA", "true").lower() in ("1", "true", "sim", "yes")
+LIMITE_RELATOS_POR_MINUTO = float(os.getenv("LIMITE_RELATOS_POR_MINUTO", "30"))
+LIMITE_RELATOS_RAJADA = float(os.getenv("LIMITE_RELATOS_RAJADA", "10"))
+ADMISSAO_PROXIES_CONFIAVEIS = [
+    ipaddress.ip_network(rede.strip(), strict=False)
+    for rede in os.getenv("ADMISSAO_PROXIES_CONFIAVEIS", "").split(",") if rede.strip()
+]
+LIMITE_LEITURAS_SIMULTANEAS = int(os.getenv("LIMITE_LEITURAS_SIMULTANEAS", "10"))
+LIMITE_ESCRITAS_SIMULTANEAS = int(os.getenv("LIMITE_ESCRITAS_SIMULTANEAS", "5"))
+ESPERA_MAXIMA_LEITURA_S = float(os.getenv("ESPERA_MAXIMA_LEITURA_S", "5"))
+ESPERA_MAXIMA_ESCRITA_S = float(os.getenv("ESPERA_MAXIMA_ESCRITA_S", "2"))
+FILA_MAXIMA_LEITURA = int(os.getenv("FILA_MAXIMA_LEITURA", "200"))
+FILA_MAXIMA_ESCRITA = int(os.getenv("FILA_MAXIMA_ESCRITA", "50"))
+PRIORIDADE_ESPERA_MAXIMA_S = float(os.getenv("PRIORIDADE_ESPERA_MAXIMA_S", "2"))
+
+# Retry-After (s) sugerido quando a requisição é recusada por sobrecarga
+RETRY_AFTER_SOBRECARGA_S = 2
+
+# Chaves (IPs) guardadas no balde de tokens; as menos recentes são descartadas
+MAX_CHAVES_BALDE = 100000
+
+# Envio de um relato, limitado por IP; POST /alertas/lote é cobrado pela rota, um token por item (cobrar_relatos)
+ROTAS_RELATOS = {("POST", "/alertas/")}
+
+# Rotas fora do limite de concorrência: conexões longas (SSE) e as de observação do próprio servidor
+ROTAS_SEM_LIMITE = {"/", "/metrics", "/jobs/status", "/alertas/stream"}
+
+METODOS_LEITURA = {"GET", "HEAD", "OPTIONS"}
+
+
+class Recusada(Exception):
+    def __init__(self, motivo):
+        super().__init__(motivo)
+        self.motivo = motivo
+
+
+class BaldeTokens:
+    """Balde de tokens por chave (IP): `rajada` envios seguidos e depois `por_minuto`.
+
+    Cada chave guarda só (tokens, instante da última leitura); a reposição é calculada na hora.
+    Um custo maior que a rajada (lote grande) é aceito com o balde cheio e deixa o saldo
+    negativo: a chave só volta a enviar depois de repor o que usou a mais.
+    """
+
+    def __init__(self, por_minuto, rajada, max_chaves=MAX_CHAVES_BALDE):
+        self.por_segundo = por_minuto / 60.0
+        self.rajada = rajada
+        self.max_chaves = max_chaves
+        self._baldes = OrderedDict()
+        self._lock = threading.Lock()
+        self.recusados = 0
+
+    def __len__(self):
+        return len(self._baldes)
+
+    def consumir(self, chave, custo=1.0, agora=None):
+        """Retorna 0 se o envio foi aceito, senão os segundos até haver tokens suficientes."""
+        agora = time.monotonic() if agora is None else agora
+        with self._lock:
+            tokens, ultimo = self._baldes.pop(chave, (self.rajada, agora))
+            tokens = min(self.rajada, tokens + (agora - ultimo) * self.por_segundo)
+            necessario = min(custo, self.rajada)
+            if tokens >= necessario:
+                tokens -= custo
+                espera = 0.0
+            else:
+                espera = (necessario - tokens) / self.por_segundo if self.por_segundo > 0 else math.inf
+                self.recusados += 1
+            self._baldes[chave] = (tokens, agora)
+            if len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+        return espera
+
+
+class LimitadorConcorrencia:
+    """Limite de requisições em execução de uma classe, com fila de espera limitada.
+
+    Quem não consegue vaga espera até `espera_maxima` segundos; com a fila cheia ou o tempo
+    esgotado a requisição é recusada (Recusada). Usado só no loop do servidor, sem locks.
+    """
+
+    def __init__(self, nome, limite, espera_maxima, fila_maxima):
+        self.nome = nome
+        self.limite = limite
+        self.espera_maxima = espera_maxima
+        self.fila_maxima = fila_maxima
+        self.em_uso = 0
+        self._fila = deque() # Futures de quem espera, na ordem de chegada
+        self.admitidas = 0
+        self.recusadas = {"fila_cheia": 0, "tempo_esgotado": 0}
+        self.espera = Histograma()
+
+    @property
+    def na_fila(self):
+        return len(self._fila)
+
+    @property
+    def saturado(self):
+        return self.em_uso >= self.limite or bool(self._fila)
+
+    async def entrar(self):
+        if self.em_uso < self.limite and not self._fila:
+            self.em_uso += 1
+            self._admitir(0.0)
+            return
+        if len(self._fila) >= self.fila_maxima:
+            self.recusadas["fila_cheia"] += 1
+            raise Recusada("fila_cheia")
+
+        inicio = time.perf_counter()
+        futuro = asyncio.get_running_loop().create_future()
+        self._fila.append(futuro)
+        try:
+            await asyncio.wait_for(futuro, self.espera_maxima)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as erro:
+            if futuro.done() and not futuro.cancelled():
+                # A vaga chegou junto com o fim do prazo: devolver em vez de perdê-la
+                self.sair()
+            else:
+                try:
+                    self._fila.remove(futuro)
+                except ValueError:
+                    pass
+            if isinstance(erro, asyncio.CancelledError):
+                raise
+            self.recusadas["tempo_esgotado"] += 1
+            raise Recusada("tempo_esgotado")
+        self._admitir(time.perf_counter() - inicio)
+
+    def sair(self):
+        # A vaga passa direto para o próximo da fila (em_uso não muda)
+        while self._fila:
+            futuro = self._fila.popleft()
+            if not futuro.done():
+                futuro.set_result(None)
+                return
+        self.em_uso -= 1
+
+    def _admitir(self, espera):
+        self.admitidas += 1
+        self.espera.observar(espera)
+
+
+balde_relatos = BaldeTokens(LIMITE_RELATOS_POR_MINUTO, LIMITE_RELATOS_RAJADA)
+limitador_leituras = LimitadorConcorrencia("leitura", LIMITE_LEITURAS_SIMULTANEAS, ESPERA_MAXIMA_LEITURA_S, FILA_MAXIMA_LEITURA)
+limitador_escritas = LimitadorConcorrencia("escrita", LIMITE_ESCRITAS_SIMULTANEAS, ESPERA_MAXIMA_ESCRITA_S, FILA_MAXIMA_ESCRITA)
+
+# Jobs de gamificação adiados para dar passagem às leituras
+jobs_adiados = 0
+
+
+def ceder_para_leituras(espera_maxima=PRIORIDADE_ESPERA_MAXIMA_S):
+    """Chamado pelos workers da fila de jobs (threads): espera enquanto há leituras na fila.
+
+    As leituras têm prioridade sobre as escritas de gamificação, que não têm pressa; depois
+    de `espera_maxima` o job segue assim mesmo, para não ficar parado durante um pico longo.
+    """
+    global jobs_adiados
+    if not ADMISSAO_ATIVA or not limitador_leituras.na_fila:
+        return
+    jobs_adiados += 1
+    limite = time.monotonic() + espera_maxima
+    while limitador_leituras.na_fila and time.monotonic() < limite:
+        time.sleep(0.05)
+
+
+def _proxy_confiavel(endereco, proxies=ADMISSAO_PROXIES_CONFIAVEIS):
+    try:
+        ip = ipaddress.ip_address(endereco)
+    except ValueError:
+        return False
+    return any(ip in rede for rede in proxies)
+
+
+def chave_cliente(scope, proxies=ADMISSAO_PROXIES_CONFIAVEIS):
+    # Endereço da conexão; o X-Forwarded-For só vale se ela vier de um proxy confiável. A lista é lida
+    # da direita para a esquerda (cada proxy acrescenta quem o chamou): o primeiro salto que não é um
+    # proxy confiável é o cliente; o que vem antes dele pode ter sido inventado pelo próprio cliente
+    cliente = scope.get("client")
+    endereco = cliente[0] if cliente else "desconhecido"
+    if not _proxy_confiavel(endereco, proxies):
+        return "ip:" + endereco
+    saltos = [
+        salto.strip()
+        for nome, valor in scope["headers"] if nome == b"x-forwarded-for"
+        for salto in valor.decode("latin-1").split(",") if salto.strip()
+    ]
+    for salto in reversed(saltos):
+        if not _proxy_confiavel(salto, proxies):
+            return "ip:" + salto
+    return "ip:" + (saltos[0] if saltos else endereco)
+
+
+def cobrar_relatos(scope, quantidade):
+    """Desconta `quantidade` relatos do balde do cliente; retorna 0 ou os segundos até poder enviar."""
+    if not ADMISSAO_ATIVA:
+        return 0.0
+    return balde_relatos.consumir(chave_cliente(scope), quantidade)
+
+
+async def _recusar(send, status, detalhe, retry_after):
+    corpo = json.dumps({"detail": detalhe}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(corpo)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+class MiddlewareAdmissao:
+    """Middleware ASGI de controle de admissão.
+
+    Envio de relatos: balde de tokens por IP (429 + Retry-After ao esgotar).
+    Todas as rotas (menos ROTAS_SEM_LIMITE): leituras e escritas em limitadores separados,
+    então um pico de relatos não ocupa as vagas (e as conexões do banco) das leituras;
+    sem vaga dentro do prazo, 503 + Retry-After.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSAO_ATIVA or scope["path"] in ROTAS_SEM_LIMITE:
+            return await self.app(scope, receive, send)
+
+        metodo = scope["method"]
+        if (metodo, scope["path"]) in ROTAS_RELATOS:
+            espera = cobrar_relatos(scope, 1)
+            if espera > 0:
+                return await _recusar(send, 429, "Muitos relatos em pouco tempo; tente novamente em instantes", espera)
+
+        limitador = limitador_leituras if metodo in METODOS_LEITURA else limitador_escritas
+        try:
+            await limitador.entrar()
+        except Recusada:
+            return await _recusar(send, 503, "Servidor sobrecarregado; tente novamente em instantes", RETRY_AFTER_SOBRECARGA_S)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limitador.sair()
+
+
+def _exportar_metricas():
+    linhas = []
+    limitadores = (limitador_leituras, limitador_escritas)
+    for titulo, tipo, leitura in (
+        ("rede_alerta_admissao_em_execucao", "gauge", lambda limitador: limitador.em_uso),
+        ("rede_alerta_admissao_na_fila", "gauge", lambda limitador: limitador.na_fila),
+        ("rede_alerta_admissao_limite", "gauge", lambda limitador: limitador.limite),
+        ("rede_alerta_admissao_admitidas_total", "counter", lambda limitador: limitador.admitidas),
+    ):
+        linhas.append(f"# TYPE {titulo} {tipo}")
+        for limitador in limitadores:
+            linhas.append(f"{titulo}{{{_rotulos(classe=limitador.nome)}}} {leitura(limitador)}")
+
+    linhas.append("# HELP rede_alerta_admissao_recusadas_total Requisições recusadas por classe e motivo")
+    linhas.append("# TYPE rede_alerta_admissao_recusadas_total counter")
+    for limitador in limitadores:
+        for motivo, total in limitador.recusadas.items():
+            linhas.append(f"rede_alerta_admissao_recusadas_total{{{_rotulos(classe=limitador.nome, motivo=motivo)}}} {total}")
+    linhas.append(
+        f"rede_alerta_admissao_recusadas_total{{{_rotulos(classe='relatos', motivo='limite_usuario')}}} {balde_relatos.recusados}"
+    )
+
+    linhas.append("# HELP rede_alerta_admissao_espera_segundos Tempo na fila até conseguir vaga")
+    linhas.append("# TYPE rede_alerta_admissao_espera_segundos histogram")
+    for limitador in limitadores:
+        metricas._histograma_texto("rede_alerta_admissao_espera_segundos", _rotulos(classe=limitador.nome), limitador.espera, linhas)
+
+    linhas.append("# TYPE rede_alerta_admissao_chaves_balde gauge")
+    linhas.append(f"rede_alerta_admissao_chaves_balde {len(balde_relatos)}")
+    linhas.append("# TYPE rede_alerta_admissao_jobs_adiados_total counter")
+    linhas.append(f"rede_alerta_admissao_jobs_adiados_total {jobs_adiados}")
+    return linhas
+
+
+metricas.coletores.append(_exportar_metricas)
@@ -0,0 +1,47 @@
+"""Ambiente compartilhado pelos benchmarks: banco SQLite temporário com os dados iniciais."""
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+# Permitir "import main", "import database" etc. a partir da pasta benchmarks/
+PASTA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PASTA_BACKEND not in sys.path:
+    sys.path.insert(0, PASTA_BACKEND)
+
+def preparar_api(caminho_banco=None, criar_tabelas=True):
+    """Aponta a API para um SQLite em arquivo (WAL), cria as tabelas e devolve o módulo main.
+
+    Com criar_tabelas=False apenas reaproveita um banco já preparado (ex.: em outro processo).
+    """
+    if caminho_banco is None:
+        caminho_banco = os.path.join(tempfile.mkdtemp(prefix="rede_alerta_bench_"), "bench.db")
+
+    import database
+    import metricas
+
+    url = f"sqlite:///{caminho_banco}"
+    database.engine = create_engine(
+        url,
+        **database.opcoes_engine(url, metricas.PoolMedido),
+    )
+    metricas.instrumentar_engine("sync", database.engine)
+    database.configurar_sqlite(database.engine)
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=database.engine)
+    database.async_engine = create_async_engine(
+        database.url_assincrona(url), **database.opcoes_engine(url, metricas.PoolAssincronoMedido)
+    )
+    metricas.instrumentar_engine("async", database.async_engine.sync_engine)
+    database.configurar_sqlite(database.async_engine.sync_engine)
+    database.AsyncSessionLocal = async_sessionmaker(
+        database.async_engine, autocommit=False, autoflush=False, expire_on_commit=False
+    )
+    if criar_tabelas:
+        database.inicializar_sqlite(database.engine)
+
+    # main importa SessionLocal e AsyncSessionLocal diretamente, então precisa ser importado depois da troca
+    import main
+    return main
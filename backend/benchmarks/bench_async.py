@@ -0,0 +1,156 @@
+"""Carga sobre a leitura de alertas nos modos síncrono (def + SessionLocal) e assíncrono
+(async def + AsyncSessionLocal), com muitos clientes simultâneos.
+
+Cada modo sobe um servidor uvicorn em um processo separado, com a mesma consulta
+(GET /alertas/{id}), e o cliente dispara as requisições com httpx.AsyncClient.
+--atraso-ms simula a latência de rede de um round trip ao Oracle: no modo síncrono
+ela prende uma thread do threadpool; no assíncrono, o worker atende outras requisições.
+
+Uso: python benchmarks/bench_async.py [--clientes 500] [--requisicoes 20000] [--atraso-ms 20]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from _ambiente import preparar_api
+
+PORTA_BASE = 8650
+
+
+def criar_app(modo, atraso_s):
+    import database
+    import models
+    from fastapi import Depends, FastAPI, HTTPException
+
+    app = FastAPI()
+
+    if modo == "sync":
+        @app.get("/alertas/{alerta_id}")
+        def read_alerta(alerta_id: int, db=Depends(database.get_db)):
+            if atraso_s:
+                time.sleep(atraso_s)
+            alerta = db.get(models.Alerta, alerta_id)
+            if alerta is None:
+                raise HTTPException(status_code=404)
+            return {"id": alerta.id, "tipo": alerta.tipo, "status": alerta.status}
+    else:
+        @app.get("/alertas/{alerta_id}")
+        async def read_alerta(alerta_id: int, db=Depends(database.get_async_db)):
+            if atraso_s:
+                await asyncio.sleep(atraso_s)
+            alerta = await db.get(models.Alerta, alerta_id)
+            if alerta is None:
+                raise HTTPException(status_code=404)
+            return {"id": alerta.id, "tipo": alerta.tipo, "status": alerta.status}
+
+    return app
+
+
+def rodar_servidor(modo, caminho_banco, porta, atraso_s):
+    import contextlib
+    import io
+    import uvicorn
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        preparar_api(caminho_banco, criar_tabelas=False)
+    uvicorn.run(criar_app(modo, atraso_s), host="127.0.0.1", port=porta, log_level="warning")
+
+
+def popular(caminho_banco, quantidade):
+    import database
+    import models
+
+    agora = datetime.now()
+    with database.engine.begin() as conexao:
+        conexao.execute(models.Alerta.__table__.insert(), [
+            {"titulo": f"Alerta {i}", "tipo": "Enchente", "descricao": "Benchmark", "latitude": -23.5,
+             "longitude": -46.6, "status": "Em análise", "data_ocorrencia": agora, "usuario_id": 1}
+            for i in range(quantidade)
+        ])
+
+
+async def disparar(porta, clientes, requisicoes, total_alertas):
+    latencias = []
+    restantes = requisicoes
+    erros = 0
+    limites = httpx.Limits(max_connections=clientes, max_keepalive_connections=clientes)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{porta}", limits=limites, timeout=60) as cliente:
+        async def trabalhador():
+            nonlocal restantes, erros
+            while restantes > 0:
+                restantes -= 1
+                inicio = time.perf_counter()
+                try:
+                    resposta = await cliente.get(f"/alertas/{random.randint(1, total_alertas)}")
+                except httpx.TransportError:
+                    erros += 1
+                    continue
+                latencias.append(time.perf_counter() - inicio)
+                if resposta.status_code != 200:
+                    erros += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(clientes)))
+        duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    quantis = statistics.quantiles(latencias, n=100)
+    return {
+        "rps": len(latencias) / duracao,
+        "p50_ms": quantis[49] * 1000,
+        "p99_ms": quantis[98] * 1000,
+        "erros": erros,
+    }
+
+
+def esperar_servidor(porta, limite_s=30):
+    fim = time.time() + limite_s
+    while time.time() < fim:
+        try:
+            httpx.get(f"http://127.0.0.1:{porta}/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Servidor na porta {porta} não respondeu")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=500)
+    parser.add_argument("--requisicoes", type=int, default=20000)
+    parser.add_argument("--alertas", type=int, default=10000)
+    parser.add_argument("--atraso-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    caminho_banco = os.path.join(tempfile.mkdtemp(prefix="rede_alerta_bench_"), "bench.db")
+    preparar_api(caminho_banco)
+    popular(caminho_banco, args.alertas)
+
+    print(f"{args.clientes} clientes, {args.requisicoes} requisições, atraso simulado {args.atraso_ms} ms")
+    for deslocamento, modo in enumerate(["sync", "async"]):
+        porta = PORTA_BASE + deslocamento
+        processo = multiprocessing.Process(
+            target=rodar_servidor, args=(modo, caminho_banco, porta, args.atraso_ms / 1000), daemon=True
+        )
+        processo.start()
+        try:
+            esperar_servidor(porta)
+            resultado = asyncio.run(disparar(porta, args.clientes, args.requisicoes, args.alertas))
+        finally:
+            processo.terminate()
+            processo.join()
+        print(f"  {modo:5s}: {resultado['rps']:9.1f} req/s  p50 {resultado['p50_ms']:8.1f} ms  "
+              f"p99 {resultado['p99_ms']:8.1f} ms  erros {resultado['erros']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Latência do índice de busca textual (busca.IndiceBusca) com muitos alertas sintéticos.
+
+Monta o índice em memória com títulos e descrições gerados a partir de um vocabulário
+de ocorrências e mede a latência (mediana e p95) de consultas com termos raros, comuns,
+combinados e com filtros de status, tipo e área.
+
+Uso: python benchmarks/bench_busca.py [--alertas 1000000] [--repeticoes 50]
+"""
+import argparse
+import random
+import statistics
+import time
+
+import _ambiente  # noqa: F401 (coloca a pasta backend no sys.path)
+from busca import IndiceBusca
+
+TIPOS = ["Enchente", "Deslizamento", "Incêndio", "Queda de árvore", "Buraco na via", "Falta de energia"]
+STATUS = ["Em análise", "Em andamento", "Resolvido"]
+PALAVRAS = (
+    "rua avenida praça esquina ponte viaduto córrego rio bueiro calçada poste fiação árvore galho "
+    "muro casa escola hospital ônibus carro moto trânsito água lama fogo fumaça barranco encosta "
+    "alagamento alagada entupido caída caiu queimando bloqueada interditada perigo urgente moradores "
+    "crianças idosos noite manhã chuva forte vento desabou rachadura vazamento esgoto buraco enorme"
+).split()
+RARAS = ["tamanduá", "capivara", "jacaré", "helicóptero", "transformador"]
+
+
+def gerar_texto(aleatorio, minimo, maximo):
+    palavras = aleatorio.choices(PALAVRAS, k=aleatorio.randint(minimo, maximo))
+    if aleatorio.random() < 0.001:
+        palavras.append(aleatorio.choice(RARAS))
+    return " ".join(palavras)
+
+
+def medir(indice, repeticoes, **consulta):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultados = indice.buscar(**consulta)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return statistics.median(tempos), tempos[int(len(tempos) * 0.95) - 1], len(resultados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--alertas", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(42)
+    indice = IndiceBusca()
+    inicio = time.perf_counter()
+    for alerta_id in range(1, args.alertas + 1):
+        indice.adicionar(
+            alerta_id,
+            gerar_texto(aleatorio, 2, 4),
+            gerar_texto(aleatorio, 5, 15),
+            aleatorio.choice(STATUS),
+            aleatorio.choice(TIPOS),
+            -23.55 + aleatorio.uniform(-0.5, 0.5),
+            -46.63 + aleatorio.uniform(-0.5, 0.5),
+        )
+    print(f"{args.alertas} alertas indexados em {time.perf_counter() - inicio:.1f} s")
+
+    consultas = [
+        ("termo raro", {"consulta": "capivara"}),
+        ("termo raro + comum", {"consulta": "capivara rua"}),
+        ("dois termos comuns", {"consulta": "bueiro entupido"}),
+        ("três termos comuns", {"consulta": "árvore caída fiação"}),
+        ("comuns + status/tipo", {"consulta": "bueiro entupido", "status": "Em análise", "tipo": "Enchente"}),
+        ("comuns + área", {"consulta": "bueiro entupido", "caixa": (-23.6, -46.7, -23.5, -46.6)}),
+        ("um termo comum", {"consulta": "rua"}),
+    ]
+    for nome, consulta in consultas:
+        mediana, p95, quantidade = medir(indice, args.repeticoes, limite=50, **consulta)
+        print(f"  {nome:22s} mediana {mediana:8.2f} ms  p95 {p95:8.2f} ms  ({quantidade} resultados)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,554 @@
+"""Carga sobre todas as rotas da API, com um banco SQLite de milhões de alertas.
+
+Popula (uma vez) um SQLite com --alertas alertas, --usuarios usuários com conquistas e uma
+grade de --regioes regiões com os alertas já associados; cada execução trabalha numa cópia,
+então o banco semeado pode ser reaproveitado com --banco. A API (main.app) sobe num processo
+uvicorn separado, com a fila de jobs e o arquivo histórico em pastas temporárias.
+
+Cada rota de main.py tem um cenário, disparado com --clientes requisições simultâneas até
+completar --requisicoes; os cenários rodam em grupos (leitura, escrita, remoção e, por último,
+manutenção, com poucas requisições e um cliente só). Para cada rota são informados req/s,
+p50/p95/p99, erros e as consultas SQL por requisição e suspeitas de N+1 (de /metrics,
+ver rastreamento.py).
+
+--salvar-baseline NOME grava o resultado em benchmarks/baselines/NOME.json; --comparar NOME
+compara com esse arquivo e termina com código 1 se alguma rota piorou mais que --tolerancia
+(p95 maior ou req/s menor). Baselines só são comparáveis na mesma máquina e configuração.
+
+Uso: python benchmarks/bench_carga.py [--alertas 2000000] [--usuarios 5000] [--clientes 50]
+       [--requisicoes 2000] [--rotas alertas,usuarios] [--banco /tmp/carga.db]
+       [--salvar-baseline local | --comparar local] [--tolerancia 0.2]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+import _ambiente
+
+PORTA = 8670
+PASTA_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Área dos alertas sintéticos (São Paulo) e a grade de regiões sobre ela
+MIN_LAT, MIN_LON, MAX_LAT, MAX_LON = -23.80, -46.85, -23.35, -46.35
+TIPOS = ["Enchente", "Deslizamento", "Incêndio", "Queda de árvore", "Buraco na via", "Falta de energia"]
+STATUS = ["Em análise"] * 5 + ["Validado"] * 2 + ["Em andamento"] + ["Resolvido"] * 2
+PALAVRAS = ["rua", "alagada", "árvore", "caída", "fogo", "barranco", "poste", "buraco", "ponte", "córrego"]
+DIAS_HISTORICO = 365
+LINHAS_POR_LOTE_INSERT = 50000
+
+# Requisições por cenário de manutenção (rotas administrativas que percorrem a tabela inteira)
+REQUISICOES_MANUTENCAO = 3
+
+
+# --- Banco semeado ---
+
+def dimensao_grade(regioes):
+    colunas = max(1, int(regioes ** 0.5))
+    return colunas, max(1, regioes // colunas)
+
+
+def poligono(min_lat, min_lon, max_lat, max_lon):
+    return {"type": "Polygon", "coordinates": [[
+        [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]
+    ]]}
+
+
+def popular(alertas, usuarios, regioes):
+    import database
+    import estatisticas
+    from espacial import codificar_geohash
+
+    aleatorio = random.Random(42)
+    agora = datetime.now()
+    colunas, linhas_grade = dimensao_grade(regioes)
+    passo_lat = (MAX_LAT - MIN_LAT) / linhas_grade
+    passo_lon = (MAX_LON - MIN_LON) / colunas
+
+    inicio = time.perf_counter()
+    with database.engine.begin() as conexao:
+        conexao.exec_driver_sql(
+            "INSERT INTO usuarios (id, nome, email, senha_hashed, nivel, pontos) VALUES (?, ?, ?, ?, ?, ?)",
+            [(i, f"Usuário {i}", f"usuario{i}@carga.local", "x", 1, aleatorio.randint(0, 5000))
+             for i in range(2, usuarios + 2)]
+        )
+        conexao.exec_driver_sql(
+            "INSERT OR IGNORE INTO usuario_conquistas (usuario_id, conquista_id, data_conquista) VALUES (?, ?, ?)",
+            [(aleatorio.randint(1, usuarios + 1), aleatorio.randint(1, 8), agora) for _ in range(usuarios * 2)]
+        )
+        conexao.exec_driver_sql(
+            "INSERT INTO regioes (id, nome, geometria) VALUES (?, ?, ?)",
+            [(linha * colunas + coluna + 1, f"Região {linha}-{coluna}", json.dumps(poligono(
+                MIN_LAT + linha * passo_lat, MIN_LON + coluna * passo_lon,
+                MIN_LAT + (linha + 1) * passo_lat, MIN_LON + (coluna + 1) * passo_lon,
+            ))) for linha in range(linhas_grade) for coluna in range(colunas)]
+        )
+
+        for primeiro in range(1, alertas + 1, LINHAS_POR_LOTE_INSERT):
+            lote, associacoes, relatos = [], [], []
+            for alerta_id in range(primeiro, min(primeiro + LINHAS_POR_LOTE_INSERT, alertas + 1)):
+                latitude = aleatorio.uniform(MIN_LAT, MAX_LAT)
+                longitude = aleatorio.uniform(MIN_LON, MAX_LON)
+                data = agora - timedelta(seconds=aleatorio.randint(0, DIAS_HISTORICO * 86400))
+                anexados = 2 if aleatorio.random() < 0.01 else 0
+                lote.append((
+                    alerta_id, f"Alerta {alerta_id}", aleatorio.choice(TIPOS),
+                    " ".join(aleatorio.sample(PALAVRAS, 4)), latitude, longitude, aleatorio.choice(STATUS),
+                    data, aleatorio.randint(1, usuarios + 1), codificar_geohash(latitude, longitude),
+                    1 + anexados, alerta_id,
+                ))
+                linha = min(int((latitude - MIN_LAT) / passo_lat), linhas_grade - 1)
+                coluna = min(int((longitude - MIN_LON) / passo_lon), colunas - 1)
+                associacoes.append((alerta_id, linha * colunas + coluna + 1))
+                relatos.extend(
+                    (alerta_id, aleatorio.randint(1, usuarios + 1), "Relato anexado", "", latitude, longitude, data)
+                    for _ in range(anexados)
+                )
+            conexao.exec_driver_sql(
+                "INSERT INTO alertas (id, titulo, tipo, descricao, latitude, longitude, status, data_ocorrencia,"
+                " usuario_id, geocelula, relatos, versao) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                lote
+            )
+            conexao.exec_driver_sql("INSERT INTO alerta_regiao (alerta_id, regiao_id) VALUES (?, ?)", associacoes)
+            if relatos:
+                conexao.exec_driver_sql(
+                    "INSERT INTO alerta_relatos (alerta_id, usuario_id, titulo, descricao, latitude, longitude,"
+                    " data_relato) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    relatos
+                )
+            print(f"\r  {min(primeiro + LINHAS_POR_LOTE_INSERT - 1, alertas)} alertas", end="", flush=True)
+
+    with database.SessionLocal() as db:
+        estatisticas.reconstruir(db)
+    with database.engine.begin() as conexao:
+        conexao.exec_driver_sql("ANALYZE")
+    print(f"\r  {alertas} alertas, {usuarios} usuários e {colunas * linhas_grade} regiões em "
+          f"{time.perf_counter() - inicio:.0f} s")
+
+
+def preparar_banco(args):
+    """Devolve o caminho de uma cópia de trabalho do banco semeado (semeando-o se preciso)."""
+    semeado = args.banco or os.path.join(tempfile.mkdtemp(prefix="rede_alerta_carga_"), "carga.db")
+    if not os.path.exists(semeado):
+        print(f"Populando {semeado}")
+        _ambiente.preparar_api(semeado)
+        popular(args.alertas, args.usuarios, args.regioes)
+        import database
+        database.engine.dispose()
+        with database.engine.begin() as conexao:
+            conexao.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        database.engine.dispose()
+    trabalho = semeado + ".execucao"
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(trabalho + sufixo):
+            os.remove(trabalho + sufixo)
+    shutil.copyfile(semeado, trabalho)
+    return trabalho
+
+
+def contar_banco(caminho):
+    import sqlite3
+    conexao = sqlite3.connect(caminho)
+    try:
+        alertas = conexao.execute("SELECT max(id) FROM alertas").fetchone()[0] or 0
+        usuarios = conexao.execute("SELECT max(id) FROM usuarios").fetchone()[0] or 0
+        regioes = conexao.execute("SELECT max(id) FROM regioes").fetchone()[0] or 0
+    finally:
+        conexao.close()
+    return alertas, usuarios, regioes
+
+
+# --- Servidor ---
+
+def configurar_ambiente(pasta, admissao):
+    """Variáveis lidas pelos módulos da API no import; valem também para o processo do servidor."""
+    os.environ.setdefault("ADMISSAO_ATIVA", "true" if admissao else "false")
+    os.environ.setdefault("FILA_JOBS_ARQUIVO", os.path.join(pasta, "fila_jobs.db"))
+    os.environ.setdefault("ARQUIVO_HISTORICO_DIR", os.path.join(pasta, "historico"))
+    os.environ.setdefault("ARQUIVAMENTO_INTERVALO_H", "0")
+    os.environ.setdefault("RASTREAMENTO_ARQUIVO", os.path.join(pasta, "rastros.jsonl"))
+
+
+def rodar_servidor(caminho_banco, porta):
+    import contextlib
+    import io
+    import uvicorn
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        main = _ambiente.preparar_api(caminho_banco, criar_tabelas=False)
+    uvicorn.run(main.app, host="127.0.0.1", port=porta, log_level="warning")
+
+
+def esperar_servidor(porta, limite_s):
+    fim = time.time() + limite_s
+    while time.time() < fim:
+        try:
+            httpx.get(f"http://127.0.0.1:{porta}/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Servidor na porta {porta} não respondeu em {limite_s} s")
+
+
+# --- Cenários ---
+
+class Contexto:
+    """Faixas de IDs de cada cenário: as remoções usam IDs reservados, que as outras rotas não tocam."""
+
+    def __init__(self, alertas, usuarios, regioes, requisicoes):
+        self.usuarios = usuarios
+        self.regioes = regioes
+        self.remover_um = alertas - requisicoes          # DELETE /alertas/{id}: um ID por requisição
+        self.remover_lote = self.remover_um - 10 * requisicoes  # DELETE /alertas: 10 IDs por requisição
+        self.alertas = self.remover_lote                  # Leituras e escritas: 1..alertas
+        self.usuarios_criados = []
+        self.regioes_criadas = []
+
+    def alerta(self):
+        return random.randint(1, self.alertas)
+
+    def usuario(self):
+        return random.randint(1, self.usuarios)
+
+    def ponto(self):
+        return random.uniform(MIN_LAT, MAX_LAT), random.uniform(MIN_LON, MAX_LON)
+
+    def caixa(self, lado):
+        latitude, longitude = self.ponto()
+        return latitude, longitude, latitude + lado, longitude + lado
+
+    def data(self):
+        return (datetime.now() - timedelta(days=random.randint(1, DIAS_HISTORICO))).replace(microsecond=0)
+
+    def relato(self):
+        latitude, longitude = self.ponto()
+        return {"titulo": "Carga", "tipo": random.choice(TIPOS), "descricao": " ".join(random.sample(PALAVRAS, 4)),
+                "latitude": latitude, "longitude": longitude}
+
+
+class Cenario:
+    def __init__(self, metodo, rota, grupo, montar, esperados=(200,), apos=None, stream=False):
+        self.metodo = metodo
+        self.rota = rota        # Molde da rota, como aparece em /metrics
+        self.grupo = grupo
+        self.montar = montar    # (contexto, índice) -> (url, argumentos do httpx)
+        self.esperados = set(esperados)
+        self.apos = apos        # (contexto, resposta) chamado em cada resposta esperada
+        self.stream = stream    # Só mede até os cabeçalhos da resposta (conexões longas)
+
+    @property
+    def nome(self):
+        return f"{self.metodo} {self.rota}"
+
+
+def _guardar(lista):
+    def guardar(contexto, resposta):
+        getattr(contexto, lista).append(resposta.json()["id"])
+    return guardar
+
+
+def _caixa_texto(caixa):
+    return ",".join(f"{valor:.5f}" for valor in caixa)
+
+
+GRUPOS = ["leitura", "escrita", "remocao", "manutencao"]
+
+CENARIOS = [
+    # Leituras
+    Cenario("GET", "/", "leitura", lambda c, i: ("/", {})),
+    Cenario("GET", "/metrics", "leitura", lambda c, i: ("/metrics", {})),
+    Cenario("GET", "/jobs/status", "leitura", lambda c, i: ("/jobs/status", {})),
+    Cenario("GET", "/alertas/", "leitura", lambda c, i: ("/alertas/", {"params": random.choice([
+        {}, {"tipo": random.choice(TIPOS)}, {"status": random.choice(STATUS)},
+        {"desde": c.data().isoformat(), "limit": 50},
+    ])})),
+    Cenario("GET", "/alertas/export", "leitura", lambda c, i: (lambda desde: ("/alertas/export", {"params": {
+        "formato": random.choice(["ndjson", "csv"]), "desde": desde.isoformat(),
+        "ate": (desde + timedelta(hours=1)).isoformat(),
+    }}))(c.data())),
+    Cenario("GET", "/alertas/stream", "leitura", lambda c, i: ("/alertas/stream", {}), stream=True),
+    Cenario("GET", "/alertas/proximos", "leitura", lambda c, i: (lambda ponto: ("/alertas/proximos", {"params": {
+        "lat": ponto[0], "lon": ponto[1], "raio_km": random.choice([0.5, 1, 2]), "limit": 100,
+    }}))(c.ponto())),
+    Cenario("GET", "/alertas/area", "leitura", lambda c, i: (lambda caixa: ("/alertas/area", {"params": {
+        "min_lat": caixa[0], "min_lon": caixa[1], "max_lat": caixa[2], "max_lon": caixa[3], "limit": 100,
+    }}))(c.caixa(0.02))),
+    Cenario("GET", "/alertas/clusters", "leitura", lambda c, i: (lambda zoom: ("/alertas/clusters", {"params": {
+        "zoom": zoom, "bbox": _caixa_texto(c.caixa(0.8 / 2 ** (zoom - 10))),
+    }}))(random.randint(10, 16))),
+    Cenario("GET", "/alertas/busca", "leitura", lambda c, i: ("/alertas/busca", {"params": {
+        "q": " ".join(random.sample(PALAVRAS, 2)), "limit": 20,
+    }})),
+    Cenario("GET", "/alertas/historico", "leitura", lambda c, i: ("/alertas/historico", {"params": {"limit": 50}})),
+    Cenario("GET", "/alertas/estatisticas", "leitura", lambda c, i: ("/alertas/estatisticas", {})),
+    Cenario("GET", "/alertas/sync", "leitura", lambda c, i: ("/alertas/sync", {"params": {
+        "desde": random.randint(0, c.alertas), "limit": 500,
+    }})),
+    Cenario("GET", "/alertas/{alerta_id}", "leitura", lambda c, i: (f"/alertas/{c.alerta()}", {})),
+    Cenario("GET", "/alertas/{alerta_id}/relatos", "leitura", lambda c, i: (f"/alertas/{c.alerta()}/relatos", {})),
+    Cenario("GET", "/usuarios/", "leitura", lambda c, i: ("/usuarios/", {"params": {
+        "skip": random.randint(0, c.usuarios), "limit": 50,
+    }})),
+    Cenario("GET", "/usuarios/{usuario_id}", "leitura", lambda c, i: (f"/usuarios/{c.usuario()}", {})),
+    Cenario("GET", "/usuarios/{usuario_id}/perfil", "leitura", lambda c, i: (f"/usuarios/{c.usuario()}/perfil", {})),
+    Cenario("GET", "/usuarios/{usuario_id}/ranking", "leitura",
+            lambda c, i: (f"/usuarios/{c.usuario()}/ranking", {}), esperados=(200, 404)),
+    Cenario("GET", "/ranking", "leitura", lambda c, i: ("/ranking", {"params": random.choice([
+        {"offset": random.randint(0, c.usuarios)}, {"regiao_id": random.randint(1, c.regioes)},
+    ])})),
+    Cenario("GET", "/regioes/", "leitura", lambda c, i: ("/regioes/", {})),
+    Cenario("GET", "/regioes/{regiao_id}", "leitura", lambda c, i: (f"/regioes/{random.randint(1, c.regioes)}", {})),
+    Cenario("GET", "/regioes/{regiao_id}/alertas", "leitura",
+            lambda c, i: (f"/regioes/{random.randint(1, c.regioes)}/alertas", {})),
+    Cenario("GET", "/conquistas/", "leitura", lambda c, i: ("/conquistas/", {})),
+
+    # Escritas
+    Cenario("POST", "/alertas/", "escrita", lambda c, i: ("/alertas/", {"json": c.relato()})),
+    Cenario("POST", "/alertas/lote", "escrita", lambda c, i: ("/alertas/lote", {"json": [c.relato() for _ in range(20)]})),
+    Cenario("PUT", "/alertas/{alerta_id}/status", "escrita", lambda c, i: (f"/alertas/{c.alerta()}/status", {
+        "json": {"status": random.choice(STATUS)},
+    })),
+    Cenario("PUT", "/alertas/status", "escrita", lambda c, i: ("/alertas/status", {
+        "json": {"ids": [c.alerta() for _ in range(10)], "status": random.choice(STATUS)},
+    })),
+    Cenario("POST", "/usuarios/", "escrita", lambda c, i: ("/usuarios/", {"json": {
+        "nome": f"Carga {i}", "email": f"carga{i}.{random.getrandbits(32)}@carga.local", "senha": "x",
+    }}), apos=_guardar("usuarios_criados")),
+    Cenario("PUT", "/usuarios/{usuario_id}", "escrita", lambda c, i: (f"/usuarios/{c.usuario()}", {"json": {
+        "nome": f"Usuário {i}", "email": f"atualizado{i}.{random.getrandbits(32)}@carga.local", "senha": "x",
+    }})),
+    Cenario("POST", "/usuarios/{usuario_id}/pontos", "escrita",
+            lambda c, i: (f"/usuarios/{c.usuario()}/pontos", {"params": {"pontos": 10}})),
+    Cenario("POST", "/usuarios/{usuario_id}/conquistas/{conquista_id}", "escrita",
+            lambda c, i: (f"/usuarios/{c.usuario()}/conquistas/{random.randint(1, 8)}", {}), esperados=(200, 400)),
+    Cenario("POST", "/regioes/", "escrita", lambda c, i: ("/regioes/", {"json": {
+        "nome": f"Carga {i} {random.getrandbits(32)}", "geometria": poligono(*c.caixa(0.02)),
+    }}), apos=_guardar("regioes_criadas")),
+    Cenario("PUT", "/regioes/{regiao_id}", "escrita",
+            lambda c, i: (f"/regioes/{random.choice(c.regioes_criadas)}", {"json": {
+                "nome": f"Carga alterada {i} {random.getrandbits(32)}", "geometria": poligono(*c.caixa(0.02)),
+            }})),
+
+    # Remoções (IDs reservados ou criados pelos cenários de escrita)
+    Cenario("DELETE", "/alertas/{alerta_id}", "remocao", lambda c, i: (f"/alertas/{c.remover_um + 1 + i}", {})),
+    Cenario("DELETE", "/alertas", "remocao", lambda c, i: ("/alertas", {
+        "json": {"ids": list(range(c.remover_lote + 1 + 10 * i, c.remover_lote + 11 + 10 * i))},
+    })),
+    Cenario("DELETE", "/usuarios/{usuario_id}", "remocao",
+            lambda c, i: (f"/usuarios/{c.usuarios_criados[i]}", {}), esperados=(200, 404)),
+    Cenario("DELETE", "/regioes/{regiao_id}", "remocao",
+            lambda c, i: (f"/regioes/{c.regioes_criadas[i]}", {}), esperados=(200, 404)),
+
+    # Manutenção: percorrem a tabela inteira, com poucas requisições e um cliente só
+    Cenario("POST", "/conquistas/recarregar", "manutencao", lambda c, i: ("/conquistas/recarregar", {})),
+    Cenario("POST", "/alertas/estatisticas/reconstruir", "manutencao",
+            lambda c, i: ("/alertas/estatisticas/reconstruir", {})),
+    Cenario("POST", "/alertas/historico/arquivar", "manutencao", lambda c, i: ("/alertas/historico/arquivar", {})),
+]
+
+
+async def disparar(cliente, cenario, contexto, clientes, requisicoes):
+    latencias = []
+    erros = 0
+    proximo = 0
+
+    async def trabalhador():
+        nonlocal erros, proximo
+        while proximo < requisicoes:
+            indice = proximo
+            proximo += 1
+            try:
+                url, argumentos = cenario.montar(contexto, indice)
+            except IndexError:
+                return # Acabaram os IDs criados pelo cenário de escrita correspondente
+            inicio = time.perf_counter()
+            try:
+                if cenario.stream:
+                    async with cliente.stream(cenario.metodo, url, **argumentos) as resposta:
+                        pass
+                else:
+                    resposta = await cliente.request(cenario.metodo, url, **argumentos)
+            except httpx.TransportError:
+                erros += 1
+                continue
+            latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code not in cenario.esperados:
+                erros += 1
+            elif cenario.apos is not None:
+                cenario.apos(contexto, resposta)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(clientes)))
+    duracao = time.perf_counter() - inicio
+    if len(latencias) < 2:
+        latencias = latencias * 2 or [0.0, 0.0]
+    quantis = statistics.quantiles(sorted(latencias), n=100, method="inclusive")
+    return {
+        "requisicoes": len(latencias),
+        "rps": round(len(latencias) / duracao, 1),
+        "p50_ms": round(quantis[49] * 1000, 2),
+        "p95_ms": round(quantis[94] * 1000, 2),
+        "p99_ms": round(quantis[98] * 1000, 2),
+        "erros": erros,
+    }
+
+
+def ler_metricas(texto):
+    """Requisições, consultas SQL e suspeitas de N+1 por rota, a partir do /metrics."""
+    por_rota = {}
+    padrao = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+    for linha in texto.splitlines():
+        encontrado = padrao.match(linha)
+        if encontrado is None:
+            continue
+        nome, rotulos, valor = encontrado.groups()
+        rotulos = dict(re.findall(r'(\w+)="([^"]*)"', rotulos))
+        if nome == "rede_alerta_http_requisicao_segundos_count":
+            por_rota.setdefault(f"{rotulos['metodo']} {rotulos['rota']}", {})["total"] = float(valor)
+        elif nome == "rede_alerta_db_consultas_total":
+            por_rota.setdefault(f"{rotulos['metodo']} {rotulos['rota']}", {})["consultas"] = float(valor)
+        elif nome == "rede_alerta_n_mais_1_total" and rotulos.get("tipo") == "http":
+            por_rota.setdefault(rotulos["nome"], {})["n_mais_1"] = int(float(valor))
+    return por_rota
+
+
+async def executar(args, contexto):
+    resultados = {}
+    limites = httpx.Limits(max_connections=args.clientes, max_keepalive_connections=args.clientes)
+    filtros = [filtro for filtro in args.rotas.split(",") if filtro] if args.rotas else []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORTA}", limits=limites, timeout=600) as cliente:
+        for grupo in GRUPOS:
+            for cenario in CENARIOS:
+                if cenario.grupo != grupo or (filtros and not any(filtro in cenario.rota for filtro in filtros)):
+                    continue
+                if grupo == "manutencao":
+                    clientes, requisicoes = 1, REQUISICOES_MANUTENCAO
+                else:
+                    clientes, requisicoes = args.clientes, args.requisicoes
+                resultado = await disparar(cliente, cenario, contexto, clientes, requisicoes)
+                resultados[cenario.nome] = resultado
+                print(f"  {cenario.nome:52s} {resultado['rps']:9.1f} req/s  p50 {resultado['p50_ms']:8.2f}  "
+                      f"p95 {resultado['p95_ms']:8.2f}  p99 {resultado['p99_ms']:8.2f} ms  erros {resultado['erros']}")
+
+        metricas = ler_metricas((await cliente.get("/metrics")).text)
+    for nome, resultado in resultados.items():
+        rota = metricas.get(nome, {})
+        if rota.get("total"):
+            resultado["consultas_por_requisicao"] = round(rota.get("consultas", 0) / rota["total"], 2)
+        resultado["n_mais_1"] = rota.get("n_mais_1", 0)
+    return resultados
+
+
+# --- Baselines ---
+
+def caminho_baseline(nome):
+    return os.path.join(PASTA_BASELINES, f"{nome}.json")
+
+
+def comparar(resultados, baseline, tolerancia):
+    """Rotas que pioraram além da tolerância em relação ao baseline (p95 ou req/s)."""
+    regressoes = []
+    print(f"\nComparação com o baseline (tolerância {tolerancia:.0%})")
+    for nome, atual in resultados.items():
+        anterior = baseline["rotas"].get(nome)
+        if anterior is None:
+            continue
+        variacao_p95 = atual["p95_ms"] / anterior["p95_ms"] - 1 if anterior["p95_ms"] else 0.0
+        variacao_rps = atual["rps"] / anterior["rps"] - 1 if anterior["rps"] else 0.0
+        piorou = variacao_p95 > tolerancia or variacao_rps < -tolerancia
+        if atual.get("consultas_por_requisicao", 0) > anterior.get("consultas_por_requisicao", 0) * (1 + tolerancia) + 0.5:
+            piorou = True # Mais consultas por requisição é regressão mesmo que o tempo não tenha mudado
+        print(f"  {'REGRESSÃO' if piorou else 'ok':9s} {nome:52s} p95 {variacao_p95:+7.1%}  req/s {variacao_rps:+7.1%}  "
+              f"consultas {anterior.get('consultas_por_requisicao', '-')} -> {atual.get('consultas_por_requisicao', '-')}")
+        if piorou:
+            regressoes.append(nome)
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alertas", type=int, default=2_000_000)
+    parser.add_argument("--usuarios", type=int, default=5000)
+    parser.add_argument("--regioes", type=int, default=100)
+    parser.add_argument("--clientes", type=int, default=50)
+    parser.add_argument("--requisicoes", type=int, default=2000, help="requisições por rota")
+    parser.add_argument("--rotas", default="", help="só as rotas que contêm um destes trechos (separados por vírgula)")
+    parser.add_argument("--banco", help="SQLite semeado a reaproveitar (criado se não existir)")
+    parser.add_argument("--admissao", action="store_true", help="manter o controle de admissão (429/503) ligado")
+    parser.add_argument("--espera-servidor-s", type=float, default=900, help="tempo máximo para a API carregar os índices")
+    parser.add_argument("--salvar-baseline", metavar="NOME")
+    parser.add_argument("--comparar", metavar="NOME")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="rede_alerta_carga_execucao_")
+    configurar_ambiente(pasta, args.admissao)
+    caminho_banco = preparar_banco(args)
+    alertas, usuarios, regioes = contar_banco(caminho_banco)
+    contexto = Contexto(alertas, usuarios, regioes, args.requisicoes)
+    if contexto.alertas < 1:
+        sys.exit(f"O banco tem {alertas} alertas: poucos para {args.requisicoes} requisições por rota")
+
+    processo = multiprocessing.Process(target=rodar_servidor, args=(caminho_banco, PORTA), daemon=True)
+    processo.start()
+    try:
+        inicio = time.perf_counter()
+        esperar_servidor(PORTA, args.espera_servidor_s)
+        print(f"API pronta em {time.perf_counter() - inicio:.1f} s ({alertas} alertas, {usuarios} usuários, {regioes} regiões); "
+              f"{args.clientes} clientes, {args.requisicoes} requisições por rota")
+        resultados = asyncio.run(executar(args, contexto))
+    finally:
+        processo.terminate()
+        processo.join()
+
+    suspeitas = {nome: resultado["n_mais_1"] for nome, resultado in resultados.items() if resultado["n_mais_1"]}
+    if suspeitas:
+        print("\nRotas com suspeita de N+1 (detalhes em " + os.path.join(pasta, "rastros.jsonl") + "):")
+        for nome, total in suspeitas.items():
+            print(f"  {nome}: {total} requisições")
+
+    registro = {
+        "configuracao": {
+            "alertas": alertas, "usuarios": usuarios, "regioes": regioes,
+            "clientes": args.clientes, "requisicoes": args.requisicoes, "admissao": args.admissao,
+        },
+        "ambiente": {
+            "python": platform.python_version(), "plataforma": platform.platform(),
+            "processador": platform.processor() or platform.machine(), "cpus": os.cpu_count(),
+        },
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "rotas": resultados,
+    }
+
+    codigo = 0
+    if args.comparar:
+        with open(caminho_baseline(args.comparar), encoding="utf-8") as arquivo:
+            baseline = json.load(arquivo)
+        if baseline["configuracao"] != registro["configuracao"] or baseline["ambiente"] != registro["ambiente"]:
+            print("Aviso: configuração ou máquina diferente da do baseline; a comparação é só indicativa")
+        regressoes = comparar(resultados, baseline, args.tolerancia)
+        if regressoes:
+            print(f"{len(regressoes)} rota(s) com regressão")
+            codigo = 1
+    if args.salvar_baseline:
+        os.makedirs(PASTA_BASELINES, exist_ok=True)
+        with open(caminho_baseline(args.salvar_baseline), "w", encoding="utf-8") as arquivo:
+            json.dump(registro, arquivo, ensure_ascii=False, indent=2)
+        print(f"Baseline gravado em {caminho_baseline(args.salvar_baseline)}")
+    sys.exit(codigo)
+
+
+if __name__ == "__main__":
+    main()
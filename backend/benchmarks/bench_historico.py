@@ -0,0 +1,96 @@
+"""Latência das consultas ao arquivo histórico (historico.ArquivoHistorico) com milhões de alertas.
+
+Grava segmentos sintéticos distribuídos por --meses meses numa pasta temporária e mede a
+latência (mediana e p95) de GET /alertas/historico sem filtros e com filtros de período,
+tipo e área, além do tamanho em disco por alerta.
+
+Uso: python benchmarks/bench_historico.py [--alertas 2000000] [--meses 24] [--repeticoes 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import _ambiente  # noqa: F401 (coloca a pasta backend no sys.path)
+from historico import ArquivoHistorico, gravar_segmento
+
+TIPOS = ["Enchente", "Deslizamento", "Incêndio", "Queda de árvore", "Buraco na via", "Falta de energia"]
+SEGMENTOS_POR_MES = 4
+
+
+def popular(pasta, alertas, meses):
+    aleatorio = random.Random(42)
+    inicio = datetime(2022, 1, 1)
+    por_segmento = max(1, alertas // (meses * SEGMENTOS_POR_MES))
+    proximo_id = 1
+    for mes in range(meses):
+        primeiro_dia = datetime(inicio.year + (inicio.month - 1 + mes) // 12, (inicio.month - 1 + mes) % 12 + 1, 1)
+        for segmento in range(SEGMENTOS_POR_MES):
+            linhas = []
+            for _ in range(por_segmento):
+                linhas.append((
+                    proximo_id,
+                    f"Alerta {proximo_id}",
+                    aleatorio.choice(TIPOS),
+                    "Relato arquivado gerado pelo benchmark do histórico",
+                    -23.55 + aleatorio.uniform(-0.5, 0.5),
+                    -46.63 + aleatorio.uniform(-0.5, 0.5),
+                    "Resolvido",
+                    primeiro_dia + timedelta(seconds=aleatorio.randint(0, 27 * 86400)),
+                    aleatorio.randint(1, 5000),
+                    1,
+                ))
+                proximo_id += 1
+            gravar_segmento(os.path.join(pasta, primeiro_dia.strftime("%Y-%m"), f"seg{segmento}"), linhas)
+    return proximo_id - 1
+
+
+def medir(arquivo, repeticoes, **consulta):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        linhas = arquivo.consultar(limite=100, **consulta)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return statistics.median(tempos), tempos[int(len(tempos) * 0.95) - 1], len(linhas)
+
+
+def tamanho_pasta(pasta):
+    return sum(os.path.getsize(os.path.join(raiz, nome)) for raiz, _, nomes in os.walk(pasta) for nome in nomes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--alertas", type=int, default=2_000_000)
+    parser.add_argument("--meses", type=int, default=24)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="rede_alerta_historico_")
+    inicio = time.perf_counter()
+    total = popular(pasta, args.alertas, args.meses)
+    print(f"{total} alertas arquivados em {time.perf_counter() - inicio:.1f} s "
+          f"({tamanho_pasta(pasta) / total:.1f} bytes por alerta em disco)")
+
+    arquivo = ArquivoHistorico(pasta=pasta, intervalo_h=0)
+    consultas = [
+        ("sem filtros", {}),
+        ("um mês", {"desde": datetime(2022, 6, 1), "ate": datetime(2022, 7, 1)}),
+        ("tipo", {"tipo": "Deslizamento"}),
+        ("bbox pequena", {"caixa": (-23.56, -46.64, -23.54, -46.62)}),
+        ("bbox + tipo + ano", {
+            "caixa": (-23.6, -46.7, -23.5, -46.6), "tipo": "Enchente",
+            "desde": datetime(2022, 1, 1), "ate": datetime(2023, 1, 1),
+        }),
+        ("nada encontrado", {"tipo": "Inexistente"}),
+    ]
+    for nome, consulta in consultas:
+        mediana, p95, quantidade = medir(arquivo, args.repeticoes, **consulta)
+        print(f"  {nome:20s} mediana {mediana:8.2f} ms  p95 {p95:8.2f} ms  ({quantidade} linhas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compara a ingestão de N relatos via N POST /alertas/ contra POST /alertas/lote.
+
+Uso: python benchmarks/bench_lote.py [--relatos 500] [--tamanho-lote 250]
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from _ambiente import preparar_api
+
+
+def gerar_relatos(quantidade, semente=42):
+    aleatorio = random.Random(semente)
+    return [
+        {
+            "titulo": f"Relato {i}",
+            "tipo": aleatorio.choice(["Enchente", "Deslizamento", "Incêndio", "Queda de árvore"]),
+            "descricao": "Relato gerado pelo benchmark",
+            "latitude": -23.55 + aleatorio.uniform(-0.2, 0.2),
+            "longitude": -46.63 + aleatorio.uniform(-0.2, 0.2),
+        }
+        for i in range(quantidade)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--relatos", type=int, default=500)
+    parser.add_argument("--tamanho-lote", type=int, default=250)
+    args = parser.parse_args()
+
+    api = preparar_api()
+    from fastapi.testclient import TestClient
+
+    relatos = gerar_relatos(args.relatos)
+    with TestClient(api.app) as cliente, contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for relato in relatos:
+            cliente.post("/alertas/", json=relato).raise_for_status()
+        tempo_individual = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for i in range(0, len(relatos), args.tamanho_lote):
+            resposta = cliente.post("/alertas/lote", json=relatos[i:i + args.tamanho_lote])
+            resposta.raise_for_status()
+            assert resposta.json()["rejeitados"] == 0
+        tempo_lote = time.perf_counter() - inicio
+
+    print(f"{args.relatos} relatos")
+    print(f"  POST /alertas/ individual: {tempo_individual:8.3f} s  {args.relatos / tempo_individual:10.1f} linhas/s")
+    print(f"  POST /alertas/lote ({args.tamanho_lote}/lote): {tempo_lote:8.3f} s  {args.relatos / tempo_lote:10.1f} linhas/s")
+    print(f"  Ganho: {tempo_individual / tempo_lote:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Créditos de pontos simultâneos no mesmo usuário: leitura + escrita no ORM contra
+UPDATE atômico (pontos = pontos + n) e contra o write-behind do AgregadorPontos.
+
+Cada modo dispara --threads threads, cada uma com --creditos créditos de 10 pontos no
+usuário 1 (o usuário que recebe todos os relatos). No fim confere se o total gravado
+é o esperado e se bate com a soma do extrato (pontos_lancamentos). O modo antigo
+mostra as atualizações perdidas; os outros dois falham o benchmark se perderem alguma.
+
+Uso: python benchmarks/bench_pontos.py [--threads 8] [--creditos 200] [--intervalo-ms 50]
+"""
+import argparse
+import threading
+import time
+
+from sqlalchemy import select, func, update
+
+from _ambiente import preparar_api
+
+PONTOS = 10
+
+
+def zerar(database, models):
+    with database.SessionLocal() as db:
+        db.execute(update(models.Usuario).where(models.Usuario.id == 1).values(pontos=0, nivel=1))
+        db.execute(models.PontoLancamento.__table__.delete())
+        db.commit()
+
+
+def conferir(database, models):
+    with database.SessionLocal() as db:
+        pontos = db.scalar(select(models.Usuario.pontos).where(models.Usuario.id == 1))
+        extrato = db.scalar(
+            select(func.coalesce(func.sum(models.PontoLancamento.pontos), 0))
+            .where(models.PontoLancamento.usuario_id == 1)
+        )
+    return pontos, extrato
+
+
+def executar_threads(quantidade, funcao):
+    erros = []
+
+    def trabalhar():
+        try:
+            funcao()
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=trabalhar) for _ in range(quantidade)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - inicio, erros
+
+
+def modo_leitura_escrita(database, models, creditos):
+    # Como as rotas faziam antes: ler o usuário, somar em Python e gravar o total
+    falhas = []
+
+    def trabalhar():
+        for _ in range(creditos):
+            with database.SessionLocal() as db:
+                try:
+                    usuario = db.get(models.Usuario, 1)
+                    usuario.pontos += PONTOS
+                    usuario.nivel = (usuario.pontos // 100) + 1
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    falhas.append(1)
+
+    return trabalhar, falhas
+
+
+def modo_atomico(database, creditar, creditos):
+    def trabalhar():
+        for _ in range(creditos):
+            with database.SessionLocal() as db:
+                creditar(db, 1, PONTOS, "relato")
+                db.commit()
+
+    return trabalhar, []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--creditos", type=int, default=200)
+    parser.add_argument("--intervalo-ms", type=int, default=50)
+    args = parser.parse_args()
+
+    preparar_api()
+    import database
+    import models
+    from pontos import AgregadorPontos, creditar
+
+    total = args.threads * args.creditos
+    esperado = total * PONTOS
+    print(f"{args.threads} threads x {args.creditos} créditos de {PONTOS} pontos no mesmo usuário (esperado: {esperado})")
+    falhou = False
+
+    # 1. Leitura + escrita (read-modify-write) pelo ORM
+    zerar(database, models)
+    trabalhar, falhas = modo_leitura_escrita(database, models, args.creditos)
+    tempo, erros = executar_threads(args.threads, trabalhar)
+    pontos, _ = conferir(database, models)
+    perdidos = (esperado - pontos) // PONTOS - len(falhas)
+    print(f"  leitura + escrita : {tempo:7.3f} s  {total / tempo:9.1f} créditos/s  "
+          f"pontos={pontos}  atualizações perdidas={perdidos}  erros={len(falhas) + len(erros)}")
+
+    # 2. UPDATE atômico + lançamento no extrato, um commit por crédito
+    zerar(database, models)
+    trabalhar, _ = modo_atomico(database, creditar, args.creditos)
+    tempo, erros = executar_threads(args.threads, trabalhar)
+    pontos, extrato = conferir(database, models)
+    ok = pontos == extrato == esperado and not erros
+    falhou |= not ok
+    print(f"  UPDATE atômico    : {tempo:7.3f} s  {total / tempo:9.1f} créditos/s  "
+          f"pontos={pontos}  extrato={extrato}  erros={len(erros)}  {'OK' if ok else 'FALHOU'}")
+
+    # 3. Write-behind: as threads só registram; um descarregador grava a cada intervalo
+    zerar(database, models)
+    agregador = AgregadorPontos(intervalo_s=args.intervalo_ms / 1000, ativo=True)
+    parar = threading.Event()
+    gravacoes = []
+
+    def descarregar_periodicamente():
+        while not parar.wait(agregador.intervalo_s):
+            gravacoes.append(agregador.descarregar())
+
+    descarregador = threading.Thread(target=descarregar_periodicamente)
+    descarregador.start()
+
+    def trabalhar():
+        for _ in range(args.creditos):
+            agregador.registrar(1, PONTOS, "relato")
+
+    tempo, erros = executar_threads(args.threads, trabalhar)
+    parar.set()
+    descarregador.join()
+    inicio = time.perf_counter()
+    gravacoes.append(agregador.descarregar())
+    tempo += time.perf_counter() - inicio
+    pontos, extrato = conferir(database, models)
+    ok = pontos == extrato == esperado and not erros and len(agregador) == 0
+    falhou |= not ok
+    print(f"  write-behind      : {tempo:7.3f} s  {total / tempo:9.1f} créditos/s  "
+          f"pontos={pontos}  extrato={extrato}  gravações={sum(1 for g in gravacoes if g)}  "
+          f"erros={len(erros)}  {'OK' if ok else 'FALHOU'}")
+
+    if falhou:
+        raise SystemExit("Créditos perdidos com UPDATE atômico ou write-behind")
+
+
+if __name__ == "__main__":
+    main()
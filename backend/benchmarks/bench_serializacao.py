@@ -0,0 +1,108 @@
+"""Custo por linha da leitura de alertas: caminho com objetos do ORM contra o caminho enxuto.
+
+Antes: select(Alerta) monta objetos do ORM, formatar_alerta (strftime por linha) gera os
+dicts, o AlertaSchema valida cada um e o JSON sai do json.dumps (como o FastAPI fazia
+com response_model). Depois: select(*COLUNAS_ALERTA) devolve tuplas, formatar_linha_alerta
+gera os dicts e o orjson serializa, sem nova validação. As duas etapas (consulta e
+serialização) são medidas separadamente para uma página de --linhas alertas.
+
+Uso: python benchmarks/bench_serializacao.py [--linhas 10000] [--repeticoes 10]
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+
+from _ambiente import preparar_api
+
+
+def popular(database, models, quantidade):
+    aleatorio = random.Random(42)
+    inicio = datetime(2024, 1, 1)
+    with database.engine.begin() as conexao:
+        conexao.execute(insert(models.Alerta), [
+            {
+                "titulo": f"Alerta {i}",
+                "tipo": aleatorio.choice(["Enchente", "Deslizamento", "Incêndio"]),
+                "descricao": "Relato gerado pelo benchmark de serialização",
+                "latitude": -23.55 + aleatorio.uniform(-0.2, 0.2),
+                "longitude": -46.63 + aleatorio.uniform(-0.2, 0.2),
+                "status": "Em análise",
+                "data_ocorrencia": inicio + timedelta(seconds=i, microseconds=aleatorio.randint(0, 999999)),
+                "usuario_id": 1,
+                "relatos": 1,
+            }
+            for i in range(quantidade)
+        ])
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--linhas", type=int, default=10000)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        api = preparar_api()
+    import database
+    import models
+
+    popular(database, models, args.linhas)
+    lista_alertas = TypeAdapter(List[models.AlertaSchema])
+    ordem = (models.Alerta.data_ocorrencia.desc(), models.Alerta.id.desc())
+
+    def consultar_orm():
+        with database.SessionLocal() as db:
+            return db.scalars(select(models.Alerta).order_by(*ordem).limit(args.linhas)).all()
+
+    def consultar_colunas():
+        with database.SessionLocal() as db:
+            return db.execute(select(*api.COLUNAS_ALERTA).order_by(*ordem).limit(args.linhas)).all()
+
+    tempo_orm, alertas = medir(consultar_orm, args.repeticoes)
+    tempo_colunas, linhas = medir(consultar_colunas, args.repeticoes)
+
+    def serializar_antes():
+        dicts = [api.formatar_alerta(alerta) for alerta in alertas]
+        validados = lista_alertas.validate_python(dicts)
+        return json.dumps(lista_alertas.dump_python(validados, mode="json")).encode()
+
+    def serializar_depois():
+        return orjson.dumps([api.formatar_linha_alerta(linha) for linha in linhas])
+
+    tempo_antes, corpo_antes = medir(serializar_antes, args.repeticoes)
+    tempo_depois, corpo_depois = medir(serializar_depois, args.repeticoes)
+    assert json.loads(corpo_antes) == json.loads(corpo_depois), "Os dois caminhos devem gerar o mesmo JSON"
+
+    def por_linha(segundos):
+        return segundos / args.linhas * 1e6
+
+    print(f"Página de {args.linhas} alertas (mediana de {args.repeticoes} execuções, µs por linha)")
+    print(f"  {'':14s} {'consulta':>10s} {'serialização':>14s} {'total':>10s}")
+    print(f"  {'ORM + pydantic':14s} {por_linha(tempo_orm):10.2f} {por_linha(tempo_antes):14.2f} "
+          f"{por_linha(tempo_orm + tempo_antes):10.2f}")
+    print(f"  {'tuplas + orjson':14s} {por_linha(tempo_colunas):10.2f} {por_linha(tempo_depois):14.2f} "
+          f"{por_linha(tempo_colunas + tempo_depois):10.2f}")
+    print(f"  Ganho total: {(tempo_orm + tempo_antes) / (tempo_colunas + tempo_depois):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+# Parâmetros do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Remoções acumuladas antes de reconstruir as listas de postings (fração dos documentos)
+FRACAO_COMPACTACAO = 0.2
+MINIMO_COMPACTACAO = 1000
+
+# Palavras muito comuns em português, ignoradas na indexação e na consulta (já sem acentos)
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de del dela dele do dos e ela ele em entre era essa esse esta
+este eu foi ha isso isto ja la lhe mais mas me mesmo meu minha muito na nao nas nem no nos
+num numa o os ou para pela pelas pelo pelos per por pra qual quando que se sem ser seu sua
+so sob sobre sua tambem tem ter um uma umas uns vai via
+""".split())
+
+_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+def _sem_acentos(texto):
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+
+
+def _singular(palavra):
+    # Redução leve de plurais, aplicada igual ao singular e ao plural:
+    # alagamentos -> alagamento, arvores/arvore -> arvor, flores/flor -> flor, bueiros -> bueiro
+    if len(palavra) <= 3:
+        return palavra
+    if palavra.endswith("s") and not palavra.endswith("ss"):
+        if palavra.endswith(("oes", "aes")):
+            return palavra[:-3] + "ao"
+        if palavra.endswith("ais"):
+            return palavra[:-2] + "l"
+        if palavra.endswith("eis") and len(palavra) > 4:
+            return palavra[:-3] + "el"
+        if palavra.endswith("ns"):
+            return palavra[:-2] + "m"
+        palavra = palavra[:-1]
+    if palavra.endswith(("re", "ze")) and len(palavra) > 3:
+        palavra = palavra[:-1]
+    return palavra
+
+
+def tokenizar(texto):
+    """Termos do texto: minúsculas, sem acentos, sem stopwords e no singular."""
+    if not texto:
+        return []
+    return [
+        _singular(palavra)
+        for palavra in _PALAVRA.findall(_sem_acentos(texto))
+        if len(palavra) > 1 and palavra not in STOPWORDS
+    ]
+
+
+class IndiceBusca:
+    """Índice invertido em memória sobre o título e a descrição dos alertas, com ranking BM25.
+
+    Cada termo aponta para duas listas paralelas (IDs em ordem crescente e frequências) em
+    arrays compactos.
+    Alertas removidos entram numa lista de exclusão e somem das listas quando as remoções
+    passam de FRACAO_COMPACTACAO dos documentos. Status, tipo e posição ficam junto de
+    cada documento para filtrar os resultados sem consultar o banco.
+    """
+
+    def __init__(self):
+        self._postings = {}     # termo -> (array de IDs, array de frequências)
+        self._docs = {}         # alerta_id -> [tamanho, status, tipo, latitude, longitude]
+        self._removidos = set()
+        self._soma_tamanhos = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def limpar(self):
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            self._removidos.clear()
+            self._soma_tamanhos = 0
+
+    def adicionar(self, alerta_id, titulo, descricao, status, tipo, latitude, longitude):
+        termos = tokenizar(titulo) + tokenizar(descricao)
+        frequencias = {}
+        for termo in termos:
+            frequencias[termo] = frequencias.get(termo, 0) + 1
+        with self._lock:
+            doc = self._docs.get(alerta_id)
+            if doc is not None:
+                # O texto de um alerta não muda: só atualizar os campos de filtro
+                doc[1:] = [status, tipo, latitude, longitude]
+                return
+            if alerta_id in self._removidos:
+                self._compactar()
+            for termo, frequencia in frequencias.items():
+                postings = self._postings.get(termo)
+                if postings is None:
+                    postings = self._postings[termo] = (array("q"), array("H"))
+                ids, frequencias_termo = postings
+                if ids and ids[-1] > alerta_id:
+                    # Fora de ordem (commits concorrentes): manter a lista ordenada por ID
+                    posicao = bisect_left(ids, alerta_id)
+                    ids.insert(posicao, alerta_id)
+                    frequencias_termo.insert(posicao, min(frequencia, 65535))
+                else:
+                    ids.append(alerta_id)
+                    frequencias_termo.append(min(frequencia, 65535))
+            self._docs[alerta_id] = [len(termos), status, tipo, latitude, longitude]
+            self._soma_tamanhos += len(termos)
+
+    def atualizar_status(self, alerta_id, status):
+        with self._lock:
+            doc = self._docs.get(alerta_id)
+            if doc is not None:
+                doc[1] = status
+
+    def remover(self, alerta_id):
+        with self._lock:
+            doc = self._docs.pop(alerta_id, None)
+            if doc is None:
+                return
+            self._soma_tamanhos -= doc[0]
+            self._removidos.add(alerta_id)
+            if len(self._removidos) > max(MINIMO_COMPACTACAO, FRACAO_COMPACTACAO * len(self._docs)):
+                self._compactar()
+
+    def _compactar(self):
+        # Reconstruir as listas sem os documentos removidos (executado com o lock)
+        removidos = self._removidos
+        for termo in list(self._postings):
+            ids, frequencias = self._postings[termo]
+            novos_ids, novas_frequencias = array("q"), array("H")
+            for alerta_id, frequencia in zip(ids, frequencias):
+                if alerta_id not in removidos:
+                    novos_ids.append(alerta_id)
+                    novas_frequencias.append(frequencia)
+            if novos_ids:
+                self._postings[termo] = (novos_ids, novas_frequencias)
+            else:
+                del self._postings[termo]
+        self._removidos = set()
+
+    def buscar(self, consulta, limite=50, deslocamento=0, status=None, tipo=None, caixa=None):
+        """Retorna [(alerta_id, pontuação)] dos alertas com todos os termos da consulta, do mais relevante.
+
+        caixa é (min_lat, min_lon, max_lat, max_lon). Empates ficam com o alerta mais recente (maior ID).
+        """
+        termos = list(dict.fromkeys(tokenizar(consulta)))
+        if not termos:
+            return []
+        with self._lock:
+            total_docs = len(self._docs)
+            if total_docs == 0:
+                return []
+            postings = [self._postings.get(termo) for termo in termos]
+            if any(lista is None for lista in postings):
+                return [] # Algum termo não aparece em nenhum alerta
+            tamanho_medio = self._soma_tamanhos / total_docs
+            docs = self._docs
+            removidos = self._removidos
+
+            # Pesos do BM25 que não dependem do documento
+            k1_mais_1 = BM25_K1 + 1
+            k1_fixo = BM25_K1 * (1 - BM25_B)
+            k1_por_tamanho = BM25_K1 * BM25_B / tamanho_medio
+
+            # Começar pelo termo mais raro: os demais só pontuam os candidatos que já existem
+            postings.sort(key=lambda lista: len(lista[0]))
+            pontuacoes = None
+            for ids, frequencias in postings:
+                df = len(ids) # Aproximado: pode incluir documentos removidos ainda não compactados
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                novas = {}
+                if pontuacoes is None:
+                    for alerta_id, frequencia in zip(ids, frequencias):
+                        if alerta_id in removidos:
+                            continue
+                        doc = docs[alerta_id]
+                        if status is not None and doc[1] != status:
+                            continue
+                        if tipo is not None and doc[2] != tipo:
+                            continue
+                        if caixa is not None and (
+                            doc[3] is None or doc[4] is None
+                            or not (caixa[0] <= doc[3] <= caixa[2] and caixa[1] <= doc[4] <= caixa[3])
+                        ):
+                            continue
+                        novas[alerta_id] = idf * frequencia * k1_mais_1 / (frequencia + k1_fixo + k1_por_tamanho * doc[0])
+                elif len(pontuacoes) * 16 < df:
+                    # Poucos candidatos: busca binária de cada um na lista (ordenada por ID)
+                    for alerta_id, anterior in pontuacoes.items():
+                        posicao = bisect_left(ids, alerta_id)
+                        if posicao < df and ids[posicao] == alerta_id:
+                            frequencia = frequencias[posicao]
+                            novas[alerta_id] = anterior + idf * frequencia * k1_mais_1 / (
+                                frequencia + k1_fixo + k1_por_tamanho * docs[alerta_id][0]
+                            )
+                else:
+                    for alerta_id, frequencia in zip(ids, frequencias):
+                        anterior = pontuacoes.get(alerta_id)
+                        if anterior is not None:
+                            novas[alerta_id] = anterior + idf * frequencia * k1_mais_1 / (
+                                frequencia + k1_fixo + k1_por_tamanho * docs[alerta_id][0]
+                            )
+                pontuacoes = novas
+                if not pontuacoes:
+                    return []
+
+        melhores = heapq.nlargest(deslocamento + limite, pontuacoes.items(), key=lambda item: (item[1], item[0]))
+        return melhores[deslocamento:]
+
+
+# Índice global usado pelas rotas da API
+indice_busca = IndiceBusca()
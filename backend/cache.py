@@ -0,0 +1,112 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CacheLocal:
+    """Cache em memória do processo, com limite de itens (descarta o menos usado).
+
+    Cada chave tem uma geração que é incrementada em toda invalidação; um valor
+    carregado antes de uma invalidação não é guardado, para que uma leitura lenta
+    não sobrescreva o cache com dados já desatualizados.
+    """
+
+    def __init__(self, max_itens=10000):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._geracoes = {}
+        self._geracao_global = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter_ou_carregar(self, chave, carregar):
+        encontrado, valor, geracao = self._consultar(chave)
+        if encontrado:
+            return valor
+        valor = carregar()
+        self._guardar(chave, valor, geracao)
+        return valor
+
+    async def obter_ou_carregar_async(self, chave, carregar):
+        """Igual a obter_ou_carregar, para quando carregar() é uma corrotina."""
+        encontrado, valor, geracao = self._consultar(chave)
+        if encontrado:
+            return valor
+        valor = await carregar()
+        self._guardar(chave, valor, geracao)
+        return valor
+
+    def _consultar(self, chave):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return True, self._itens[chave], None
+            return False, None, (self._geracao_global, self._geracoes.get(chave, 0))
+
+    def _guardar(self, chave, valor, geracao):
+        if valor is None:
+            return
+        with self._lock:
+            if (self._geracao_global, self._geracoes.get(chave, 0)) == geracao:
+                self._itens[chave] = valor
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.max_itens:
+                    self._itens.popitem(last=False)
+
+    def invalidar(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+            self._geracoes[chave] = self._geracoes.get(chave, 0) + 1
+
+    def limpar(self):
+        with self._lock:
+            self._geracao_global += 1
+            self._itens.clear()
+
+
+class CacheReferencia:
+    """Cache read-through das respostas de uma tabela de referência (conquistas, regiões).
+
+    Guarda o corpo JSON já serializado e o ETag de cada consulta, no máximo `max_respostas`
+    consultas (descarta a menos usada). Toda escrita na tabela chama invalidar(), que
+    incrementa a versão e descarta as respostas.
+    O ETag é um hash do corpo, então é forte e igual entre processos.
+    """
+
+    def __init__(self, nome, max_respostas=256):
+        self.nome = nome
+        self.versao = 0
+        self.max_respostas = max_respostas
+        self._respostas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._respostas)
+
+    def obter(self, chave, carregar):
+        """Retorna (corpo, etag); carregar() deve devolver o corpo em bytes."""
+        with self._lock:
+            versao = self.versao
+            resposta = self._respostas.get(chave)
+            if resposta is not None:
+                self._respostas.move_to_end(chave)
+        if resposta is not None:
+            return resposta
+
+        corpo = carregar()
+        etag = '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"'
+        with self._lock:
+            # Não guardar se houve uma escrita enquanto a consulta era feita
+            if self.versao == versao:
+                self._respostas[chave] = (corpo, etag)
+                self._respostas.move_to_end(chave)
+                while len(self._respostas) > self.max_respostas:
+                    self._respostas.popitem(last=False)
+        return corpo, etag
+
+    def invalidar(self):
+        with self._lock:
+            self.versao += 1
+            self._respostas.clear()
@@ -0,0 +1,169 @@
+import math
+import threading
+
+# Maior zoom com clusters; acima disso o mapa deve pedir os alertas em /alertas/area
+ZOOM_MAXIMO = 16
+
+# Cada tile de 256 px do zoom pedido é dividido em 2^3 x 2^3 células (~32 px por cluster)
+BITS_SUBDIVISAO = 3
+
+# Limite da projeção de Mercator usada pelos mapas (tiles quadrados)
+LATITUDE_MAXIMA = 85.05112878
+
+# Ordem de gravidade dos status, do pior para o melhor (status desconhecidos contam como os piores)
+ORDEM_STATUS = ["Enviado", "Em análise", "Em andamento", "Resolvido"]
+
+
+def _projetar(latitude, longitude):
+    # Coordenadas de Mercator normalizadas para [0, 1): x cresce para leste, y para sul
+    latitude = min(max(latitude, -LATITUDE_MAXIMA), LATITUDE_MAXIMA)
+    x = (longitude + 180.0) / 360.0
+    seno = math.sin(math.radians(latitude))
+    y = 0.5 - math.log((1 + seno) / (1 - seno)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def _gravidade(status):
+    return ORDEM_STATUS.index(status) if status in ORDEM_STATUS else -1
+
+
+class Celula:
+    __slots__ = ("contagem", "soma_lat", "soma_lon", "soma_ids", "tipos", "status")
+
+    def __init__(self):
+        self.contagem = 0
+        self.soma_lat = 0.0
+        self.soma_lon = 0.0
+        self.soma_ids = 0
+        self.tipos = {}
+        self.status = {}
+
+    def resumo(self):
+        tipo = max(sorted(self.tipos), key=self.tipos.get) if self.tipos else None
+        status = min(self.status, key=_gravidade) if self.status else None
+        return {
+            "latitude": self.soma_lat / self.contagem,
+            "longitude": self.soma_lon / self.contagem,
+            "contagem": self.contagem,
+            "tipo": tipo,
+            "status": status,
+            # Com um único alerta na célula, a soma dos IDs é o próprio ID
+            "alerta_id": self.soma_ids if self.contagem == 1 else None,
+        }
+
+
+def _somar(contadores, chave, delta):
+    valor = contadores.get(chave, 0) + delta
+    if valor:
+        contadores[chave] = valor
+    else:
+        del contadores[chave]
+
+
+class GradeClusters:
+    """Agregados de alertas por célula de grade, um nível por zoom do mapa.
+
+    Cada alerta entra em uma célula de cada nível e as células guardam só contadores
+    (total, somas das coordenadas, contagem por tipo e por status). Criar, mudar o
+    status ou remover um alerta ajusta esses contadores, então uma consulta apenas lê
+    as células da área visível, sem agregar os alertas a cada requisição.
+    """
+
+    def __init__(self, zoom_maximo=ZOOM_MAXIMO, bits_subdivisao=BITS_SUBDIVISAO):
+        self.zoom_maximo = zoom_maximo
+        self.bits_subdivisao = bits_subdivisao
+        self._niveis = [{} for _ in range(zoom_maximo + 1)]  # zoom -> {(x, y): Celula}
+        self._alertas = {}  # id -> (x, y, latitude, longitude, tipo, status)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._alertas)
+
+    def limpar(self):
+        with self._lock:
+            for nivel in self._niveis:
+                nivel.clear()
+            self._alertas.clear()
+
+    def _aplicar(self, alerta_id, entrada, sinal):
+        x, y, latitude, longitude, tipo, status = entrada
+        for zoom, nivel in enumerate(self._niveis):
+            escala = 1 << (zoom + self.bits_subdivisao)
+            chave = (int(x * escala), int(y * escala))
+            celula = nivel.get(chave)
+            if celula is None:
+                celula = nivel[chave] = Celula()
+            celula.contagem += sinal
+            if celula.contagem == 0:
+                del nivel[chave]
+                continue
+            celula.soma_lat += sinal * latitude
+            celula.soma_lon += sinal * longitude
+            celula.soma_ids += sinal * alerta_id
+            _somar(celula.tipos, tipo, sinal)
+            _somar(celula.status, status, sinal)
+
+    def adicionar(self, alerta_id, latitude, longitude, tipo, status):
+        if latitude is None or longitude is None:
+            return
+        x, y = _projetar(latitude, longitude)
+        entrada = (x, y, latitude, longitude, tipo, status)
+        with self._lock:
+            anterior = self._alertas.pop(alerta_id, None)
+            if anterior is not None:
+                self._aplicar(alerta_id, anterior, -1)
+            self._alertas[alerta_id] = entrada
+            self._aplicar(alerta_id, entrada, 1)
+
+    def remover(self, alerta_id):
+        with self._lock:
+            entrada = self._alertas.pop(alerta_id, None)
+            if entrada is not None:
+                self._aplicar(alerta_id, entrada, -1)
+
+    def atualizar_status(self, alerta_id, status):
+        with self._lock:
+            entrada = self._alertas.get(alerta_id)
+            if entrada is None or entrada[5] == status:
+                return
+            # Só os contadores de status mudam; o restante da célula fica igual
+            x, y = entrada[0], entrada[1]
+            for zoom, nivel in enumerate(self._niveis):
+                escala = 1 << (zoom + self.bits_subdivisao)
+                celula = nivel[(int(x * escala), int(y * escala))]
+                _somar(celula.status, entrada[5], -1)
+                _somar(celula.status, status, 1)
+            self._alertas[alerta_id] = entrada[:5] + (status,)
+
+    def buscar(self, zoom, min_lat, min_lon, max_lat, max_lon):
+        """Retorna os clusters (dicts) das células do zoom que cruzam a caixa."""
+        zoom = min(max(zoom, 0), self.zoom_maximo)
+        escala = 1 << (zoom + self.bits_subdivisao)
+        x_min, y_min = _projetar(max_lat, min_lon)  # y cresce para o sul: o canto norte tem o menor y
+        x_max, y_max = _projetar(min_lat, max_lon)
+        x_min, x_max = int(x_min * escala), int(x_max * escala)
+        y_min, y_max = int(y_min * escala), int(y_max * escala)
+
+        resultado = []
+        with self._lock:
+            nivel = self._niveis[zoom]
+            if (x_max - x_min + 1) * (y_max - y_min + 1) > len(nivel):
+                # Área maior que o número de células ocupadas: percorrer só as ocupadas
+                chaves = [
+                    chave for chave in nivel
+                    if x_min <= chave[0] <= x_max and y_min <= chave[1] <= y_max
+                ]
+            else:
+                chaves = [
+                    (x, y)
+                    for x in range(x_min, x_max + 1)
+                    for y in range(y_min, y_max + 1)
+                    if (x, y) in nivel
+                ]
+            for chave in chaves:
+                resultado.append(nivel[chave].resumo())
+        return resultado
+
+
+# Grade global de clusters usada pelas rotas da API
+grade_clusters = GradeClusters()
@@ -0,0 +1,369 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import select, insert, update, func, or_, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+import models
+from database import savepoint
+
+# Regras declarativas das conquistas do catálogo (database_scripts/insert_conquistas.sql)
+# conquista_id -> (contador, valor mínimo)
+# Conquistas sem regra aqui continuam sendo liberadas por pontos (pontos_necessarios)
+REGRAS = {
+    1: ("relatos", 1),            # Primeiro Relato
+    2: ("relatos", 10),           # Contribuidor Fiel
+    3: ("relatos_noturnos", 5),   # Vigilante Noturno
+    4: ("relatos_validados", 1),  # Ajudante Local
+    5: ("regioes_distintas", 3),  # Observador Atento
+    6: ("dias_distintos", 5),     # Comunicador Eficiente
+    7: ("pontos", 500),           # Cidadão Exemplar
+    8: ("pontos", 1000),          # Guardião da Comunidade
+}
+
+# Relatos feitos entre 18h e 6h contam como noturnos
+HORA_INICIO_NOITE = 18
+HORA_FIM_NOITE = 6
+
+# Status que indicam que um relato foi validado pelas autoridades
+STATUS_VALIDADOS = {"Em andamento", "Resolvido"}
+
+# Relatos fora de todas as regiões cadastradas contam pelo prefixo de 5 caracteres do geohash (~5 km)
+PRECISAO_REGIAO = 5
+
+# Contadores de usuario_estatisticas, somados no banco por _somar_contadores
+CONTADORES = ("relatos", "relatos_noturnos", "relatos_validados", "regioes_distintas", "dias_distintos")
+_estatisticas = models.UsuarioEstatistica.__table__
+
+# relatos_validados + n para vários usuários (executemany na moderação em lote)
+_somar_validados = (
+    update(_estatisticas)
+    .where(_estatisticas.c.usuario_id == bindparam("b_id"))
+    .values(relatos_validados=_estatisticas.c.relatos_validados + bindparam("b_quantidade"))
+)
+
+# IDs por cláusula IN (o Oracle aceita no máximo 1000 valores em uma lista)
+LOTE_IN = 1000
+
+# Catálogo de conquistas em memória: [(id, pontos_necessarios)]
+_catalogo = None
+_catalogo_lock = threading.Lock()
+
+
+def carregar_catalogo(db: Session):
+    global _catalogo
+    if _catalogo is None:
+        with _catalogo_lock:
+            if _catalogo is None:
+                _catalogo = db.execute(
+                    select(models.Conquista.id, models.Conquista.pontos_necessarios)
+                ).all()
+    return _catalogo
+
+
+def invalidar_catalogo():
+    global _catalogo
+    with _catalogo_lock:
+        _catalogo = None
+
+
+def regioes_do_relato(geocelula, regiao_ids=()):
+    # Chaves gravadas em usuario_regioes: "r:<id>" para regiões cadastradas (alerta_regiao),
+    # senão o prefixo do geohash (o alfabeto do geohash não tem ":", então não há colisão)
+    if regiao_ids:
+        return {f"r:{regiao_id}" for regiao_id in regiao_ids}
+    return {geocelula[:PRECISAO_REGIAO]} if geocelula else set()
+
+
+def _eh_noturno(data):
+    return data.hour >= HORA_INICIO_NOITE or data.hour < HORA_FIM_NOITE
+
+
+def _processado(tipo, referencia):
+    # Relato já creditado pelo job (marca em relatos_processados ou, antes da marca, o lançamento no extrato)
+    return or_(
+        select(models.RelatoProcessado.referencia_id).where(
+            models.RelatoProcessado.tipo == tipo, models.RelatoProcessado.referencia_id == referencia
+        ).exists(),
+        select(models.PontoLancamento.id).where(
+            models.PontoLancamento.motivo == tipo, models.PontoLancamento.referencia_id == referencia
+        ).exists(),
+    )
+
+
+def _reconstruir_estatistica(db: Session, usuario_id: int):
+    # Primeira vez que o usuário é visto: montar os contadores a partir dos alertas existentes
+    # Só contam como relato os alertas já processados: os que ainda têm job na fila serão somados
+    # por ele (registrar_relatos), senão o mesmo alerta entraria duas vezes
+    relatos = db.execute(
+        select(models.Alerta.id, models.Alerta.data_ocorrencia, models.Alerta.geocelula)
+        .where(
+            models.Alerta.usuario_id == usuario_id,
+            models.Alerta.removido_em.is_(None),
+            _processado("relato", models.Alerta.id),
+        )
+    ).all()
+    # Validações não dependem do job: registrar_validacoes soma a troca de status de qualquer alerta
+    relatos_validados = db.scalar(
+        select(func.count(models.Alerta.id)).where(
+            models.Alerta.usuario_id == usuario_id,
+            models.Alerta.removido_em.is_(None),
+            models.Alerta.status.in_(STATUS_VALIDADOS),
+        )
+    )
+    regioes_por_alerta = {}
+    for alerta_id, regiao_id in db.execute(
+        select(models.AlertaRegiao.alerta_id, models.AlertaRegiao.regiao_id)
+        .join(models.Alerta, models.Alerta.id == models.AlertaRegiao.alerta_id)
+        .where(models.Alerta.usuario_id == usuario_id)
+    ):
+        regioes_por_alerta.setdefault(alerta_id, []).append(regiao_id)
+
+    dias = set()
+    regioes = set()
+    estatistica = models.UsuarioEstatistica(
+        usuario_id=usuario_id,
+        relatos=len(relatos),
+        relatos_noturnos=0,
+        relatos_validados=relatos_validados or 0,
+    )
+    for alerta_id, data, geocelula in relatos:
+        if data is not None:
+            dias.add(data.strftime("%Y-%m-%d"))
+            if _eh_noturno(data):
+                estatistica.relatos_noturnos += 1
+        regioes |= regioes_do_relato(geocelula, regioes_por_alerta.get(alerta_id))
+
+    estatistica.dias_distintos = len(dias)
+    estatistica.regioes_distintas = len(regioes)
+    # Outra transação pode reconstruir o mesmo usuário ao mesmo tempo: a chave primária recusa a
+    # segunda, que desfaz o SAVEPOINT e devolve None (quem chama soma os seus relatos à linha gravada)
+    try:
+        with savepoint(db):
+            db.add(estatistica)
+            db.flush([estatistica])
+            if regioes:
+                db.execute(
+                    insert(models.UsuarioRegiao),
+                    [{"usuario_id": usuario_id, "regiao": regiao} for regiao in regioes]
+                )
+            if dias:
+                db.execute(
+                    insert(models.UsuarioDia),
+                    [{"usuario_id": usuario_id, "dia": dia} for dia in dias]
+                )
+    except IntegrityError:
+        return None
+    return estatistica
+
+
+def _inserir_ignorando_existentes(db: Session, modelo, linhas):
+    """INSERT em lote de `linhas` tolerante a chaves gravadas por outra transação; retorna as linhas inseridas.
+
+    O lote inteiro vai num SAVEPOINT; se a chave primária recusar alguma linha, cada uma é
+    tentada sozinha no seu SAVEPOINT e as repetidas ficam de fora.
+    """
+    if not linhas:
+        return []
+    try:
+        with savepoint(db):
+            db.execute(insert(modelo), linhas)
+        return linhas
+    except IntegrityError:
+        inseridas = []
+        for linha in linhas:
+            try:
+                with savepoint(db):
+                    db.execute(insert(modelo), [linha])
+                inseridas.append(linha)
+            except IntegrityError:
+                pass
+        return inseridas
+
+
+def _inserir_novos(db: Session, modelo, campo, usuario_id: int, valores):
+    """Grava as chaves (usuario_id, valor) que o usuário ainda não tem e devolve quantas entraram.
+
+    Outra transação pode gravar a mesma chave ao mesmo tempo (relatos do mesmo usuário em paralelo).
+    Só conta quem de fato inseriu, então o contador nunca soma a mesma chave duas vezes.
+    """
+    if not valores:
+        return 0
+    coluna = getattr(modelo, campo)
+    # Uma única consulta para saber quais desses valores o usuário já tinha
+    conhecidos = set(db.scalars(
+        select(coluna).where(modelo.usuario_id == usuario_id, coluna.in_(valores))
+    ))
+    novos = [valor for valor in valores if valor not in conhecidos]
+    return len(_inserir_ignorando_existentes(db, modelo, [{"usuario_id": usuario_id, campo: valor} for valor in novos]))
+
+
+def _somar_contadores(db: Session, estatistica, **incrementos):
+    # Incremento no próprio UPDATE (contador = contador + n): transações concorrentes não perdem somas
+    # O RETURNING devolve os totais já somados, que a avaliação das conquistas usa em seguida
+    valores = {nome: _estatisticas.c[nome] + quantidade for nome, quantidade in incrementos.items() if quantidade}
+    if not valores:
+        return estatistica
+    totais = db.execute(
+        update(_estatisticas)
+        .where(_estatisticas.c.usuario_id == estatistica.usuario_id)
+        .values(valores)
+        .returning(*(_estatisticas.c[nome] for nome in CONTADORES))
+    ).one()
+    for nome, valor in zip(CONTADORES, totais):
+        set_committed_value(estatistica, nome, valor)
+    return estatistica
+
+
+def registrar_relatos(db: Session, usuario_id: int, relatos):
+    """Atualiza os contadores do usuário com os relatos recém-inseridos.
+
+    relatos é uma lista de (data_ocorrencia, geocelula, regiao_ids). Os alertas e a marca de
+    processado (relatos_processados) já devem ter sido enviados ao banco antes da chamada.
+    A ordem de chegada não importa: dias e regiões distintos vêm das chaves gravadas por usuário.
+    """
+    estatistica = db.get(models.UsuarioEstatistica, usuario_id)
+    if estatistica is None:
+        # A reconstrução já inclui os relatos recém-inseridos (marcados como processados)
+        estatistica = _reconstruir_estatistica(db, usuario_id)
+        if estatistica is not None:
+            return estatistica
+        # Outra transação reconstruiu antes, sem ver estes relatos (ainda sem commit): somar à linha dela
+        estatistica = db.get(models.UsuarioEstatistica, usuario_id)
+
+    regioes = set()
+    dias = set()
+    noturnos = 0
+    for data, geocelula, regiao_ids in relatos:
+        regioes |= regioes_do_relato(geocelula, regiao_ids)
+        dias.add(data.strftime("%Y-%m-%d"))
+        if _eh_noturno(data):
+            noturnos += 1
+
+    return _somar_contadores(
+        db,
+        estatistica,
+        relatos=len(relatos),
+        relatos_noturnos=noturnos,
+        regioes_distintas=_inserir_novos(db, models.UsuarioRegiao, "regiao", usuario_id, sorted(regioes)),
+        dias_distintos=_inserir_novos(db, models.UsuarioDia, "dia", usuario_id, sorted(dias)),
+    )
+
+
+def eh_validacao(status_anterior, status_novo):
+    return status_anterior not in STATUS_VALIDADOS and status_novo in STATUS_VALIDADOS
+
+
+def registrar_validacao(db: Session, usuario_id: int, status_anterior, status_novo):
+    """Conta um relato validado quando o status passa para um dos STATUS_VALIDADOS."""
+    if not eh_validacao(status_anterior, status_novo):
+        return None
+    return registrar_validacoes(db, usuario_id, 1)
+
+
+def registrar_validacoes_lote(db: Session, validacoes):
+    """registrar_validacoes() para vários autores: {usuario_id: quantidade} -> {usuario_id: UsuarioEstatistica}.
+
+    Um UPDATE em lote (executemany) e uma leitura dos totais, em vez de um UPDATE com RETURNING por autor.
+    """
+    ids = list(validacoes)
+    estatisticas = {}
+    for inicio in range(0, len(ids), LOTE_IN):
+        for estatistica in db.scalars(
+            select(models.UsuarioEstatistica)
+            .where(models.UsuarioEstatistica.usuario_id.in_(ids[inicio:inicio + LOTE_IN]))
+        ):
+            estatisticas[estatistica.usuario_id] = estatistica
+
+    existentes = list(estatisticas)
+    if existentes:
+        db.execute(_somar_validados, [
+            {"b_id": usuario_id, "b_quantidade": validacoes[usuario_id]} for usuario_id in existentes
+        ])
+        for inicio in range(0, len(existentes), LOTE_IN):
+            for totais in db.execute(
+                select(_estatisticas).where(_estatisticas.c.usuario_id.in_(existentes[inicio:inicio + LOTE_IN]))
+            ).mappings():
+                for nome in CONTADORES:
+                    set_committed_value(estatisticas[totais["usuario_id"]], nome, totais[nome])
+    for usuario_id in ids:
+        if usuario_id not in estatisticas:
+            estatisticas[usuario_id] = registrar_validacoes(db, usuario_id, validacoes[usuario_id])
+    return estatisticas
+
+
+def registrar_validacoes(db: Session, usuario_id: int, quantidade: int):
+    """Soma `quantidade` relatos validados do usuário (moderação em lote: um incremento por usuário)."""
+    estatistica = db.get(models.UsuarioEstatistica, usuario_id)
+    if estatistica is None:
+        # A reconstrução lê os status já alterados (enviados ao banco antes da chamada)
+        estatistica = _reconstruir_estatistica(db, usuario_id)
+        if estatistica is not None:
+            return estatistica
+        # Reconstruída por outra transação, que não viu esta troca de status: somar à linha dela
+        estatistica = db.get(models.UsuarioEstatistica, usuario_id)
+    return _somar_contadores(db, estatistica, relatos_validados=quantidade)
+
+
+def avaliar(db: Session, usuario, estatistica=None):
+    """Avalia todas as regras para o usuário e insere as conquistas novas em um único INSERT.
+
+    Retorna os IDs das conquistas atribuídas nesta chamada.
+    """
+    estatisticas = {usuario.id: estatistica} if estatistica is not None else None
+    return avaliar_lote(db, [usuario], estatisticas)[usuario.id]
+
+
+def avaliar_lote(db: Session, usuarios, estatisticas=None):
+    """avaliar() para vários usuários com uma consulta de conquistas possuídas e um INSERT (por lote de LOTE_IN).
+
+    estatisticas é {usuario_id: UsuarioEstatistica}; sem ele (ou sem o usuário nele) os contadores são lidos
+    do banco. Retorna {usuario_id: [IDs das conquistas atribuídas nesta chamada]}.
+    """
+    estatisticas = dict(estatisticas or {})
+    ids = [usuario.id for usuario in usuarios]
+    faltantes = [usuario_id for usuario_id in ids if usuario_id not in estatisticas]
+    possuidas = defaultdict(set)
+    for inicio in range(0, len(ids), LOTE_IN):
+        parte = ids[inicio:inicio + LOTE_IN]
+        for usuario_id, conquista_id in db.execute(
+            select(models.UsuarioConquista.usuario_id, models.UsuarioConquista.conquista_id)
+            .where(models.UsuarioConquista.usuario_id.in_(parte))
+        ):
+            possuidas[usuario_id].add(conquista_id)
+    for inicio in range(0, len(faltantes), LOTE_IN):
+        for estatistica in db.scalars(
+            select(models.UsuarioEstatistica)
+            .where(models.UsuarioEstatistica.usuario_id.in_(faltantes[inicio:inicio + LOTE_IN]))
+        ):
+            estatisticas[estatistica.usuario_id] = estatistica
+
+    catalogo = carregar_catalogo(db)
+    novas = {}
+    for usuario in usuarios:
+        contadores = {"pontos": usuario.pontos or 0}
+        estatistica = estatisticas.get(usuario.id)
+        if estatistica is not None:
+            contadores.update((nome, getattr(estatistica, nome)) for nome in CONTADORES)
+        novas[usuario.id] = []
+        for conquista_id, pontos_necessarios in catalogo:
+            if conquista_id in possuidas[usuario.id]:
+                continue
+            contador, minimo = REGRAS.get(conquista_id, ("pontos", pontos_necessarios or 0))
+            if contadores.get(contador, 0) >= minimo:
+                novas[usuario.id].append(conquista_id)
+
+    # Outra transação pode atribuir a mesma conquista ao mesmo tempo: fica com ela quem gravou primeiro
+    linhas = [
+        {"usuario_id": usuario_id, "conquista_id": conquista_id}
+        for usuario_id, conquistas_usuario in novas.items()
+        for conquista_id in conquistas_usuario
+    ]
+    inseridas = _inserir_ignorando_existentes(db, models.UsuarioConquista, linhas)
+    if len(inseridas) < len(linhas):
+        novas = {usuario_id: [] for usuario_id in novas}
+        for linha in inseridas:
+            novas[linha["usuario_id"]].append(linha["conquista_id"])
+    return novas
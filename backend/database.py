@@ -1,10 +1,14 @@
 import os
-from sqlalchemy import create_engine
+import re
+from sqlalchemy import create_engine, event, insert, select, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
 import oracledb # Importar o driver oracledb
 
+import metricas
+
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
@@ -15,11 +19,32 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT") # PORTA deve vir como string do .env
 DB_SID = os.getenv("DB_SID")   # Pode ser SID ou SERVICE_NAME dependendo da config do banco
 
+# SQLite local em arquivo (testes de carga e desenvolvimento sem Oracle)
+# DB_SQLITE_ARQUIVO força o modo SQLite mesmo com as variáveis do Oracle no .env;
+# sem as variáveis do Oracle, o SQLite é usado com o arquivo padrão
+DB_SQLITE_ARQUIVO = os.getenv("DB_SQLITE_ARQUIVO")
+ARQUIVO_SQLITE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rede_alerta.db")
+
+# Pragmas aplicados a cada conexão SQLite
+# DB_SQLITE_SYNCHRONOUS: NORMAL no WAL só sincroniza o disco nos checkpoints (uma queda de energia perde
+# no máximo as últimas transações, sem corromper o banco); FULL sincroniza a cada commit
+# DB_SQLITE_MMAP_MB: leitura do arquivo por memória mapeada; DB_SQLITE_CACHE_MB: cache de páginas por conexão
+DB_SQLITE_SYNCHRONOUS = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+DB_SQLITE_MMAP_MB = int(os.getenv("DB_SQLITE_MMAP_MB", "256"))
+DB_SQLITE_CACHE_MB = int(os.getenv("DB_SQLITE_CACHE_MB", "64"))
+DB_SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+def url_sqlite(arquivo):
+    return f"sqlite:///{os.path.abspath(arquivo)}"
+
 # Verificar se as variáveis de ambiente essenciais foram carregadas
-if not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_SID]):
-    # Se as variáveis não estiverem definidas, usaremos um banco de dados SQLite em memória como fallback temporário
-    SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-    print("Aviso: Variáveis de ambiente do Oracle incompletas. Usando SQLite em memória como fallback.")
+if DB_SQLITE_ARQUIVO:
+    SQLALCHEMY_DATABASE_URL = url_sqlite(DB_SQLITE_ARQUIVO)
+    print(f"Usando SQLite em {os.path.abspath(DB_SQLITE_ARQUIVO)} (DB_SQLITE_ARQUIVO).")
+elif not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_SID]):
+    # Se as variáveis não estiverem definidas, usaremos um banco SQLite local em arquivo
+    SQLALCHEMY_DATABASE_URL = url_sqlite(ARQUIVO_SQLITE_PADRAO)
+    print(f"Aviso: Variáveis de ambiente do Oracle incompletas. Usando SQLite em {ARQUIVO_SQLITE_PADRAO}.")
 else:
     try:
         # Construir o DSN usando oracledb.makedsn
@@ -34,24 +59,151 @@ else:
     except Exception as e:
         print(f"Erro ao configurar conexão Oracle: {e}")
         # Em caso de erro na configuração do DSN, fallback para SQLite
-        SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
-        print("Aviso: Erro na configuração do Oracle. Usando SQLite em memória como fallback.")
+        SQLALCHEMY_DATABASE_URL = url_sqlite(ARQUIVO_SQLITE_PADRAO)
+        print(f"Aviso: Erro na configuração do Oracle. Usando SQLite em {ARQUIVO_SQLITE_PADRAO}.")
+
+USANDO_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
 
+# Ajustes do pool de conexões e do driver, configuráveis pelo .env
+# DB_POOL_SIZE: conexões mantidas abertas; DB_MAX_OVERFLOW: conexões extras em picos
+# DB_POOL_TIMEOUT: segundos esperando uma conexão livre; DB_POOL_RECYCLE: idade máxima (s) de uma conexão
+# DB_POOL_PRE_PING: testa a conexão antes de usar (conexões ociosas derrubadas pelo firewall)
+# DB_ARRAYSIZE: linhas trazidas por ida ao banco nas consultas (oracledb)
+# DB_STMT_CACHE_SIZE: comandos preparados mantidos por conexão (oracledb)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "sim", "yes")
+DB_ARRAYSIZE = int(os.getenv("DB_ARRAYSIZE", "1000"))
+DB_STMT_CACHE_SIZE = int(os.getenv("DB_STMT_CACHE_SIZE", "50"))
+
+def opcoes_engine(url, poolclass):
+    opcoes = {}
+    if url.startswith("oracle"):
+        opcoes["arraysize"] = DB_ARRAYSIZE
+        opcoes["connect_args"] = {"stmtcachesize": DB_STMT_CACHE_SIZE}
+    if url.startswith("sqlite"):
+        # As conexões do pool são compartilhadas entre as threads do servidor (uma por vez)
+        opcoes["connect_args"] = {"check_same_thread": False}
+    if ":memory:" in url:
+        # SQLite em memória usa um pool próprio (uma conexão por thread): as opções de fila não se aplicam
+        return opcoes
+    opcoes.update(
+        poolclass=poolclass,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return opcoes
+
+# Pragmas de cada conexão SQLite nova (o pool reaproveita a conexão, então o cache de páginas persiste)
+# WAL: leitores não bloqueiam o escritor e vice-versa; busy_timeout: esperar o lock em vez de falhar na hora
+def configurar_sqlite(engine_sqlite):
+    @event.listens_for(engine_sqlite, "connect")
+    def aplicar_pragmas(conexao_dbapi, _registro):
+        cursor = conexao_dbapi.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={DB_SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={DB_SQLITE_MMAP_MB * 1024 * 1024}")
+        cursor.execute(f"PRAGMA cache_size=-{DB_SQLITE_CACHE_MB * 1024}") # Negativo: tamanho em KiB
+        cursor.execute(f"PRAGMA busy_timeout={DB_SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
 
 # Criar o engine do SQLAlchemy
-# O argumento arraysize=1000 é uma otimização para oracledb
+# O pool mede o tempo de espera por conexão e os eventos contam as consultas de cada rota (/metrics)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    # connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {},
     #echo=True, # Descomente para ver as queries SQL geradas (útil para debug)
-    # arraysize=1000 if "oracle" in SQLALCHEMY_DATABASE_URL else None
-    # Adicionar pool_pre_ping=True pode ajudar com conexões ociosas (opcional)
-    # pool_pre_ping=True
+    **opcoes_engine(SQLALCHEMY_DATABASE_URL, metricas.PoolMedido)
 )
+metricas.instrumentar_engine("sync", engine)
+if USANDO_SQLITE:
+    configurar_sqlite(engine)
 
 # Criar a sessão do banco de dados
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# URL equivalente para o driver assíncrono: aiosqlite localmente e oracledb (modo async) em produção
+def url_assincrona(url):
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("oracle+oracledb:"):
+        return url.replace("oracle+oracledb:", "oracle+oracledb_async:", 1)
+    return url
+
+# Engine e sessão assíncronos, usados pelas rotas async def (alertas e usuários)
+# Uma consulta lenta não prende uma thread do threadpool: o worker atende outras requisições enquanto espera o banco
+async_engine = create_async_engine(
+    url_assincrona(SQLALCHEMY_DATABASE_URL),
+    **opcoes_engine(SQLALCHEMY_DATABASE_URL, metricas.PoolAssincronoMedido)
+)
+metricas.instrumentar_engine("async", async_engine.sync_engine)
+if USANDO_SQLITE:
+    configurar_sqlite(async_engine.sync_engine)
+
+# expire_on_commit=False: em modo assíncrono não é possível recarregar atributos de forma implícita depois do commit
+AsyncSessionLocal = async_sessionmaker(async_engine, autocommit=False, autoflush=False, expire_on_commit=False)
+
+# Dados iniciais lidos dos próprios scripts do Oracle em database_scripts/ (uma única fonte)
+PASTA_SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database_scripts")
+_INSERT_SQL = re.compile(r"INTO\s+(\w+)\s*\(([^)]*)\)\s*VALUES\s*\((.*?)\)\s*;?\s*$", re.IGNORECASE | re.DOTALL | re.MULTILINE)
+_VALOR_SQL = re.compile(r"'((?:[^']|'')*)'|(-?\d+(?:\.\d+)?)")
+
+def ler_inserts(nome_script, tabela):
+    """Linhas (dicts) dos INSERT ... VALUES de um script de database_scripts/ para a tabela indicada."""
+    with open(os.path.join(PASTA_SCRIPTS, nome_script), encoding="utf-8") as arquivo:
+        conteudo = arquivo.read()
+    linhas = []
+    for tabela_sql, colunas, valores in _INSERT_SQL.findall(conteudo):
+        if tabela_sql.lower() != tabela:
+            continue
+        convertidos = [
+            texto.replace("''", "'") if numero == "" else (float(numero) if "." in numero else int(numero))
+            for texto, numero in _VALOR_SQL.findall(valores)
+        ]
+        linhas.append(dict(zip((coluna.strip() for coluna in colunas.split(",")), convertidos)))
+    return linhas
+
+def inicializar_sqlite(engine_sqlite=None):
+    """Cria tabelas e índices a partir de models.Base e carrega as conquistas e o usuário padrão.
+
+    Idempotente: tabelas existentes são mantidas e os dados iniciais só entram se ainda não existirem.
+    """
+    import models # models não importa database; importado aqui só para o bootstrap
+
+    engine_sqlite = engine_sqlite or engine
+    models.Base.metadata.create_all(engine_sqlite)
+    with engine_sqlite.begin() as conexao:
+        if not conexao.scalar(select(func.count()).select_from(models.Conquista)):
+            conexao.execute(insert(models.Conquista), ler_inserts("insert_conquistas.sql", "conquistas"))
+        if conexao.scalar(select(models.Usuario.id).where(models.Usuario.id == 1)) is None:
+            conexao.execute(insert(models.Usuario), ler_inserts("insert_default_user.sql", "usuarios"))
+        # Sequência das versões de alertas (ver versoes.py); num banco antigo continua da maior versão gravada
+        if conexao.scalar(select(models.Sequencia.valor).where(models.Sequencia.nome == "alertas")) is None:
+            conexao.execute(insert(models.Sequencia).values(
+                nome="alertas", valor=select(func.coalesce(func.max(models.Alerta.versao), 0)).scalar_subquery()
+            ))
+        # Horizonte do expurgo de tombstones (ver versoes.expurgar_tombstones)
+        if conexao.scalar(select(models.Sequencia.valor).where(models.Sequencia.nome == "alertas_expurgo")) is None:
+            conexao.execute(insert(models.Sequencia).values(nome="alertas_expurgo", valor=0))
+
+def savepoint(db):
+    """db.begin_nested() que também funciona no SQLite.
+
+    O pysqlite só abre a transação antes de um INSERT/UPDATE/DELETE; um SAVEPOINT emitido antes
+    disso vira a própria transação, e o RELEASE faz commit (um rollback posterior não desfaz nada).
+    Então, no SQLite, a transação é aberta explicitamente antes do SAVEPOINT.
+    """
+    conexao = db.connection()
+    if conexao.dialect.name == "sqlite" and not conexao.connection.driver_connection.in_transaction:
+        conexao.exec_driver_sql("BEGIN")
+    return db.begin_nested()
+
 # Base para os modelos declarativos
 Base = declarative_base()
 
@@ -63,6 +215,11 @@ def get_db():
     finally:
         db.close()
 
+# Função de dependência para obter a sessão assíncrona do banco de dados
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Exemplo de como usar (principalmente para testar a conexão inicial se descomentado em main.py)
 # def check_connection():
 #     try:
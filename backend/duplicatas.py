@@ -0,0 +1,96 @@
+import threading
+from collections import deque
+from datetime import timedelta
+
+from espacial import codificar_geohash, celulas_vizinhas, distancia_km, PRECISAO_GEOHASH
+
+# Relatos do mesmo tipo a até RAIO_DUPLICATA_KM de um incidente aberto, feitos até
+# JANELA_DUPLICATAS depois do último relato dele, são anexados ao incidente
+JANELA_DUPLICATAS = timedelta(minutes=30)
+RAIO_DUPLICATA_KM = 0.25
+
+
+class JanelaDuplicatas:
+    """Janela deslizante em memória com os incidentes recentes, por (célula de geohash, tipo).
+
+    Um relato novo só é comparado com os incidentes do mesmo tipo nas 9 células ao
+    redor (precisão 6: ~1,2 km x 0,6 km, o que cobre o raio de duplicata). Cada relato
+    anexado renova o prazo do incidente; os que passam do prazo saem da janela.
+    O índice vive no processo: com vários workers cada um mantém o seu.
+    """
+
+    def __init__(self, janela=JANELA_DUPLICATAS, raio_km=RAIO_DUPLICATA_KM, precisao=PRECISAO_GEOHASH):
+        self.janela = janela
+        self.raio_km = raio_km
+        self.precisao = precisao
+        self._grupos = {}       # (célula, tipo) -> {alerta_id: (latitude, longitude)}
+        self._alertas = {}      # alerta_id -> (célula, tipo, data do último relato)
+        self._ordem = deque()   # (data, alerta_id) na ordem de chegada, para expirar
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._alertas)
+
+    def limpar(self):
+        with self._lock:
+            self._grupos.clear()
+            self._alertas.clear()
+            self._ordem.clear()
+
+    def _expirar(self, agora):
+        limite = agora - self.janela
+        while self._ordem and self._ordem[0][0] < limite:
+            data, alerta_id = self._ordem.popleft()
+            entrada = self._alertas.get(alerta_id)
+            # Uma entrada renovada depois tem outra data e continua na janela
+            if entrada is not None and entrada[2] == data:
+                self._remover_sem_lock(alerta_id)
+
+    def _remover_sem_lock(self, alerta_id):
+        entrada = self._alertas.pop(alerta_id, None)
+        if entrada is None:
+            return
+        chave = (entrada[0], entrada[1])
+        grupo = self._grupos.get(chave)
+        if grupo is not None:
+            grupo.pop(alerta_id, None)
+            if not grupo:
+                del self._grupos[chave]
+
+    def adicionar(self, alerta_id, tipo, latitude, longitude, data):
+        if latitude is None or longitude is None or data is None:
+            return
+        celula = codificar_geohash(latitude, longitude, self.precisao)
+        with self._lock:
+            self._remover_sem_lock(alerta_id)
+            self._alertas[alerta_id] = (celula, tipo, data)
+            self._grupos.setdefault((celula, tipo), {})[alerta_id] = (latitude, longitude)
+            self._ordem.append((data, alerta_id))
+
+    def renovar(self, alerta_id, data):
+        """Estende o prazo do incidente a partir de um relato anexado agora."""
+        with self._lock:
+            entrada = self._alertas.get(alerta_id)
+            if entrada is not None:
+                self._alertas[alerta_id] = (entrada[0], entrada[1], data)
+                self._ordem.append((data, alerta_id))
+
+    def remover(self, alerta_id):
+        with self._lock:
+            self._remover_sem_lock(alerta_id)
+
+    def procurar(self, tipo, latitude, longitude, agora):
+        """Retorna o ID do incidente aberto mais próximo que o relato duplica, ou None."""
+        melhor = None
+        with self._lock:
+            self._expirar(agora)
+            for celula in celulas_vizinhas(latitude, longitude, self.precisao):
+                for alerta_id, (lat, lon) in self._grupos.get((celula, tipo), {}).items():
+                    distancia = distancia_km(latitude, longitude, lat, lon)
+                    if distancia <= self.raio_km and (melhor is None or distancia < melhor[0]):
+                        melhor = (distancia, alerta_id)
+        return melhor[1] if melhor is not None else None
+
+
+# Janela global usada por create_alerta
+janela_duplicatas = JanelaDuplicatas()
@@ -0,0 +1,189 @@
+import math
+import threading
+
+# Precisão do geohash gravado em Alerta.geocelula (6 caracteres ~ 1,2 km x 0,6 km)
+PRECISAO_GEOHASH = 6
+
+# Alfabeto base32 usado pelo geohash
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Raio médio da Terra em km (usado no cálculo de distância)
+RAIO_TERRA_KM = 6371.0088
+
+# Quantos km correspondem a um grau de latitude
+KM_POR_GRAU = 111.32
+
+
+def _bits(precisao):
+    # Um geohash de N caracteres tem 5*N bits, intercalando longitude (primeiro) e latitude
+    total = precisao * 5
+    bits_lon = (total + 1) // 2
+    bits_lat = total // 2
+    return bits_lat, bits_lon
+
+
+def _indices_celula(latitude, longitude, precisao):
+    # Converter a coordenada para os índices inteiros (linha, coluna) da célula no grid do geohash
+    bits_lat, bits_lon = _bits(precisao)
+    linhas = 1 << bits_lat
+    colunas = 1 << bits_lon
+    i = int((latitude + 90.0) / 180.0 * linhas)
+    j = int((longitude + 180.0) / 360.0 * colunas)
+    return min(max(i, 0), linhas - 1), min(max(j, 0), colunas - 1)
+
+
+def _geohash_de_indices(i, j, precisao):
+    # Intercalar os bits da coluna (longitude) e da linha (latitude) e codificar em base32
+    bits_lat, bits_lon = _bits(precisao)
+    valor = 0
+    for n in range(precisao * 5):
+        if n % 2 == 0:
+            bits_lon -= 1
+            bit = (j >> bits_lon) & 1
+        else:
+            bits_lat -= 1
+            bit = (i >> bits_lat) & 1
+        valor = (valor << 1) | bit
+    caracteres = []
+    for _ in range(precisao):
+        caracteres.append(_BASE32[valor & 31])
+        valor >>= 5
+    return "".join(reversed(caracteres))
+
+
+def codificar_geohash(latitude, longitude, precisao=PRECISAO_GEOHASH):
+    i, j = _indices_celula(latitude, longitude, precisao)
+    return _geohash_de_indices(i, j, precisao)
+
+
+def celulas_vizinhas(latitude, longitude, precisao=PRECISAO_GEOHASH):
+    # A célula do ponto e as 8 ao redor (bloco 3x3); nas bordas do mapa o bloco é cortado
+    i, j = _indices_celula(latitude, longitude, precisao)
+    bits_lat, bits_lon = _bits(precisao)
+    linhas = 1 << bits_lat
+    colunas = 1 << bits_lon
+    return [
+        _geohash_de_indices(vi, vj % colunas, precisao)
+        for vi in range(i - 1, i + 2) if 0 <= vi < linhas
+        for vj in range(j - 1, j + 2)
+    ]
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    # Distância de grande círculo (fórmula de haversine)
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def caixa_do_raio(latitude, longitude, raio_km):
+    # Caixa envolvente (min_lat, min_lon, max_lat, max_lon) que contém o círculo de raio_km
+    delta_lat = raio_km / KM_POR_GRAU
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6:
+        delta_lon = 180.0
+    else:
+        delta_lon = min(180.0, raio_km / (KM_POR_GRAU * cos_lat))
+    return (
+        max(-90.0, latitude - delta_lat),
+        max(-180.0, longitude - delta_lon),
+        min(90.0, latitude + delta_lat),
+        min(180.0, longitude + delta_lon),
+    )
+
+
+class IndiceEspacial:
+    """Índice em memória de alertas agrupados por célula de geohash.
+
+    Cada célula guarda os IDs dos alertas que caem nela, e cada alerta guarda
+    (latitude, longitude, status, célula). Uma consulta por área só visita as
+    células que a caixa cobre, em vez de varrer a tabela inteira.
+    O índice vive no processo: com vários workers cada um mantém o seu.
+    """
+
+    def __init__(self, precisao=PRECISAO_GEOHASH):
+        self.precisao = precisao
+        self._celulas = {}
+        self._alertas = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._alertas)
+
+    def limpar(self):
+        with self._lock:
+            self._celulas.clear()
+            self._alertas.clear()
+
+    def adicionar(self, alerta_id, latitude, longitude, status=None, celula=None):
+        if latitude is None or longitude is None:
+            return
+        if celula is None or len(celula) != self.precisao:
+            celula = codificar_geohash(latitude, longitude, self.precisao)
+        with self._lock:
+            self._remover_sem_lock(alerta_id)
+            self._alertas[alerta_id] = (latitude, longitude, status, celula)
+            self._celulas.setdefault(celula, set()).add(alerta_id)
+
+    def remover(self, alerta_id):
+        with self._lock:
+            self._remover_sem_lock(alerta_id)
+
+    def atualizar_status(self, alerta_id, status):
+        with self._lock:
+            entrada = self._alertas.get(alerta_id)
+            if entrada is not None:
+                self._alertas[alerta_id] = (entrada[0], entrada[1], status, entrada[3])
+
+    def _remover_sem_lock(self, alerta_id):
+        entrada = self._alertas.pop(alerta_id, None)
+        if entrada is None:
+            return
+        ids = self._celulas.get(entrada[3])
+        if ids is not None:
+            ids.discard(alerta_id)
+            if not ids:
+                del self._celulas[entrada[3]]
+
+    def _celulas_da_caixa(self, min_lat, min_lon, max_lat, max_lon):
+        i_min, j_min = _indices_celula(min_lat, min_lon, self.precisao)
+        i_max, j_max = _indices_celula(max_lat, max_lon, self.precisao)
+        total = (i_max - i_min + 1) * (j_max - j_min + 1)
+        if total > len(self._celulas):
+            # Caixa muito grande: é mais barato percorrer só as células ocupadas
+            return list(self._celulas.keys())
+        return [
+            _geohash_de_indices(i, j, self.precisao)
+            for i in range(i_min, i_max + 1)
+            for j in range(j_min, j_max + 1)
+        ]
+
+    def buscar_area(self, min_lat, min_lon, max_lat, max_lon, status=None):
+        """Retorna [(id, latitude, longitude)] dos alertas dentro da caixa."""
+        resultado = []
+        with self._lock:
+            for celula in self._celulas_da_caixa(min_lat, min_lon, max_lat, max_lon):
+                for alerta_id in self._celulas.get(celula, ()):
+                    lat, lon, status_alerta, _ = self._alertas[alerta_id]
+                    if status is not None and status_alerta != status:
+                        continue
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        resultado.append((alerta_id, lat, lon))
+        return resultado
+
+    def buscar_raio(self, latitude, longitude, raio_km, status=None):
+        """Retorna [(distancia_km, id)] dos alertas no raio, do mais próximo ao mais distante."""
+        min_lat, min_lon, max_lat, max_lon = caixa_do_raio(latitude, longitude, raio_km)
+        resultado = []
+        for alerta_id, lat, lon in self.buscar_area(min_lat, min_lon, max_lat, max_lon, status):
+            distancia = distancia_km(latitude, longitude, lat, lon)
+            if distancia <= raio_km:
+                resultado.append((distancia, alerta_id))
+        resultado.sort()
+        return resultado
+
+
+# Índice global de alertas usado pelas rotas da API
+indice_alertas = IndiceEspacial()
@@ -0,0 +1,206 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, update, delete, func, bindparam, or_, and_, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from database import savepoint
+
+# Status em que um alerta deixa de contar como aberto
+STATUS_FECHADOS = {"Resolvido"}
+
+# Janelas padrão das séries temporais devolvidas por /alertas/estatisticas
+HORAS_PADRAO = 48
+DIAS_PADRAO = 30
+
+# Oracle limita listas IN a 1000 elementos
+TAMANHO_LOTE_CHAVES = 500
+
+_tabela = models.AlertaContador.__table__
+
+# UPDATE total = total + delta, executado em lote (executemany) para as chaves que já existem
+_somar_contador = (
+    update(_tabela)
+    .where(_tabela.c.dimensao == bindparam("b_dimensao"), _tabela.c.chave == bindparam("b_chave"))
+    .values(total=_tabela.c.total + bindparam("b_delta"))
+)
+
+
+def chave_dia(data):
+    return data.strftime("%Y-%m-%d")
+
+
+def chave_hora(data):
+    return data.strftime("%Y-%m-%d %H")
+
+
+def deltas_do_alerta(tipo, status, data_ocorrencia, regiao_ids=(), sinal=1):
+    """Contadores afetados por um alerta (sinal=1 ao criar, -1 ao remover)."""
+    deltas = Counter()
+    deltas[("total", "todos")] += sinal
+    deltas[("status", status)] += sinal
+    deltas[("tipo", tipo)] += sinal
+    if status not in STATUS_FECHADOS:
+        deltas[("abertos_tipo", tipo)] += sinal
+    for regiao_id in regiao_ids or ():
+        deltas[("regiao", str(regiao_id))] += sinal
+    if data_ocorrencia is not None:
+        deltas[("dia", chave_dia(data_ocorrencia))] += sinal
+        deltas[("hora", chave_hora(data_ocorrencia))] += sinal
+    return deltas
+
+
+def deltas_de_status(tipo, status_anterior, status_novo):
+    deltas = Counter()
+    if status_anterior == status_novo:
+        return deltas
+    deltas[("status", status_anterior)] -= 1
+    deltas[("status", status_novo)] += 1
+    if status_anterior in STATUS_FECHADOS and status_novo not in STATUS_FECHADOS:
+        deltas[("abertos_tipo", tipo)] += 1
+    elif status_anterior not in STATUS_FECHADOS and status_novo in STATUS_FECHADOS:
+        deltas[("abertos_tipo", tipo)] -= 1
+    return deltas
+
+
+def _normalizar(deltas):
+    # Chaves nulas (tipo/status ausentes) são gravadas como texto vazio
+    normalizados = Counter()
+    for (dimensao, chave), delta in deltas.items():
+        normalizados[(dimensao, "" if chave is None else str(chave))] += delta
+    return {chave: delta for chave, delta in normalizados.items() if delta}
+
+
+def aplicar_deltas(db: Session, deltas):
+    """Soma os deltas nos contadores dentro da transação da sessão (não faz commit).
+
+    Uma consulta descobre quais chaves já existem; elas recebem um UPDATE em lote e as
+    novas um INSERT em lote. Se outra transação criar a mesma chave ao mesmo tempo, o
+    INSERT (em um savepoint) falha e os deltas são somados com UPDATE.
+    """
+    deltas = _normalizar(deltas)
+    if not deltas:
+        return
+    chaves = list(deltas)
+    existentes = set()
+    for inicio in range(0, len(chaves), TAMANHO_LOTE_CHAVES):
+        lote = chaves[inicio:inicio + TAMANHO_LOTE_CHAVES]
+        existentes.update(
+            tuple(linha) for linha in db.execute(
+                select(_tabela.c.dimensao, _tabela.c.chave).where(tuple_(_tabela.c.dimensao, _tabela.c.chave).in_(lote))
+            )
+        )
+
+    somar = [chave for chave in chaves if chave in existentes]
+    novas = [chave for chave in chaves if chave not in existentes]
+    if novas:
+        try:
+            with savepoint(db):
+                db.execute(
+                    insert(_tabela),
+                    [{"dimensao": dimensao, "chave": chave, "total": deltas[(dimensao, chave)]} for dimensao, chave in novas]
+                )
+        except IntegrityError:
+            somar += novas
+    if somar:
+        db.execute(
+            _somar_contador,
+            [{"b_dimensao": dimensao, "b_chave": chave, "b_delta": deltas[(dimensao, chave)]} for dimensao, chave in somar]
+        )
+
+
+def definir_contador(db: Session, dimensao, chave, total):
+    """Grava o valor absoluto de um contador (usado quando uma região é reassociada)."""
+    db.execute(delete(_tabela).where(_tabela.c.dimensao == dimensao, _tabela.c.chave == str(chave)))
+    if total:
+        db.execute(insert(_tabela), [{"dimensao": dimensao, "chave": str(chave), "total": total}])
+
+
+def reconstruir(db: Session, arquivados=()):
+    """Recalcula todos os contadores a partir das tabelas alertas e alerta_regiao e faz commit.
+
+    Os alertas arquivados (historico.py) continuam contando: os contadores são totais históricos.
+    `arquivados` traz (tipo, status, data_ocorrencia) de cada um (ArquivoHistorico.contagens) e as
+    regiões vêm de regiao_usuarios_arquivados.
+    """
+    deltas = Counter()
+    consulta = (
+        select(models.Alerta.tipo, models.Alerta.status, models.Alerta.data_ocorrencia)
+        .where(models.Alerta.removido_em.is_(None)) # Tombstones de alertas removidos não contam
+        .execution_options(yield_per=1000)
+    )
+    for tipo, status, data_ocorrencia in db.execute(consulta):
+        deltas.update(deltas_do_alerta(tipo, status, data_ocorrencia))
+    for tipo, status, data_ocorrencia in arquivados:
+        deltas.update(deltas_do_alerta(tipo, status, data_ocorrencia))
+    for regiao_id, total in db.execute(
+        select(models.AlertaRegiao.regiao_id, func.count()).group_by(models.AlertaRegiao.regiao_id)
+    ):
+        deltas[("regiao", str(regiao_id))] += total
+    for regiao_id, total in db.execute(
+        select(models.RegiaoUsuarioArquivado.regiao_id, func.sum(models.RegiaoUsuarioArquivado.alertas))
+        .group_by(models.RegiaoUsuarioArquivado.regiao_id)
+    ):
+        deltas[("regiao", str(regiao_id))] += total
+
+    db.execute(delete(_tabela))
+    linhas = [
+        {"dimensao": dimensao, "chave": chave, "total": total}
+        for (dimensao, chave), total in _normalizar(deltas).items()
+    ]
+    if linhas:
+        db.execute(insert(_tabela), linhas)
+    db.commit()
+    return len(linhas)
+
+
+def consultar(db: Session, desde=None, agora=None):
+    """Monta o resumo do painel lendo só os contadores (custo proporcional ao número de buckets).
+
+    As séries por hora e por dia começam em `desde`; por padrão as últimas HORAS_PADRAO horas
+    e os últimos DIAS_PADRAO dias.
+    """
+    agora = agora or datetime.now()
+    hora_desde = chave_hora(desde or agora - timedelta(hours=HORAS_PADRAO - 1))
+    dia_desde = chave_dia(desde or agora - timedelta(days=DIAS_PADRAO - 1))
+    linhas = db.execute(
+        select(_tabela.c.dimensao, _tabela.c.chave, _tabela.c.total).where(
+            _tabela.c.total != 0,
+            or_(
+                _tabela.c.dimensao.notin_(["hora", "dia"]),
+                and_(_tabela.c.dimensao == "hora", _tabela.c.chave >= hora_desde),
+                and_(_tabela.c.dimensao == "dia", _tabela.c.chave >= dia_desde),
+            )
+        )
+    ).all()
+
+    por_dimensao = {}
+    for dimensao, chave, total in linhas:
+        por_dimensao.setdefault(dimensao, {})[chave] = total
+    total = por_dimensao.get("total", {}).get("todos", 0)
+    por_status = por_dimensao.get("status", {})
+    fechados = sum(por_status.get(status, 0) for status in STATUS_FECHADOS)
+    return {
+        "total": total,
+        "abertos": total - fechados,
+        "por_status": por_status,
+        "por_tipo": por_dimensao.get("tipo", {}),
+        "abertos_por_tipo": por_dimensao.get("abertos_tipo", {}),
+        "por_regiao": por_dimensao.get("regiao", {}),
+        "por_dia": dict(sorted(por_dimensao.get("dia", {}).items())),
+        "por_hora": dict(sorted(por_dimensao.get("hora", {}).items())),
+    }
+
+
+# Comando para reconstruir os contadores: python estatisticas.py
+if __name__ == "__main__":
+    from database import SessionLocal
+    from historico import arquivo_historico # historico importa este módulo; aqui só no script
+
+    db = SessionLocal()
+    try:
+        print(f"Contadores de alertas reconstruídos: {reconstruir(db, arquivo_historico.contagens())} linhas.")
+    finally:
+        db.close()
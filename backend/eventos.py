@@ -0,0 +1,98 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+
+# Quantos eventos recentes ficam guardados para clientes que reconectam (Last-Event-ID)
+TAMANHO_BUFFER_REPLAY = 1000
+
+# Eventos pendentes por assinante; um cliente que fica para trás além disso é desconectado
+TAMANHO_FILA_ASSINANTE = 1000
+
+
+class Assinante:
+    def __init__(self, loop):
+        self.loop = loop
+        self.fila = asyncio.Queue(maxsize=TAMANHO_FILA_ASSINANTE)
+        self.perdeu_eventos = False # O evento pedido já saiu do buffer: o cliente deve recarregar a lista
+
+    def _entregar(self, evento):
+        # Executado no loop do assinante
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento demais: sinalizar o fim do stream para ele reconectar com Last-Event-ID
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait(None)
+
+
+def ler_id_evento(texto):
+    """Separa um ID de evento ("época-sequência") nas duas partes; None se não for um ID válido."""
+    epoca, _, sequencia = (texto or "").partition("-")
+    if not epoca or not sequencia.isdigit():
+        return None
+    return epoca, int(sequencia)
+
+
+class Broker:
+    """Pub/sub em memória do processo para o feed de alertas em tempo real.
+
+    As rotas publicam eventos (de qualquer thread) e cada conexão SSE assina com
+    uma fila asyncio própria. Os últimos eventos ficam num buffer circular para
+    que um cliente que reconecta possa retomar a partir do último ID recebido.
+
+    A sequência dos IDs recomeça a cada início do processo, por isso cada ID leva
+    a época do broker ("época-sequência"): um ID de outra época não é comparável
+    e o cliente recebe "reset" em vez de uma retomada com eventos faltando.
+    """
+
+    def __init__(self, tamanho_buffer=TAMANHO_BUFFER_REPLAY, epoca=None):
+        self.epoca = epoca or format(time.time_ns() // 1_000_000, "x") # Milissegundos do início, em hexadecimal
+        self._ids = itertools.count(1)
+        self._buffer = deque(maxlen=tamanho_buffer)
+        self._assinantes = set()
+        self._lock = threading.Lock()
+
+    def publicar(self, tipo, dados):
+        with self._lock:
+            sequencia = next(self._ids)
+            evento = {"id": f"{self.epoca}-{sequencia}", "sequencia": sequencia, "tipo": tipo, "dados": dados}
+            self._buffer.append(evento)
+            assinantes = list(self._assinantes)
+        for assinante in assinantes:
+            try:
+                assinante.loop.call_soon_threadsafe(assinante._entregar, evento)
+            except RuntimeError:
+                # Loop já encerrado: a conexão foi fechada sem cancelar a assinatura
+                self.cancelar(assinante)
+        return evento
+
+    def assinar(self, loop, desde_id=None):
+        """Assina o feed; `desde_id` é o último ID recebido pelo cliente ("época-sequência")."""
+        assinante = Assinante(loop)
+        with self._lock:
+            if desde_id is not None:
+                lido = ler_id_evento(desde_id)
+                if lido is None or lido[0] != self.epoca:
+                    # ID de antes de um reinício (ou inválido): não há como saber o que foi perdido
+                    assinante.perdeu_eventos = True
+                else:
+                    desde = lido[1]
+                    ultima = self._buffer[-1]["sequencia"] if self._buffer else 0
+                    if desde > ultima or (self._buffer and self._buffer[0]["sequencia"] > desde + 1):
+                        assinante.perdeu_eventos = True
+                    for evento in self._buffer:
+                        if evento["sequencia"] > desde:
+                            assinante.fila.put_nowait(evento)
+            self._assinantes.add(assinante)
+        return assinante
+
+    def cancelar(self, assinante):
+        with self._lock:
+            self._assinantes.discard(assinante)
+
+
+# Broker global usado pelas rotas de alertas
+broker_alertas = Broker()
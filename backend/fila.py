@@ -0,0 +1,257 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Fila local de jobs em SQLite (um arquivo por servidor, fora do Oracle)
+# FILA_JOBS_ATIVA=0 executa cada job na hora, dentro da própria chamada (sem arquivo nem threads)
+ATIVA = os.getenv("FILA_JOBS_ATIVA", "true").lower() in ("1", "true", "sim", "yes")
+ARQUIVO = os.getenv("FILA_JOBS_ARQUIVO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fila_jobs.db"))
+WORKERS = int(os.getenv("FILA_JOBS_WORKERS", "2"))
+MAX_TENTATIVAS = int(os.getenv("FILA_JOBS_MAX_TENTATIVAS", "5"))
+
+# Espera antes da tentativa n: ATRASO_BASE_S * 2^(n-1), limitada a ATRASO_MAXIMO_S
+ATRASO_BASE_S = 1.0
+ATRASO_MAXIMO_S = 300.0
+
+# Intervalo máximo entre consultas à fila quando não há jobs novos
+INTERVALO_ESPERA_S = 1.0
+
+# Jobs concluídos ficam guardados por este tempo (para /jobs/status e para a chave de idempotência)
+RETENCAO_CONCLUIDOS_S = 24 * 3600
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo TEXT NOT NULL,
+    chave TEXT UNIQUE,
+    dados TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    disponivel_em REAL NOT NULL,
+    criado_em REAL NOT NULL,
+    concluido_em REAL,
+    erro TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_estado_disponivel ON jobs (estado, disponivel_em, id);
+"""
+
+
+class FilaJobs:
+    """Fila persistente de jobs em um arquivo SQLite local, consumida por threads do próprio processo.
+
+    Cada job tem um tipo (o nome de uma função registrada) e dados em JSON. Jobs com a
+    mesma chave de idempotência são enfileirados uma vez só. Um job que falha volta
+    para a fila com espera exponencial até MAX_TENTATIVAS, depois fica como 'falhou'
+    (até ser enfileirado de novo com a mesma chave, o que o reinicia).
+    Os workers são threads (e não processos) porque os jobs atualizam os índices e
+    rankings em memória deste processo; jobs que estavam em execução quando o processo
+    caiu voltam para a fila na próxima inicialização, então os jobs devem ser idempotentes.
+    """
+
+    def __init__(self, arquivo=ARQUIVO, workers=WORKERS, max_tentativas=MAX_TENTATIVAS, ativa=ATIVA):
+        self.arquivo = arquivo
+        self.workers = workers
+        self.max_tentativas = max_tentativas
+        self.ativa = ativa
+        self._funcoes = {}
+        self._local = threading.local()
+        self._threads = []
+        self._parar = threading.Event()
+        self._novo_job = threading.Event()
+        self._esquema_criado = False
+        self._lock = threading.Lock()
+        self._ultima_limpeza = 0.0
+
+    def registrar(self, tipo, funcao):
+        self._funcoes[tipo] = funcao
+
+    def _conexao(self):
+        # Uma conexão por thread; autocommit (isolation_level=None) e transações explícitas
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.arquivo, timeout=30, isolation_level=None, check_same_thread=False)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._esquema_criado:
+                    conexao.executescript(_ESQUEMA)
+                    self._esquema_criado = True
+            self._local.conexao = conexao
+        return conexao
+
+    def enfileirar(self, tipo, dados, chave=None):
+        """Grava o job e acorda um worker; retorna o ID do job (o já existente, se a chave se repete).
+
+        Com a fila desativada, executa o job imediatamente e retorna None.
+        """
+        if tipo not in self._funcoes:
+            raise ValueError(f"Tipo de job desconhecido: {tipo}")
+        if not self.ativa:
+            self._funcoes[tipo](dados)
+            return None
+
+        conexao = self._conexao()
+        agora = time.time()
+        # Chave repetida: um job pendente, em execução ou concluído fica como está; um que já falhou
+        # (esgotou as tentativas) volta para a fila do zero, senão nunca mais seria executado
+        cursor = conexao.execute(
+            "INSERT INTO jobs (tipo, chave, dados, disponivel_em, criado_em) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (chave) DO UPDATE SET estado = 'pendente', tentativas = 0, dados = excluded.dados, "
+            "disponivel_em = excluded.disponivel_em, concluido_em = NULL, erro = NULL WHERE jobs.estado = 'falhou'",
+            (tipo, chave, json.dumps(dados), agora, agora)
+        )
+        if chave is None:
+            job_id = cursor.lastrowid
+        else:
+            job_id = conexao.execute("SELECT id FROM jobs WHERE chave = ?", (chave,)).fetchone()[0]
+        self._novo_job.set()
+        return job_id
+
+    def _reservar(self):
+        # BEGIN IMMEDIATE: só um worker por vez escolhe e marca o próximo job
+        conexao = self._conexao()
+        agora = time.time()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            linha = conexao.execute(
+                "SELECT id, tipo, dados, tentativas FROM jobs WHERE estado = 'pendente' AND disponivel_em <= ? "
+                "ORDER BY disponivel_em, id LIMIT 1",
+                (agora,)
+            ).fetchone()
+            if linha is not None:
+                conexao.execute(
+                    "UPDATE jobs SET estado = 'executando', tentativas = tentativas + 1 WHERE id = ?", (linha[0],)
+                )
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+        return linha
+
+    def _concluir(self, job_id):
+        self._conexao().execute(
+            "UPDATE jobs SET estado = 'concluido', concluido_em = ?, erro = NULL WHERE id = ?", (time.time(), job_id)
+        )
+
+    def _falhar(self, job_id, tentativas, erro):
+        agora = time.time()
+        if tentativas >= self.max_tentativas:
+            self._conexao().execute(
+                "UPDATE jobs SET estado = 'falhou', concluido_em = ?, erro = ? WHERE id = ?", (agora, erro, job_id)
+            )
+        else:
+            espera = min(ATRASO_BASE_S * 2 ** (tentativas - 1), ATRASO_MAXIMO_S)
+            self._conexao().execute(
+                "UPDATE jobs SET estado = 'pendente', disponivel_em = ?, erro = ? WHERE id = ?",
+                (agora + espera, erro, job_id)
+            )
+
+    def executar_proximo(self):
+        """Executa um job disponível; retorna False se a fila não tinha nenhum."""
+        linha = self._reservar()
+        if linha is None:
+            return False
+        job_id, tipo, dados, tentativas = linha
+        try:
+            self._funcoes[tipo](json.loads(dados))
+        except Exception as e:
+            print(f"Erro no job {job_id} ({tipo}), tentativa {tentativas + 1}: {e}")
+            self._falhar(job_id, tentativas + 1, str(e)[:1000])
+        else:
+            self._concluir(job_id)
+        return True
+
+    def _limpar_concluidos(self):
+        agora = time.time()
+        if agora - self._ultima_limpeza < 60:
+            return
+        self._ultima_limpeza = agora
+        self._conexao().execute(
+            "DELETE FROM jobs WHERE estado = 'concluido' AND concluido_em < ?", (agora - RETENCAO_CONCLUIDOS_S,)
+        )
+
+    def _worker(self):
+        while not self._parar.is_set():
+            try:
+                if self.executar_proximo():
+                    continue
+                self._limpar_concluidos()
+            except Exception as e:
+                print(f"Erro no worker da fila de jobs: {e}")
+            self._novo_job.wait(INTERVALO_ESPERA_S)
+            self._novo_job.clear()
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is not None:
+            conexao.close()
+            self._local.conexao = None
+
+    def iniciar(self):
+        if not self.ativa or self._threads:
+            return
+        # Jobs interrompidos por uma queda do processo voltam para a fila
+        self._conexao().execute("UPDATE jobs SET estado = 'pendente' WHERE estado = 'executando'")
+        self._parar.clear()
+        for indice in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"fila-jobs-{indice}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def parar(self, timeout=30):
+        """Para os workers depois do job que cada um está executando."""
+        self._parar.set()
+        self._novo_job.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def aguardar(self, timeout=30):
+        """Espera a fila esvaziar (jobs pendentes já disponíveis e em execução); retorna se esvaziou."""
+        limite = time.time() + timeout
+        while time.time() < limite:
+            agora = time.time()
+            restantes = self._conexao().execute(
+                "SELECT COUNT(*) FROM jobs WHERE estado = 'executando' OR (estado = 'pendente' AND disponivel_em <= ?)",
+                (agora,)
+            ).fetchone()[0]
+            if restantes == 0:
+                return True
+            self._novo_job.set()
+            time.sleep(0.01)
+        return False
+
+    def status(self):
+        """Profundidade da fila, atraso do job pendente mais antigo e as falhas mais recentes."""
+        if not self.ativa:
+            return {"ativa": False, "workers": 0}
+        conexao = self._conexao()
+        agora = time.time()
+        por_estado = dict(conexao.execute("SELECT estado, COUNT(*) FROM jobs GROUP BY estado").fetchall())
+        por_tipo = dict(conexao.execute(
+            "SELECT tipo, COUNT(*) FROM jobs WHERE estado IN ('pendente', 'executando') GROUP BY tipo"
+        ).fetchall())
+        mais_antigo = conexao.execute(
+            "SELECT MIN(criado_em) FROM jobs WHERE estado IN ('pendente', 'executando')"
+        ).fetchone()[0]
+        falhas = [
+            {"id": job_id, "tipo": tipo, "tentativas": tentativas, "estado": estado, "erro": erro}
+            for job_id, tipo, tentativas, estado, erro in conexao.execute(
+                "SELECT id, tipo, tentativas, estado, erro FROM jobs WHERE erro IS NOT NULL ORDER BY id DESC LIMIT 10"
+            )
+        ]
+        return {
+            "ativa": True,
+            "workers": sum(1 for thread in self._threads if thread.is_alive()),
+            "pendentes": por_estado.get("pendente", 0),
+            "executando": por_estado.get("executando", 0),
+            "concluidos": por_estado.get("concluido", 0),
+            "falhos": por_estado.get("falhou", 0),
+            "por_tipo": por_tipo,
+            "atraso_s": round(agora - mais_antigo, 3) if mais_antigo is not None else 0.0,
+            "falhas_recentes": falhas,
+        }
+
+
+# Fila global usada pelas rotas da API
+fila_jobs = FilaJobs()
@@ -0,0 +1,542 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import database
+import models
+from estatisticas import STATUS_FECHADOS
+from versoes import expurgar_tombstones, reservar_versoes
+
+try:
+    import fcntl # Trava entre processos (workers do uvicorn); indisponível no Windows
+except ImportError:
+    fcntl = None
+
+# Arquivamento dos alertas antigos já encerrados, configurável pelo .env
+# ARQUIVO_HISTORICO_DIR: pasta dos arquivos colunares (uma subpasta AAAA-MM por mês de data_ocorrencia)
+# ARQUIVAMENTO_IDADE_DIAS: idade mínima de um alerta encerrado para sair da tabela alertas
+# ARQUIVAMENTO_INTERVALO_H: intervalo do arquivamento automático (0 desliga; a rota e o script continuam)
+# ARQUIVAMENTO_LOTE: alertas movidos por transação (e por segmento)
+ARQUIVO_HISTORICO_DIR = os.getenv(
+    "ARQUIVO_HISTORICO_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "historico")
+)
+ARQUIVAMENTO_IDADE_DIAS = int(os.getenv("ARQUIVAMENTO_IDADE_DIAS", "90"))
+ARQUIVAMENTO_INTERVALO_H = float(os.getenv("ARQUIVAMENTO_INTERVALO_H", "24"))
+ARQUIVAMENTO_LOTE = int(os.getenv("ARQUIVAMENTO_LOTE", "10000"))
+
+# Linhas por bloco comprimido de texto (título e descrição): uma página só descomprime os blocos que usa
+LINHAS_POR_BLOCO_TEXTO = 1024
+
+# Segmento ainda não confirmado no banco (ver ArquivoHistorico.arquivar)
+SUFIXO_PENDENTE = ".pendente"
+
+# Remoção de um alerta arquivado da tabela quente (executemany): compare-and-set no status lido
+_tabela_alertas = models.Alerta.__table__
+_remover_arquivado = delete(_tabela_alertas).where(
+    _tabela_alertas.c.id == bindparam("b_id"),
+    _tabela_alertas.c.status == bindparam("b_status"),
+    _tabela_alertas.c.removido_em.is_(None),
+)
+
+# Alertas arquivados por região e usuário (executemany sobre as linhas que já existem)
+_tabela_regioes_arquivados = models.RegiaoUsuarioArquivado.__table__
+_somar_regiao_arquivados = (
+    update(_tabela_regioes_arquivados)
+    .where(
+        _tabela_regioes_arquivados.c.regiao_id == bindparam("b_regiao_id"),
+        _tabela_regioes_arquivados.c.usuario_id == bindparam("b_usuario_id"),
+    )
+    .values(alertas=_tabela_regioes_arquivados.c.alertas + bindparam("b_alertas"))
+)
+
+# Colunas numéricas de cada segmento, gravadas como .npy (lidas com memória mapeada)
+COLUNAS_NUMERICAS = ("id", "data", "latitude", "longitude", "tipo", "status", "usuario_id", "relatos")
+
+
+def _codificar(valores):
+    # Dicionário de valores distintos + códigos inteiros (os tipos e status se repetem muito)
+    dicionario = sorted({valor or "" for valor in valores})
+    posicoes = {valor: codigo for codigo, valor in enumerate(dicionario)}
+    tipo_codigo = np.uint8 if len(dicionario) <= 256 else np.uint16 if len(dicionario) <= 65536 else np.uint32
+    return dicionario, np.fromiter((posicoes[valor or ""] for valor in valores), dtype=tipo_codigo, count=len(valores))
+
+
+def _sem_fuso(data):
+    return data.replace(tzinfo=None) if data.tzinfo is not None else data
+
+
+class Segmento:
+    """Um lote de alertas arquivados: colunas .npy ordenadas por (data, id) e textos em blocos zlib.
+
+    As colunas numéricas são abertas com memória mapeada (np.load mmap_mode="r"): só as páginas
+    lidas por uma consulta entram na memória. Tipo e status ficam codificados por dicionário
+    e título/descrição, que só aparecem no resultado, ficam comprimidos.
+    """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        with open(os.path.join(pasta, "meta.json"), encoding="utf-8") as arquivo:
+            self.meta = json.load(arquivo)
+        self.colunas = {
+            nome: np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode="r") for nome in COLUNAS_NUMERICAS
+        }
+        self.blocos = np.load(os.path.join(pasta, "texto_blocos.npy"))
+        self.data_min = np.datetime64(self.meta["data_min"], "s")
+        self.data_max = np.datetime64(self.meta["data_max"], "s")
+
+    def __len__(self):
+        return self.meta["linhas"]
+
+    def pode_conter(self, desde, ate, caixa, tipo):
+        meta = self.meta
+        if desde is not None and self.data_max < desde:
+            return False
+        if ate is not None and self.data_min >= ate:
+            return False
+        if tipo is not None and tipo not in meta["tipos"]:
+            return False
+        if caixa is not None and (
+            meta["lat_max"] < caixa[0] or meta["lon_max"] < caixa[1] or meta["lat_min"] > caixa[2] or meta["lon_min"] > caixa[3]
+        ):
+            return False
+        return True
+
+    def filtrar(self, desde=None, ate=None, caixa=None, tipo=None, cursor=None):
+        """Posições das linhas que passam nos filtros (vetorizado; o intervalo de tempo por busca binária)."""
+        datas = self.colunas["data"]
+        inicio = 0 if desde is None else int(np.searchsorted(datas, desde, side="left"))
+        fim = len(datas) if ate is None else int(np.searchsorted(datas, ate, side="left"))
+        if cursor is not None:
+            fim = min(fim, int(np.searchsorted(datas, cursor[0], side="right")))
+        if inicio >= fim:
+            return np.empty(0, dtype=np.int64)
+
+        mascara = np.ones(fim - inicio, dtype=bool)
+        if tipo is not None:
+            mascara &= self.colunas["tipo"][inicio:fim] == self.meta["tipos"].index(tipo)
+        if caixa is not None:
+            latitudes = self.colunas["latitude"][inicio:fim]
+            longitudes = self.colunas["longitude"][inicio:fim]
+            mascara &= (latitudes >= caixa[0]) & (latitudes <= caixa[2]) & (longitudes >= caixa[1]) & (longitudes <= caixa[3])
+        if cursor is not None:
+            # Mesma regra do cursor de /alertas/: antes de (data, id) do último item recebido
+            trecho = datas[inicio:fim]
+            mascara &= (trecho < cursor[0]) | (self.colunas["id"][inicio:fim] < cursor[1])
+        return np.flatnonzero(mascara) + inicio
+
+    def textos(self, posicoes):
+        """{posição: (título, descrição)} descomprimindo só os blocos necessários."""
+        resultado = {}
+        por_bloco = defaultdict(list)
+        for posicao in posicoes:
+            por_bloco[posicao // LINHAS_POR_BLOCO_TEXTO].append(posicao)
+        with open(os.path.join(self.pasta, "texto.bin"), "rb") as arquivo:
+            for bloco, posicoes_bloco in por_bloco.items():
+                arquivo.seek(int(self.blocos[bloco]))
+                linhas = json.loads(zlib.decompress(arquivo.read(int(self.blocos[bloco + 1] - self.blocos[bloco]))))
+                for posicao in posicoes_bloco:
+                    resultado[posicao] = linhas[posicao - bloco * LINHAS_POR_BLOCO_TEXTO]
+        return resultado
+
+    def linha(self, posicao, textos):
+        # Mesma ordem de COLUNAS_ALERTA (main.py): id, tipo, descricao, latitude, longitude, status, data, relatos
+        colunas = self.colunas
+        return (
+            int(colunas["id"][posicao]),
+            self.meta["tipos"][colunas["tipo"][posicao]] or None,
+            textos[posicao][1],
+            float(colunas["latitude"][posicao]),
+            float(colunas["longitude"][posicao]),
+            self.meta["status"][colunas["status"][posicao]] or None,
+            colunas["data"][posicao].astype("datetime64[s]").item(),
+            int(colunas["relatos"][posicao]),
+        )
+
+
+def gravar_segmento(pasta, linhas):
+    """Grava um segmento em `pasta` com as linhas (id, titulo, tipo, descricao, latitude, longitude,
+    status, data_ocorrencia, usuario_id, relatos), ordenadas por (data_ocorrencia, id)."""
+    linhas = sorted(linhas, key=lambda linha: (_sem_fuso(linha[7]), linha[0]))
+    os.makedirs(pasta)
+    total = len(linhas)
+    tipos, codigos_tipo = _codificar([linha[2] for linha in linhas])
+    status, codigos_status = _codificar([linha[6] for linha in linhas])
+    colunas = {
+        "id": np.fromiter((linha[0] for linha in linhas), dtype=np.int64, count=total),
+        "data": np.array([_sem_fuso(linha[7]) for linha in linhas], dtype="datetime64[s]"),
+        "latitude": np.fromiter((linha[4] for linha in linhas), dtype=np.float64, count=total),
+        "longitude": np.fromiter((linha[5] for linha in linhas), dtype=np.float64, count=total),
+        "tipo": codigos_tipo,
+        "status": codigos_status,
+        "usuario_id": np.fromiter((linha[8] for linha in linhas), dtype=np.int64, count=total),
+        "relatos": np.fromiter((linha[9] or 1 for linha in linhas), dtype=np.int32, count=total),
+    }
+    for nome, valores in colunas.items():
+        np.save(os.path.join(pasta, f"{nome}.npy"), valores)
+
+    deslocamentos = [0]
+    with open(os.path.join(pasta, "texto.bin"), "wb") as arquivo:
+        for inicio in range(0, total, LINHAS_POR_BLOCO_TEXTO):
+            bloco = [[linha[1], linha[3]] for linha in linhas[inicio:inicio + LINHAS_POR_BLOCO_TEXTO]]
+            deslocamentos.append(deslocamentos[-1] + arquivo.write(zlib.compress(json.dumps(bloco, ensure_ascii=False).encode("utf-8"))))
+    np.save(os.path.join(pasta, "texto_blocos.npy"), np.array(deslocamentos, dtype=np.int64))
+
+    # meta.json por último: um segmento sem ele está incompleto
+    meta = {
+        "linhas": total,
+        "tipos": tipos,
+        "status": status,
+        "data_min": str(colunas["data"][0]),
+        "data_max": str(colunas["data"][-1]),
+        "lat_min": float(colunas["latitude"].min()),
+        "lat_max": float(colunas["latitude"].max()),
+        "lon_min": float(colunas["longitude"].min()),
+        "lon_max": float(colunas["longitude"].max()),
+    }
+    with open(os.path.join(pasta, "meta.json"), "w", encoding="utf-8") as arquivo:
+        json.dump(meta, arquivo, ensure_ascii=False)
+
+
+def sincronizar_pasta(pasta):
+    """fsync dos arquivos de `pasta` e da própria pasta (o segmento sobrevive a uma queda da máquina)."""
+    for entrada in os.scandir(pasta):
+        if entrada.is_file():
+            with open(entrada.path, "rb") as arquivo:
+                os.fsync(arquivo.fileno())
+    _sincronizar_diretorio(pasta)
+
+
+def _sincronizar_diretorio(pasta):
+    # Entradas do diretório (criação e renomeação); o Windows não abre diretórios
+    try:
+        descritor = os.open(pasta, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descritor)
+    finally:
+        os.close(descritor)
+
+
+class ArquivoHistorico:
+    """Partição fria dos alertas: arquivos colunares por mês, fora do banco.
+
+    arquivar() move os alertas encerrados mais antigos que a idade configurada para um
+    segmento novo em <pasta>/<AAAA-MM>/ e os apaga da tabela alertas. No lugar de cada um fica
+    um tombstone em alertas_arquivados (ID e versão nova, para o GET /alertas/sync) e as
+    associações com regiões viram totais por região e usuário em regiao_usuarios_arquivados.
+    consultar() percorre os meses do mais recente ao mais antigo, descartando segmentos
+    pelos limites do meta.json, e filtra as colunas com numpy.
+    Os contadores do painel e os rankings continuam com os totais históricos; só os índices em
+    memória deixam de ter os alertas arquivados (`ao_arquivar(linhas)`, chamado depois de cada lote).
+    """
+
+    def __init__(self, pasta=ARQUIVO_HISTORICO_DIR, idade_dias=ARQUIVAMENTO_IDADE_DIAS, intervalo_h=ARQUIVAMENTO_INTERVALO_H):
+        self.pasta = pasta
+        self.idade_dias = idade_dias
+        self.intervalo_h = intervalo_h
+        self.ao_arquivar = None
+        self._segmentos = {} # caminho -> Segmento já aberto
+        self._lock = threading.Lock()
+        self._tarefa = None
+
+    # --- Consulta ---
+
+    def _catalogo(self):
+        # {mês: [Segmento]}; a listagem é refeita a cada consulta para ver segmentos de outros processos
+        meses = defaultdict(list)
+        if not os.path.isdir(self.pasta):
+            return meses
+        with self._lock:
+            vistos = set()
+            for mes in os.scandir(self.pasta):
+                if not mes.is_dir():
+                    continue
+                for entrada in os.scandir(mes.path):
+                    if not entrada.is_dir() or entrada.name.endswith(SUFIXO_PENDENTE):
+                        continue
+                    segmento = self._segmentos.get(entrada.path)
+                    if segmento is None:
+                        segmento = self._segmentos[entrada.path] = Segmento(entrada.path)
+                    vistos.add(entrada.path)
+                    meses[mes.name].append(segmento)
+            for caminho in set(self._segmentos) - vistos:
+                del self._segmentos[caminho]
+        return meses
+
+    def consultar(self, desde=None, ate=None, caixa=None, tipo=None, cursor=None, limite=100):
+        """Alertas arquivados do mais recente ao mais antigo, como tuplas na ordem de COLUNAS_ALERTA.
+
+        caixa é (min_lat, min_lon, max_lat, max_lon); cursor é (data, id) do último item da página anterior.
+        Retorna até limite + 1 linhas (a linha extra indica que há próxima página).
+        """
+        desde = np.datetime64(desde, "s") if desde is not None else None
+        ate = np.datetime64(ate, "s") if ate is not None else None
+        cursor = (np.datetime64(cursor[0], "s"), cursor[1]) if cursor is not None else None
+        teto = ate
+        if cursor is not None and (teto is None or cursor[0] < teto):
+            teto = cursor[0]
+        mes_desde = str(desde)[:7] if desde is not None else None
+        mes_ate = str(teto)[:7] if teto is not None else None
+
+        linhas = []
+        catalogo = self._catalogo()
+        for mes in sorted(catalogo, reverse=True):
+            if mes_ate and mes > mes_ate:
+                continue
+            if mes_desde and mes < mes_desde:
+                break
+            # Dentro do mês os segmentos podem se sobrepor: juntar e ordenar por (data, id) decrescente
+            encontrados = []
+            for segmento in catalogo[mes]:
+                if segmento.pode_conter(desde, ate, caixa, tipo):
+                    posicoes = segmento.filtrar(desde, ate, caixa, tipo, cursor)
+                    if len(posicoes):
+                        encontrados.append((segmento, posicoes))
+            if not encontrados:
+                continue
+            datas = np.concatenate([segmento.colunas["data"][posicoes] for segmento, posicoes in encontrados])
+            ids = np.concatenate([segmento.colunas["id"][posicoes] for segmento, posicoes in encontrados])
+            origem = np.concatenate([np.full(len(posicoes), indice) for indice, (_, posicoes) in enumerate(encontrados)])
+            posicoes = np.concatenate([posicoes for _, posicoes in encontrados])
+            ordem = np.lexsort((-ids, -datas.astype(np.int64)))[:limite + 1 - len(linhas)]
+
+            escolhidas = defaultdict(list)
+            for indice in ordem:
+                escolhidas[int(origem[indice])].append(int(posicoes[indice]))
+            textos = {
+                indice: encontrados[indice][0].textos(posicoes_segmento) for indice, posicoes_segmento in escolhidas.items()
+            }
+            for indice in ordem:
+                segmento = encontrados[int(origem[indice])][0]
+                linhas.append(segmento.linha(int(posicoes[indice]), textos[int(origem[indice])]))
+            if len(linhas) > limite:
+                break
+        return linhas
+
+    def contagens(self):
+        """(tipo, status, data_ocorrencia) de cada alerta arquivado, para reconstruir os contadores do painel."""
+        for segmentos in self._catalogo().values():
+            for segmento in segmentos:
+                tipos = [tipo or None for tipo in segmento.meta["tipos"]]
+                status = [valor or None for valor in segmento.meta["status"]]
+                datas = segmento.colunas["data"].astype("datetime64[s]").tolist()
+                for codigo_tipo, codigo_status, data in zip(
+                    segmento.colunas["tipo"].tolist(), segmento.colunas["status"].tolist(), datas
+                ):
+                    yield tipos[codigo_tipo], status[codigo_status], data
+
+    # --- Arquivamento ---
+
+    def _travar(self):
+        # Um arquivamento por vez entre os processos que compartilham a pasta
+        os.makedirs(self.pasta, exist_ok=True)
+        trava = open(os.path.join(self.pasta, ".trava"), "w")
+        if fcntl is not None:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+        return trava
+
+    def _recuperar_pendentes(self, db: Session):
+        # Segmento pendente de uma execução interrompida: se os alertas já têm tombstone de arquivamento,
+        # o commit aconteceu e falta só publicar o segmento; senão ele é descartado
+        for mes in os.scandir(self.pasta):
+            if not mes.is_dir():
+                continue
+            for entrada in os.scandir(mes.path):
+                if not entrada.name.endswith(SUFIXO_PENDENTE):
+                    continue
+                completo = os.path.exists(os.path.join(entrada.path, "meta.json"))
+                ids = np.load(os.path.join(entrada.path, "id.npy")).tolist() if completo else []
+                confirmados = 0
+                for inicio in range(0, len(ids), 1000):
+                    confirmados += db.scalar(
+                        select(func.count()).select_from(models.AlertaArquivado)
+                        .where(models.AlertaArquivado.id.in_(ids[inicio:inicio + 1000]))
+                    )
+                if completo and confirmados == len(ids):
+                    os.replace(entrada.path, entrada.path[:-len(SUFIXO_PENDENTE)])
+                    _sincronizar_diretorio(mes.path)
+                else:
+                    shutil.rmtree(entrada.path)
+
+    def _somar_regioes(self, db: Session, por_regiao_usuario):
+        # Só um arquivamento por vez (trava da pasta): ler as linhas existentes, somar nelas e inserir as novas
+        if not por_regiao_usuario:
+            return
+        regioes = sorted({regiao_id for regiao_id, _ in por_regiao_usuario})
+        existentes = set()
+        for inicio in range(0, len(regioes), 1000):
+            existentes.update(db.execute(
+                select(models.RegiaoUsuarioArquivado.regiao_id, models.RegiaoUsuarioArquivado.usuario_id)
+                .where(models.RegiaoUsuarioArquivado.regiao_id.in_(regioes[inicio:inicio + 1000]))
+            ).tuples())
+        somar = [chave for chave in por_regiao_usuario if chave in existentes]
+        novas = [chave for chave in por_regiao_usuario if chave not in existentes]
+        if somar:
+            db.execute(_somar_regiao_arquivados, [
+                {"b_regiao_id": regiao_id, "b_usuario_id": usuario_id, "b_alertas": por_regiao_usuario[(regiao_id, usuario_id)]}
+                for regiao_id, usuario_id in somar
+            ])
+        if novas:
+            db.execute(insert(models.RegiaoUsuarioArquivado), [
+                {"regiao_id": regiao_id, "usuario_id": usuario_id, "alertas": por_regiao_usuario[(regiao_id, usuario_id)]}
+                for regiao_id, usuario_id in novas
+            ])
+
+    def _arquivar_lote(self, db: Session, limite_data):
+        linhas = db.execute(
+            select(
+                models.Alerta.id, models.Alerta.titulo, models.Alerta.tipo, models.Alerta.descricao,
+                models.Alerta.latitude, models.Alerta.longitude, models.Alerta.status,
+                models.Alerta.data_ocorrencia, models.Alerta.usuario_id, models.Alerta.relatos,
+            )
+            .where(
+                models.Alerta.status.in_(STATUS_FECHADOS),
+                models.Alerta.data_ocorrencia < limite_data,
+                models.Alerta.removido_em.is_(None),
+            )
+            .order_by(models.Alerta.id)
+            .limit(ARQUIVAMENTO_LOTE)
+        ).all()
+        if not linhas:
+            return 0
+
+        # 1) Segmentos pendentes, um por mês, gravados (e com fsync) antes de mexer no banco
+        por_mes = defaultdict(list)
+        for linha in linhas:
+            por_mes[linha.data_ocorrencia.strftime("%Y-%m")].append(linha)
+        nome = f"{int(time.time() * 1000)}-{linhas[0].id}"
+        pendentes = []
+        try:
+            for mes, linhas_mes in por_mes.items():
+                final = os.path.join(self.pasta, mes, nome)
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                gravar_segmento(final + SUFIXO_PENDENTE, linhas_mes)
+                pendentes.append(final)
+                sincronizar_pasta(final + SUFIXO_PENDENTE)
+
+            # 2) Alertas saem da tabela quente; fica um tombstone com versão nova por alerta em
+            # alertas_arquivados, para o GET /alertas/sync avisar os clientes. Versões reservadas antes
+            # de qualquer escrita (no SQLite, um bloco novo de versões usa outra conexão)
+            ids = [linha.id for linha in linhas]
+            status_por_id = {linha.id: linha.status for linha in linhas}
+            primeira_versao = reservar_versoes(db, len(ids))
+            agora = datetime.now()
+            por_regiao_usuario = defaultdict(int)
+            for inicio in range(0, len(ids), 1000):
+                lote = ids[inicio:inicio + 1000]
+                # Associações com regiões viram totais por região e usuário (rankings e painel históricos)
+                for regiao_id, usuario_id, total in db.execute(
+                    select(models.AlertaRegiao.regiao_id, models.Alerta.usuario_id, func.count())
+                    .join(models.Alerta, models.Alerta.id == models.AlertaRegiao.alerta_id)
+                    .where(models.AlertaRegiao.alerta_id.in_(lote))
+                    .group_by(models.AlertaRegiao.regiao_id, models.Alerta.usuario_id)
+                ):
+                    por_regiao_usuario[(regiao_id, usuario_id)] += total
+                db.execute(delete(models.AlertaRegiao).where(models.AlertaRegiao.alerta_id.in_(lote)))
+                db.execute(delete(models.AlertaRelato).where(models.AlertaRelato.alerta_id.in_(lote)))
+                # Compare-and-set no status lido: um alerta reaberto ou removido nesse meio tempo não é arquivado
+                db.execute(_remover_arquivado, [
+                    {"b_id": alerta_id, "b_status": status_por_id[alerta_id]} for alerta_id in lote
+                ])
+                if db.scalar(select(func.count()).select_from(models.Alerta).where(models.Alerta.id.in_(lote))):
+                    raise RuntimeError("alertas alterados durante o arquivamento; o lote será refeito na próxima execução")
+                db.execute(insert(models.AlertaArquivado), [
+                    {"id": alerta_id, "versao": primeira_versao + inicio + deslocamento, "arquivado_em": agora}
+                    for deslocamento, alerta_id in enumerate(lote)
+                ])
+            self._somar_regioes(db, por_regiao_usuario)
+            db.commit()
+        except Exception:
+            db.rollback()
+            for final in pendentes:
+                shutil.rmtree(final + SUFIXO_PENDENTE, ignore_errors=True)
+            raise
+
+        # 3) Publicar os segmentos (só agora as consultas passam a vê-los)
+        for final in pendentes:
+            os.replace(final + SUFIXO_PENDENTE, final)
+            _sincronizar_diretorio(os.path.dirname(final))
+        if self.ao_arquivar is not None:
+            self.ao_arquivar(linhas)
+        return len(linhas)
+
+    def arquivar(self, db: Session, idade_dias=None, agora=None):
+        """Move para o arquivo os alertas encerrados com mais de `idade_dias` dias; retorna quantos."""
+        idade_dias = self.idade_dias if idade_dias is None else idade_dias
+        limite_data = (agora or datetime.now()) - timedelta(days=idade_dias)
+        trava = self._travar()
+        try:
+            self._recuperar_pendentes(db)
+            total = 0
+            while True:
+                arquivados = self._arquivar_lote(db, limite_data)
+                total += arquivados
+                if arquivados < ARQUIVAMENTO_LOTE:
+                    return total
+        finally:
+            trava.close()
+
+    def arquivar_agora(self):
+        # Manutenção periódica da tabela quente: arquivamento e expurgo dos tombstones antigos
+        db = database.SessionLocal()
+        try:
+            total = self.arquivar(db)
+            if total:
+                print(f"{total} alertas movidos para o arquivo histórico.")
+        except Exception as e:
+            print(f"Erro ao arquivar alertas: {e}")
+            total = 0
+        try:
+            expurgados = expurgar_tombstones(db)
+            if expurgados:
+                print(f"{expurgados} tombstones de alertas expurgados.")
+        except Exception as e:
+            db.rollback()
+            print(f"Erro ao expurgar tombstones: {e}")
+        finally:
+            db.close()
+        return total
+
+    async def _executar(self):
+        while True:
+            await asyncio.sleep(self.intervalo_h * 3600)
+            await asyncio.to_thread(self.arquivar_agora)
+
+    def iniciar(self):
+        if self.intervalo_h > 0 and self._tarefa is None:
+            self._tarefa = asyncio.get_running_loop().create_task(self._executar())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+
+# Arquivo global usado pelas rotas de alertas
+arquivo_historico = ArquivoHistorico()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Alertas arquivados: {arquivo_historico.arquivar(db)}.")
+        print(f"Tombstones expurgados: {expurgar_tombstones(db)}.")
+    finally:
+        db.close()
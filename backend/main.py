@@ -1,16 +1,55 @@
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
 from typing import List, Optional
 from models import Base, Alerta, RelatoCreate, AlertaUpdateStatus, Usuario, Regiao, UsuarioCreate, RegiaoCreate, Conquista, UsuarioConquista # Importar modelos e tabelas necessários
 import models # Importar modelos SQLAlchemy (tabelas)
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session # Importar Session
-from database import SessionLocal, engine, get_db # Importar get_db e outros de database
-from sqlalchemy import text, select # Importar text e select
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from sqlalchemy.orm import Session, joinedload, selectinload # Importar Session e opções de carregamento
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession # Sessão assíncrona das rotas async def
+from database import SessionLocal, AsyncSessionLocal, engine, get_db, get_async_db # Importar get_db e outros de database
+import database
+from sqlalchemy import text, select, insert, update, delete, func, and_, or_, bindparam # Importar text, select, insert, update, delete, func e operadores lógicos
 from datetime import datetime
+from types import SimpleNamespace
+from collections import Counter, defaultdict
+from pydantic import TypeAdapter, ValidationError
+import asyncio
+import base64
+import csv
+import io
+import json
+import math
+from espacial import indice_alertas, codificar_geohash # Índice espacial em memória dos alertas
+from clusters import grade_clusters # Clusters de alertas por zoom, mantidos de forma incremental
+from busca import indice_busca # Índice invertido (BM25) sobre título e descrição dos alertas
+from ranking import ranking_usuarios, rankings_regioes # Rankings em memória (skip list indexável)
+from regioes import indice_regioes, normalizar_geometria, caixa_da_geometria, ponto_na_geometria # Índice das geometrias das regiões (point-in-polygon)
+import conquistas # Regras de conquistas e catálogo em memória
+import estatisticas # Contadores agregados dos alertas para o painel
+from estatisticas import STATUS_FECHADOS # Status em que o incidente já não recebe relatos novos
+from pontos import agregador_pontos, creditar, creditar_lancamentos, PONTOS_POR_RELATO # Extrato e créditos atômicos de pontos
+from fila import fila_jobs # Fila local de jobs (gamificação fora do caminho da requisição)
+from historico import arquivo_historico # Alertas encerrados antigos em arquivos colunares por mês
+from versoes import SEQUENCIA_EXPURGO, alocador_versoes, expurgar_tombstones, reservar_versoes # Versão das alterações de alertas (sync incremental dos clientes)
+from cache import CacheLocal, CacheReferencia # Caches em memória com invalidação explícita
+from duplicatas import janela_duplicatas # Incidentes recentes para agrupar relatos duplicados
+from eventos import broker_alertas # Pub/sub em memória para o feed em tempo real
+from metricas import metricas, MiddlewareMetricas # Métricas do processo no formato do Prometheus
+from admissao import MiddlewareAdmissao, ceder_para_leituras, cobrar_relatos # Limite por IP e concorrência de leituras/escritas
+from rastreamento import evento, rastrear # Rastros JSON das requisições lentas/com N+1 (consultas SQL e eventos)
 
 app = FastAPI(title="Rede Alerta API")
 
+# Serializadores das listas de referência (geram o JSON direto em bytes)
+LISTA_REGIOES = TypeAdapter(List[models.RegiaoSchema])
+LISTA_CONQUISTAS = TypeAdapter(List[models.ConquistaSchema])
+
+# Controle de admissão (admissao.py): limite de relatos por usuário/IP e vagas separadas para leituras
+# e escritas; adicionado antes do CORS para que as respostas 429/503 também recebam os cabeçalhos CORS
+app.add_middleware(MiddlewareAdmissao)
+
 # Adicionar middleware CORS - Remover se não for mais necessário com o deploy
 app.add_middleware(
     CORSMiddleware,
@@ -18,22 +57,457 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], # Permitir todos os métodos (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"], # Permitir todos os cabeçalhos
+    expose_headers=["X-Proximo-Cursor", "Retry-After"], # Cursor da próxima página de /alertas/ e espera das respostas 429/503
 )
 
+# Latência e consultas ao banco de cada rota, expostas em /metrics
+app.add_middleware(MiddlewareMetricas)
+
 # Lista em memória para armazenar alertas temporariamente
 alertas = []
 
+# Sem Oracle: criar as tabelas e os dados iniciais no SQLite local antes dos carregamentos abaixo
+@app.on_event("startup")
+def preparar_sqlite():
+    if database.USANDO_SQLITE:
+        database.inicializar_sqlite()
+        print("Banco SQLite preparado (tabelas, conquistas e usuário padrão).")
+
+# Carregar o índice espacial com os alertas já existentes no banco
+@app.on_event("startup")
+def carregar_indice_espacial():
+    db = SessionLocal()
+    try:
+        query = select(
+            models.Alerta.id,
+            models.Alerta.latitude,
+            models.Alerta.longitude,
+            models.Alerta.status,
+            models.Alerta.geocelula,
+            models.Alerta.tipo,
+            models.Alerta.data_ocorrencia,
+            models.Alerta.titulo,
+            models.Alerta.descricao,
+        ).where(models.Alerta.removido_em.is_(None)).order_by(models.Alerta.id)
+        indice_alertas.limpar()
+        grade_clusters.limpar()
+        indice_busca.limpar()
+        janela_duplicatas.limpar()
+        inicio_janela = datetime.now() - janela_duplicatas.janela
+        for alerta_id, latitude, longitude, status_alerta, geocelula, tipo, data, titulo, descricao in db.execute(query):
+            indice_alertas.adicionar(alerta_id, latitude, longitude, status_alerta, geocelula)
+            grade_clusters.adicionar(alerta_id, latitude, longitude, tipo, status_alerta)
+            indice_busca.adicionar(alerta_id, titulo, descricao, status_alerta, tipo, latitude, longitude)
+            if data is not None and data >= inicio_janela and status_alerta not in STATUS_FECHADOS:
+                janela_duplicatas.adicionar(alerta_id, tipo, latitude, longitude, data)
+        print(f"Índice espacial carregado com {len(indice_alertas)} alertas.")
+    except Exception as e:
+        print(f"Aviso: não foi possível carregar o índice espacial: {e}")
+    finally:
+        db.close()
+
+# Carregar as geometrias das regiões no índice de regiões
+@app.on_event("startup")
+def carregar_indice_regioes():
+    db = SessionLocal()
+    try:
+        indice_regioes.carregar(db.execute(select(models.Regiao.id, models.Regiao.geometria)))
+        print(f"Índice de regiões carregado com {len(indice_regioes)} regiões.")
+    except Exception as e:
+        print(f"Aviso: não foi possível carregar o índice de regiões: {e}")
+    finally:
+        db.close()
+
+# Carregar os rankings: pontos de todos os usuários e alertas abertos por usuário em cada região
+@app.on_event("startup")
+def carregar_rankings():
+    db = SessionLocal()
+    try:
+        for usuario_id, pontos in db.execute(select(models.Usuario.id, models.Usuario.pontos)):
+            ranking_usuarios.definir(usuario_id, pontos)
+        contagens = defaultdict(Counter)
+        for regiao_id, usuario_id, total in db.execute(
+            select(models.AlertaRegiao.regiao_id, models.Alerta.usuario_id, func.count())
+            .join(models.Alerta, models.Alerta.id == models.AlertaRegiao.alerta_id)
+            .group_by(models.AlertaRegiao.regiao_id, models.Alerta.usuario_id)
+        ):
+            contagens[regiao_id][usuario_id] += total
+        # Alertas arquivados continuam contando (totais históricos, ver historico.py)
+        for regiao_id, usuario_id, total in db.execute(
+            select(
+                models.RegiaoUsuarioArquivado.regiao_id, models.RegiaoUsuarioArquivado.usuario_id,
+                models.RegiaoUsuarioArquivado.alertas,
+            )
+        ):
+            contagens[regiao_id][usuario_id] += total
+        rankings_regioes.limpar()
+        for regiao_id, contagens_regiao in contagens.items():
+            rankings_regioes.carregar_regiao(regiao_id, contagens_regiao.items())
+        print(f"Ranking carregado com {len(ranking_usuarios)} usuários.")
+    except Exception as e:
+        print(f"Aviso: não foi possível carregar o ranking: {e}")
+    finally:
+        db.close()
+
+# Write-behind dos pontos de relatos (PONTOS_WRITE_BEHIND=1): cada gravação atualiza perfis e ranking
+def pontos_descarregados(totais):
+    for usuario_id, pontos in totais.items():
+        cache_perfis.invalidar(usuario_id)
+        ranking_usuarios.definir(usuario_id, pontos)
+
+@app.on_event("startup")
+async def iniciar_agregador_pontos():
+    agregador_pontos.ao_descarregar = pontos_descarregados
+    agregador_pontos.iniciar()
+
+# Gravar os pontos ainda pendentes antes de encerrar o processo
+@app.on_event("shutdown")
+async def parar_agregador_pontos():
+    await agregador_pontos.parar()
+
+# Workers da fila de jobs: retomam os jobs pendentes (inclusive os de antes de uma queda)
+# Alertas arquivados saem dos índices em memória; os rankings das regiões continuam contando
+# (totais históricos, como os contadores do painel)
+def alertas_arquivados(linhas):
+    for linha in linhas:
+        indice_alertas.remover(linha.id)
+        grade_clusters.remover(linha.id)
+        indice_busca.remover(linha.id)
+        janela_duplicatas.remover(linha.id)
+
+@app.on_event("startup")
+async def iniciar_arquivamento():
+    arquivo_historico.ao_arquivar = alertas_arquivados
+    arquivo_historico.iniciar()
+
+@app.on_event("shutdown")
+async def parar_arquivamento():
+    await arquivo_historico.parar()
+
+@app.on_event("startup")
+async def iniciar_fila_jobs():
+    await asyncio.to_thread(fila_jobs.iniciar)
+
+# Terminar os jobs em execução antes de encerrar; os pendentes ficam no arquivo da fila
+@app.on_event("shutdown")
+async def parar_fila_jobs():
+    await asyncio.to_thread(fila_jobs.parar)
+
+# Creditar os pontos dos relatos de um usuário (PONTOS_POR_RELATO cada, referencia_id = alerta)
+# Com o write-behind ativo os créditos ficam no agregador e a função retorna None;
+# senão, UPDATE atômico na transação da sessão e retorna os pontos atualizados
+async def creditar_relatos(usuario_id: int, alerta_ids, db: AsyncSession):
+    if agregador_pontos.ativo:
+        for alerta_id in alerta_ids:
+            agregador_pontos.registrar(usuario_id, PONTOS_POR_RELATO, "relato", alerta_id)
+        return None
+    if len(alerta_ids) == 1:
+        totais = await db.run_sync(creditar, usuario_id, PONTOS_POR_RELATO, "relato", alerta_ids[0])
+        return totais[0] if totais else None
+    await db.run_sync(
+        creditar_lancamentos, [(usuario_id, PONTOS_POR_RELATO, "relato", alerta_id) for alerta_id in alerta_ids]
+    )
+    return await db.scalar(select(models.Usuario.pontos).where(models.Usuario.id == usuario_id))
+
+# Função auxiliar para formatar um Alerta do banco no formato do AlertaSchema
+def formatar_alerta(alerta):
+    return {
+        "id": alerta.id,
+        "tipo": alerta.tipo,
+        "descricao": alerta.descricao,
+        "latitude": alerta.latitude,
+        "longitude": alerta.longitude,
+        "status": alerta.status,
+        "data_ocorrencia": alerta.data_ocorrencia.strftime("%Y-%m-%d %H:%M:%S"),
+        "relatos": alerta.relatos
+    }
+
+# Caminho de leitura enxuto das rotas de alertas: só as colunas do AlertaSchema, como tuplas
+# (sem montar objetos do ORM), um dict por linha e o JSON gerado pelo orjson. As rotas devolvem
+# a ORJSONResponse pronta, então o FastAPI não valida a lista de novo pelo response_model
+COLUNAS_ALERTA = (
+    models.Alerta.id,
+    models.Alerta.tipo,
+    models.Alerta.descricao,
+    models.Alerta.latitude,
+    models.Alerta.longitude,
+    models.Alerta.status,
+    models.Alerta.data_ocorrencia,
+    models.Alerta.relatos,
+)
+
+# Linha de COLUNAS_ALERTA no formato do AlertaSchema
+# str(datetime)[:19] é o mesmo "AAAA-MM-DD HH:MM:SS" do strftime, sem o custo do strftime por linha
+def formatar_linha_alerta(linha):
+    alerta_id, tipo, descricao, latitude, longitude, status_alerta, data_ocorrencia, relatos = linha
+    return {
+        "id": alerta_id,
+        "tipo": tipo,
+        "descricao": descricao,
+        "latitude": latitude,
+        "longitude": longitude,
+        "status": status_alerta,
+        "data_ocorrencia": str(data_ocorrencia)[:19] if data_ocorrencia is not None else None,
+        "relatos": relatos,
+    }
+
+def resposta_alertas(linhas, headers=None):
+    return ORJSONResponse([formatar_linha_alerta(linha) for linha in linhas], headers=headers)
+
+# Função auxiliar para buscar as linhas (COLUNAS_ALERTA) de uma lista de IDs, preservando a ordem da lista
+async def buscar_linhas_por_ids(ids, db: AsyncSession):
+    encontrados = {}
+    # O Oracle limita listas IN a 1000 elementos
+    for inicio in range(0, len(ids), 1000):
+        lote = ids[inicio:inicio + 1000]
+        for linha in await db.execute(
+            select(*COLUNAS_ALERTA).where(models.Alerta.id.in_(lote), models.Alerta.removido_em.is_(None))
+        ):
+            encontrados[linha[0]] = linha
+    return [encontrados[alerta_id] for alerta_id in ids if alerta_id in encontrados]
+
 @app.get("/")
 def read_root():
     return {"message": "Bem-vindo à API da Rede Alerta"}
 
+# Métricas no formato texto do Prometheus (pool de conexões, latência e consultas por rota)
+@app.get("/metrics")
+def read_metrics():
+    return Response(content=metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Jobs da fila (fila.py): executados por um worker depois do commit do relato
+# São idempotentes: a marca em relatos_processados é gravada na mesma transação do job, então um
+# job repetido (nova tentativa, queda do processo) não faz nada. Com o write-behind dos pontos o
+# crédito vai para o agregador só depois do commit do job (o lançamento no extrato vem depois)
+
+def relato_ja_processado(db: Session, tipo: str, referencia_id: int):
+    if db.get(models.RelatoProcessado, (tipo, referencia_id)) is not None:
+        return True
+    # Relatos processados antes da marca existir: o lançamento no extrato era a marca
+    return db.scalar(
+        select(models.PontoLancamento.id)
+        .where(models.PontoLancamento.motivo == tipo, models.PontoLancamento.referencia_id == referencia_id)
+        .limit(1)
+    ) is not None
+
+# Marca o relato como processado e credita os pontos na transação do job (ou só confere o usuário,
+# com o write-behind). Retorna se o autor existe e os totais (pontos, nivel) quando já gravados
+def creditar_relato_do_job(db: Session, usuario_id: int, tipo: str, referencia_id: int):
+    # Gravada já (não no flush do commit): a reconstrução dos contadores de conquistas conta os marcados
+    db.execute(insert(models.RelatoProcessado), [{"tipo": tipo, "referencia_id": referencia_id, "processado_em": datetime.now()}])
+    if agregador_pontos.ativo:
+        return db.get(models.Usuario, usuario_id) is not None, None
+    totais = creditar(db, usuario_id, PONTOS_POR_RELATO, tipo, referencia_id)
+    return totais is not None, totais
+
+# Depois do commit do job: pontos para o agregador (write-behind), caches e ranking
+def relato_creditado(usuario_id: int, tipo: str, referencia_id: int, totais):
+    if agregador_pontos.ativo:
+        agregador_pontos.registrar(usuario_id, PONTOS_POR_RELATO, tipo, referencia_id)
+        return # O agregador atualiza cache e ranking ao gravar (pontos_descarregados)
+    cache_perfis.invalidar(usuario_id)
+    ranking_usuarios.definir(usuario_id, totais[0])
+
+# Associar o alerta às regiões, creditar os pontos e atualizar contadores de conquistas e rankings
+def processar_relato(dados):
+    alerta_id = dados["alerta_id"]
+    novas_regioes = []
+    creditado, totais = False, None
+    db = SessionLocal()
+    try:
+        alerta = db.get(models.Alerta, alerta_id)
+        if alerta is None or alerta.removido_em is not None or relato_ja_processado(db, "relato", alerta_id):
+            return # Alerta removido antes do job ou job já executado
+        usuario_id = alerta.usuario_id
+
+        # Regiões que contêm o ponto, pelo índice em memória; só as associações que ainda não
+        # existem (uma região criada depois do relato já pode ter reassociado o alerta)
+        regiao_ids = indice_regioes.localizar(alerta.latitude, alerta.longitude)
+        existentes = set(db.scalars(
+            select(models.AlertaRegiao.regiao_id).where(models.AlertaRegiao.alerta_id == alerta_id)
+        ))
+        novas_regioes = [regiao_id for regiao_id in regiao_ids if regiao_id not in existentes]
+        if novas_regioes:
+            db.execute(
+                insert(models.AlertaRegiao),
+                [{"alerta_id": alerta_id, "regiao_id": regiao_id} for regiao_id in novas_regioes]
+            )
+            estatisticas.aplicar_deltas(db, Counter({("regiao", regiao_id): 1 for regiao_id in novas_regioes}))
+
+        creditado, totais = creditar_relato_do_job(db, usuario_id, "relato", alerta_id)
+        if creditado:
+            estatistica = conquistas.registrar_relatos(
+                db, usuario_id, [(alerta.data_ocorrencia, alerta.geocelula, regiao_ids)]
+            )
+            verificar_conquistas(usuario_id, db, commit=False, estatistica=estatistica)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    for regiao_id in novas_regioes:
+        rankings_regioes.somar(regiao_id, usuario_id, 1)
+    if creditado:
+        relato_creditado(usuario_id, "relato", alerta_id, totais)
+
+# Creditar um relato anexado a um incidente (pontos e contadores de conquistas do autor)
+def processar_relato_anexado(dados):
+    relato_id = dados["relato_id"]
+    creditado, totais = False, None
+    db = SessionLocal()
+    try:
+        relato = db.get(models.AlertaRelato, relato_id)
+        if relato is None or relato_ja_processado(db, "relato_anexado", relato_id):
+            return
+        usuario_id = relato.usuario_id
+        creditado, totais = creditar_relato_do_job(db, usuario_id, "relato_anexado", relato_id)
+        if creditado:
+            regiao_ids = indice_regioes.localizar(relato.latitude, relato.longitude)
+            estatistica = conquistas.registrar_relatos(
+                db, usuario_id, [(relato.data_relato, codificar_geohash(relato.latitude, relato.longitude), regiao_ids)]
+            )
+            verificar_conquistas(usuario_id, db, commit=False, estatistica=estatistica)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if creditado:
+        relato_creditado(usuario_id, "relato_anexado", relato_id, totais)
+
+# Gamificação tem prioridade menor que as leituras: o job espera um pouco enquanto há leituras na fila
+# O job é rastreado como uma requisição (consultas SQL e suspeitas de N+1 nas conquistas)
+def com_prioridade_baixa(funcao):
+    def executar(dados):
+        ceder_para_leituras()
+        with rastrear("job", funcao.__name__):
+            return funcao(dados)
+    return executar
+
+fila_jobs.registrar("processar_relato", com_prioridade_baixa(processar_relato))
+fila_jobs.registrar("processar_relato_anexado", com_prioridade_baixa(processar_relato_anexado))
+
+# Enfileirar o job de um relato já gravado; uma falha aqui não desfaz o relato (o commit já aconteceu):
+# ele continua sem a marca de processado e volta para a fila no próximo início (reenfileirar_relatos_pendentes)
+async def enfileirar_relato(tipo: str, referencia_id: int):
+    campo = "alerta_id" if tipo == "relato" else "relato_id"
+    try:
+        await asyncio.to_thread(fila_jobs.enfileirar, f"processar_{tipo}", {campo: referencia_id}, f"{tipo}:{referencia_id}")
+    except Exception as e:
+        print(f"Aviso: não foi possível enfileirar o job de {tipo} {referencia_id}: {e}")
+
+# Relatos gravados sem a marca de processado e sem lançamento no extrato: o processo caiu (ou a fila falhou)
+# entre o commit do relato e o enfileiramento. A chave do job evita duplicar os que ainda estão na fila
+def relatos_pendentes(db: Session):
+    alertas = db.scalars(
+        select(models.Alerta.id)
+        .where(
+            models.Alerta.removido_em.is_(None),
+            ~select(models.RelatoProcessado.referencia_id).where(
+                models.RelatoProcessado.tipo == "relato", models.RelatoProcessado.referencia_id == models.Alerta.id
+            ).exists(),
+            ~select(models.PontoLancamento.id).where(
+                models.PontoLancamento.motivo == "relato", models.PontoLancamento.referencia_id == models.Alerta.id
+            ).exists(),
+        )
+        .order_by(models.Alerta.id)
+    ).all()
+    anexados = db.scalars(
+        select(models.AlertaRelato.id)
+        .where(
+            ~select(models.RelatoProcessado.referencia_id).where(
+                models.RelatoProcessado.tipo == "relato_anexado", models.RelatoProcessado.referencia_id == models.AlertaRelato.id
+            ).exists(),
+            ~select(models.PontoLancamento.id).where(
+                models.PontoLancamento.motivo == "relato_anexado", models.PontoLancamento.referencia_id == models.AlertaRelato.id
+            ).exists(),
+        )
+        .order_by(models.AlertaRelato.id)
+    ).all()
+    return [("relato", alerta_id) for alerta_id in alertas] + [("relato_anexado", relato_id) for relato_id in anexados]
+
+@app.on_event("startup")
+async def reenfileirar_relatos_pendentes():
+    db = SessionLocal()
+    try:
+        pendentes = await asyncio.to_thread(relatos_pendentes, db)
+    except Exception as e:
+        print(f"Aviso: não foi possível procurar relatos pendentes: {e}")
+        return
+    finally:
+        db.close()
+    for tipo, referencia_id in pendentes:
+        await enfileirar_relato(tipo, referencia_id)
+    if pendentes:
+        print(f"{len(pendentes)} relatos sem processamento voltaram para a fila de jobs.")
+
+# Estado da fila de jobs: profundidade, atraso do job mais antigo e falhas recentes
+@app.get("/jobs/status", response_model=models.FilaJobsStatusSchema)
+async def jobs_status():
+    return await asyncio.to_thread(fila_jobs.status)
+
 # Rotas CRUD para Alertas
 
+# Anexar um relato duplicado ao incidente: grava o relato em alerta_relatos e soma 1 em Alerta.relatos
+# O autor recebe os pontos de um relato normal (pelo job processar_relato_anexado).
+# Retorna None se o incidente já não aceita relatos
+async def anexar_relato(incidente_id: int, relato: models.RelatoCreate, agora: datetime, db: AsyncSession):
+    try:
+        incidente = await db.get(models.Alerta, incidente_id)
+        if incidente is None or incidente.removido_em is not None or incidente.status in STATUS_FECHADOS:
+            janela_duplicatas.remover(incidente_id)
+            return None
+
+        db_relato = models.AlertaRelato(
+            alerta_id=incidente_id,
+            usuario_id=1, # Usar o ID do usuário padrão (1) por enquanto, como em create_alerta
+            titulo=relato.titulo,
+            descricao=relato.descricao,
+            latitude=relato.latitude,
+            longitude=relato.longitude,
+            data_relato=agora,
+        )
+        db.add(db_relato)
+        # Incremento no banco: relatos simultâneos do mesmo incidente não se sobrescrevem
+        versao = await db.run_sync(reservar_versoes)
+        relatos = await db.scalar(
+            update(models.Alerta)
+            .where(models.Alerta.id == incidente_id)
+            .values(relatos=models.Alerta.relatos + 1, versao=versao)
+            .returning(models.Alerta.relatos)
+            .execution_options(synchronize_session=False)
+        )
+        set_committed_value(incidente, "relatos", relatos) # Só atualiza o objeto; o UPDATE já foi feito
+        await db.commit() # O ID do relato já fica no objeto (expire_on_commit=False)
+    except Exception as e:
+        await db.rollback()
+        print(f"Erro ao anexar relato ao alerta {incidente_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Falha ao registrar relato: {e}")
+
+    # Pontos e conquistas do autor ficam para a fila de jobs
+    await enfileirar_relato("relato_anexado", db_relato.id)
+
+    janela_duplicatas.renovar(incidente_id, agora)
+    evento("relato_anexado", alerta_id=incidente_id, relatos=incidente.relatos)
+    alerta_dict = formatar_alerta(incidente)
+    broker_alertas.publicar("atualizado", alerta_dict)
+    return models.AlertaSchema(**alerta_dict)
+
 # Rota para criar um novo Alerta (usando o modelo RelatoCreate como payload)
 @app.post("/alertas/", response_model=models.AlertaSchema)
-def create_alerta(alerta: models.RelatoCreate, db: Session = Depends(get_db)):
-    print("@@@ Received /alertas/ POST request @@@")
-    
+async def create_alerta(alerta: models.RelatoCreate, db: AsyncSession = Depends(get_async_db)):
+    # Relato do mesmo tipo perto de um incidente recente: anexar em vez de criar outro alerta
+    agora = datetime.now()
+    incidente_id = janela_duplicatas.procurar(alerta.tipo, alerta.latitude, alerta.longitude, agora)
+    if incidente_id is not None:
+        incidente = await anexar_relato(incidente_id, alerta, agora, db)
+        if incidente is not None:
+            return incidente
+
     try:
         # Criar uma instância do modelo AlertaModel com os dados do payload
         db_alerta = models.Alerta(
@@ -43,177 +517,1039 @@ def create_alerta(alerta: models.RelatoCreate, db: Session = Depends(get_db)):
             latitude=alerta.latitude,
             longitude=alerta.longitude,
             status='Em análise', # Definir status inicial
-            data_ocorrencia=datetime.now(), # Usar datetime.now()
-            usuario_id=1 # Usar o ID do usuário padrão (1) por enquanto
+            data_ocorrencia=agora, # Usar datetime.now()
+            usuario_id=1, # Usar o ID do usuário padrão (1) por enquanto
+            geocelula=codificar_geohash(alerta.latitude, alerta.longitude),
+            versao=await db.run_sync(reservar_versoes)
         )
 
         # Adicionar o objeto ao banco de dados e commitar
         db.add(db_alerta)
-        db.commit()
-        db.refresh(db_alerta) # Atualizar o objeto para ter o ID gerado
-
-        # O ID gerado estará agora em db_alerta.id
-        print(f"@@@ Alerta inserido com ID: {db_alerta.id} @@@") # Log de debug
-
-        created_alerta = db_alerta # Usar o objeto que acabamos de criar e atualizar
-
-        if created_alerta is None:
-            raise HTTPException(status_code=500, detail="Falha ao criar ou recuperar o alerta recém-criado.") # Mensagem ligeiramente ajustada
-
-        # Adicionar pontos ao usuário (exemplo: 10 pontos por alerta)
-        # TODO: Adicionar usuario_id ao alerta e usar o ID correto
-        # Por enquanto, vamos usar o usuário com ID 1 como exemplo
-        usuario_id = 1
-        usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
-        if usuario:
-            usuario.pontos += 10
-            usuario.nivel = (usuario.pontos // 100) + 1
-            db.commit()
-            
-            # Verificar conquistas
-            verificar_conquistas(usuario_id, db)
-
-        response_alerta = models.AlertaSchema(
-            id=created_alerta.id,
-            tipo=created_alerta.tipo,
-            descricao=created_alerta.descricao,
-            latitude=created_alerta.latitude,
-            longitude=created_alerta.longitude,
-            status=created_alerta.status,
-            data_ocorrencia=created_alerta.data_ocorrencia.strftime("%Y-%m-%d %H:%M:%S")
-        )
-
-        return response_alerta
-
+        # Contadores do painel na mesma transação (os de região são somados pelo job, ao associar as regiões)
+        await db.run_sync(estatisticas.aplicar_deltas, estatisticas.deltas_do_alerta(
+            db_alerta.tipo, db_alerta.status, db_alerta.data_ocorrencia
+        ))
+        await db.commit() # O ID gerado já fica no objeto (expire_on_commit=False)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Erro ao criar alerta no banco de dados: {e}")
         raise HTTPException(status_code=500, detail=f"Falha ao criar alerta: {e}")
 
-# Rota para listar todos os Alertas
+    # Daqui em diante o alerta já está gravado: nada abaixo pode desfazê-lo
+    # O ID gerado estará agora em db_alerta.id
+    evento("alerta_inserido", alerta_id=db_alerta.id)
+    indice_alertas.adicionar(db_alerta.id, db_alerta.latitude, db_alerta.longitude, db_alerta.status, db_alerta.geocelula)
+    grade_clusters.adicionar(db_alerta.id, db_alerta.latitude, db_alerta.longitude, db_alerta.tipo, db_alerta.status)
+    indice_busca.adicionar(
+        db_alerta.id, db_alerta.titulo, db_alerta.descricao, db_alerta.status, db_alerta.tipo, db_alerta.latitude, db_alerta.longitude
+    )
+    janela_duplicatas.adicionar(db_alerta.id, db_alerta.tipo, db_alerta.latitude, db_alerta.longitude, db_alerta.data_ocorrencia)
+    broker_alertas.publicar("criado", formatar_alerta(db_alerta))
+
+    # Regiões, pontos, conquistas e rankings ficam para a fila de jobs (processar_relato):
+    # a resposta não espera pela gamificação
+    await enfileirar_relato("relato", db_alerta.id)
+
+    return models.AlertaSchema(
+        id=db_alerta.id,
+        tipo=db_alerta.tipo,
+        descricao=db_alerta.descricao,
+        latitude=db_alerta.latitude,
+        longitude=db_alerta.longitude,
+        status=db_alerta.status,
+        data_ocorrencia=db_alerta.data_ocorrencia.strftime("%Y-%m-%d %H:%M:%S"),
+        relatos=db_alerta.relatos
+    )
+
+# Número máximo de relatos aceitos em uma única chamada de /alertas/lote
+MAX_ITENS_LOTE = 1000
+
+# Rota para criar vários alertas de uma vez (sensores parceiros e clientes offline)
+# Cada item é validado separadamente; os válidos são inseridos com executemany em uma única
+# transação, e os pontos/conquistas são aplicados uma vez por usuário, de forma agregada
+# Cada item conta como um relato no limite por IP do controle de admissão (429 + Retry-After)
+@app.post("/alertas/lote", response_model=models.ResultadoLote)
+async def create_alertas_lote(itens: List[dict], request: Request, db: AsyncSession = Depends(get_async_db)):
+    if len(itens) > MAX_ITENS_LOTE:
+        raise HTTPException(status_code=413, detail=f"O lote pode ter no máximo {MAX_ITENS_LOTE} itens")
+    espera = cobrar_relatos(request.scope, len(itens))
+    if espera > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Muitos relatos em pouco tempo; tente novamente em instantes",
+            headers={"Retry-After": str(max(1, math.ceil(espera)))},
+        )
+
+    resultados = [models.ResultadoItemLote(indice=indice) for indice in range(len(itens))]
+    linhas = []
+    indices_validos = []
+    agora = datetime.now()
+    for indice, item in enumerate(itens):
+        try:
+            relato = models.RelatoCreate.model_validate(item)
+        except ValidationError as e:
+            resultados[indice].erro = "; ".join(
+                f"{'.'.join(str(parte) for parte in erro['loc'])}: {erro['msg']}" for erro in e.errors()
+            )
+            continue
+        linhas.append({
+            "titulo": relato.titulo,
+            "tipo": relato.tipo,
+            "descricao": relato.descricao,
+            "latitude": relato.latitude,
+            "longitude": relato.longitude,
+            "status": "Em análise",
+            "data_ocorrencia": agora,
+            "usuario_id": 1, # Usar o ID do usuário padrão (1) por enquanto, como em create_alerta
+            "geocelula": codificar_geohash(relato.latitude, relato.longitude),
+            "relatos": 1,
+        })
+        indices_validos.append(indice)
+
+    if linhas:
+        try:
+            # Versões consecutivas para o lote inteiro, reservadas de uma vez
+            primeira_versao = await db.run_sync(reservar_versoes, len(linhas))
+            for deslocamento, linha in enumerate(linhas):
+                linha["versao"] = primeira_versao + deslocamento
+
+            # INSERT em lote (executemany) sem RETURNING por linha: o RETURNING ordenado vira um INSERT
+            # por linha no SQLite. Os IDs vêm depois em uma consulta pela faixa de versões do lote,
+            # que é exclusiva dele (ix_alertas_versao)
+            await db.execute(insert(models.Alerta), linhas)
+            id_por_versao = dict((await db.execute(
+                select(models.Alerta.versao, models.Alerta.id).where(
+                    models.Alerta.versao.between(primeira_versao, primeira_versao + len(linhas) - 1)
+                )
+            )).all())
+            ids = [id_por_versao[linha["versao"]] for linha in linhas]
+
+            # Associação com as regiões, também em um único INSERT
+            regioes_por_linha = [indice_regioes.localizar(linha["latitude"], linha["longitude"]) for linha in linhas]
+            associacoes = [
+                {"alerta_id": alerta_id, "regiao_id": regiao_id}
+                for alerta_id, regiao_ids in zip(ids, regioes_por_linha)
+                for regiao_id in regiao_ids
+            ]
+            if associacoes:
+                await db.execute(insert(models.AlertaRegiao), associacoes)
+
+            # Contadores do painel somados para o lote inteiro
+            deltas = Counter()
+            for linha, regiao_ids in zip(linhas, regioes_por_linha):
+                deltas.update(estatisticas.deltas_do_alerta(
+                    linha["tipo"], linha["status"], linha["data_ocorrencia"], regiao_ids
+                ))
+            await db.run_sync(estatisticas.aplicar_deltas, deltas)
+
+            # Processados aqui mesmo, sem job: a marca evita que a varredura do início os coloque na fila
+            # (e entra antes dos contadores de conquistas, cuja reconstrução conta só os marcados)
+            await db.execute(
+                insert(models.RelatoProcessado),
+                [{"tipo": "relato", "referencia_id": alerta_id, "processado_em": agora} for alerta_id in ids]
+            )
+
+            # Pontos agregados por usuário: uma única atualização por usuário do lote
+            relatos_por_usuario = defaultdict(list)
+            alertas_por_usuario = defaultdict(list)
+            for alerta_id, linha, regiao_ids in zip(ids, linhas, regioes_por_linha):
+                relatos_por_usuario[linha["usuario_id"]].append(
+                    (linha["data_ocorrencia"], linha["geocelula"], regiao_ids)
+                )
+                alertas_por_usuario[linha["usuario_id"]].append(alerta_id)
+            # Autores existentes em uma única consulta (IN), não um db.get por usuário
+            usuarios_existentes = set((await db.scalars(
+                select(models.Usuario.id).where(models.Usuario.id.in_(list(relatos_por_usuario)))
+            )).all())
+            pontos_finais = {}
+            for usuario_id, relatos in relatos_por_usuario.items():
+                if usuario_id in usuarios_existentes:
+                    pontos_usuario = await creditar_relatos(usuario_id, alertas_por_usuario[usuario_id], db)
+                    if pontos_usuario is not None:
+                        pontos_finais[usuario_id] = pontos_usuario
+                    estatistica = await db.run_sync(conquistas.registrar_relatos, usuario_id, relatos)
+                    await db.run_sync(
+                        lambda sessao: verificar_conquistas(usuario_id, sessao, commit=False, estatistica=estatistica)
+                    )
+            await db.commit() # Um único commit para o lote inteiro
+            for usuario_id in relatos_por_usuario:
+                cache_perfis.invalidar(usuario_id)
+            for usuario_id, pontos in pontos_finais.items():
+                ranking_usuarios.definir(usuario_id, pontos)
+        except Exception as e:
+            await db.rollback()
+            print(f"Erro ao inserir lote de alertas no banco de dados: {e}")
+            raise HTTPException(status_code=500, detail=f"Falha ao inserir lote de alertas: {e}")
+
+        for indice, alerta_id, linha, regiao_ids in zip(indices_validos, ids, linhas, regioes_por_linha):
+            resultados[indice].id = alerta_id
+            for regiao_id in regiao_ids:
+                rankings_regioes.somar(regiao_id, linha["usuario_id"], 1)
+            indice_alertas.adicionar(alerta_id, linha["latitude"], linha["longitude"], linha["status"], linha["geocelula"])
+            grade_clusters.adicionar(alerta_id, linha["latitude"], linha["longitude"], linha["tipo"], linha["status"])
+            indice_busca.adicionar(
+                alerta_id, linha["titulo"], linha["descricao"], linha["status"], linha["tipo"], linha["latitude"], linha["longitude"]
+            )
+            janela_duplicatas.adicionar(alerta_id, linha["tipo"], linha["latitude"], linha["longitude"], linha["data_ocorrencia"])
+            broker_alertas.publicar("criado", formatar_alerta(SimpleNamespace(id=alerta_id, **linha)))
+
+    return models.ResultadoLote(
+        inseridos=len(linhas),
+        rejeitados=len(itens) - len(linhas),
+        resultados=resultados
+    )
+
+# Funções auxiliares para o cursor opaco da paginação: codifica (data_ocorrencia, id) do último item da página
+def codificar_cursor(data_ocorrencia, alerta_id):
+    bruto = json.dumps([data_ocorrencia.isoformat(), alerta_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(bruto).decode("ascii").rstrip("=")
+
+def decodificar_cursor(cursor):
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data_iso, alerta_id = json.loads(bruto)
+        return datetime.fromisoformat(data_iso), int(alerta_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+# Rota para listar os Alertas, do mais recente para o mais antigo
+# A paginação é por cursor (keyset): o próximo cursor volta no cabeçalho X-Proximo-Cursor
+# e cada página custa o mesmo que a primeira, qualquer que seja a profundidade
 @app.get("/alertas/", response_model=List[models.AlertaSchema])
-def read_alertas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    # Consultar alertas do banco de dados
-    alertas_db = db.query(models.Alerta).offset(skip).limit(limit).all()
-    
-    # Formatar data_ocorrencia para string na resposta para corresponder ao schema
-    alertas_formatados = []
-    for alerta in alertas_db:
-        # Use orm_mode=True style attribute access
-        alerta_dict = {
-            "id": alerta.id,
-            "tipo": alerta.tipo,
-            "descricao": alerta.descricao,
-            "latitude": alerta.latitude,
-            "longitude": alerta.longitude,
-            "status": alerta.status,
-            "data_ocorrencia": alerta.data_ocorrencia.strftime("%Y-%m-%d %H:%M:%S") # Formatar datetime para string
-        }
-        alertas_formatados.append(alerta_dict)
-
-    return alertas_formatados # Retornar lista de dicionários formatados
+async def read_alertas(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, gt=0, le=1000),
+    status: Optional[str] = None,
+    tipo: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    ate: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    query = select(*COLUNAS_ALERTA).where(models.Alerta.removido_em.is_(None))
+
+    # Filtros no servidor (cobertos pelos índices compostos de Alerta)
+    if status is not None:
+        query = query.where(models.Alerta.status == status)
+    if tipo is not None:
+        query = query.where(models.Alerta.tipo == tipo)
+    if desde is not None:
+        query = query.where(models.Alerta.data_ocorrencia >= desde)
+    if ate is not None:
+        query = query.where(models.Alerta.data_ocorrencia < ate)
+
+    # Continuar a partir do último item da página anterior
+    if cursor is not None:
+        data_cursor, id_cursor = decodificar_cursor(cursor)
+        query = query.where(or_(
+            models.Alerta.data_ocorrencia < data_cursor,
+            and_(models.Alerta.data_ocorrencia == data_cursor, models.Alerta.id < id_cursor)
+        ))
+
+    # Buscar um item a mais para saber se existe próxima página
+    linhas = (await db.execute(query.order_by(
+        models.Alerta.data_ocorrencia.desc(), models.Alerta.id.desc()
+    ).limit(limit + 1))).all()
+
+    cabecalhos = None
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        ultimo = linhas[-1]
+        cabecalhos = {"X-Proximo-Cursor": codificar_cursor(ultimo.data_ocorrencia, ultimo.id)}
+
+    return resposta_alertas(linhas, cabecalhos)
+
+# Colunas incluídas na exportação de alertas
+COLUNAS_EXPORTACAO = [
+    models.Alerta.id,
+    models.Alerta.titulo,
+    models.Alerta.tipo,
+    models.Alerta.descricao,
+    models.Alerta.latitude,
+    models.Alerta.longitude,
+    models.Alerta.status,
+    models.Alerta.data_ocorrencia,
+    models.Alerta.usuario_id,
+    models.Alerta.relatos,
+]
+
+# Quantidade de linhas trazidas do cursor do banco por vez na exportação
+LOTE_EXPORTACAO = 1000
+
+# Gerador que lê os alertas em lotes de um cursor no servidor e já os devolve serializados
+# Usa a sua própria sessão: a do Depends(get_async_db) é fechada antes do fim do streaming
+async def gerar_exportacao(formato, query):
+    async with AsyncSessionLocal() as db:
+        nomes = [coluna.key for coluna in COLUNAS_EXPORTACAO]
+        if formato == "csv":
+            buffer = io.StringIO()
+            escritor = csv.writer(buffer)
+            escritor.writerow(nomes)
+            yield buffer.getvalue()
+
+        resultado = await db.stream(query.execution_options(yield_per=LOTE_EXPORTACAO))
+        async for linhas in resultado.partitions():
+            # Formatar data_ocorrencia como nas demais rotas
+            valores = [
+                [*linha[:7], linha[7].strftime("%Y-%m-%d %H:%M:%S") if linha[7] else None, *linha[8:]]
+                for linha in linhas
+            ]
+            if formato == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                escritor.writerows(valores)
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(nomes, linha)), ensure_ascii=False) + "\n"
+                    for linha in valores
+                )
+
+# Rota para exportar o histórico completo de alertas em NDJSON ou CSV, via streaming
+# A memória usada fica constante, seja qual for o tamanho da tabela
+@app.get("/alertas/export")
+async def export_alertas(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = None,
+    tipo: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    ate: Optional[datetime] = None,
+):
+    # Selecionar só as colunas, sem montar objetos do ORM
+    query = select(*COLUNAS_EXPORTACAO).where(models.Alerta.removido_em.is_(None))
+    if status is not None:
+        query = query.where(models.Alerta.status == status)
+    if tipo is not None:
+        query = query.where(models.Alerta.tipo == tipo)
+    if desde is not None:
+        query = query.where(models.Alerta.data_ocorrencia >= desde)
+    if ate is not None:
+        query = query.where(models.Alerta.data_ocorrencia < ate)
+    query = query.order_by(models.Alerta.id)
+
+    if formato == "csv":
+        media_type = "text/csv; charset=utf-8"
+    else:
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        gerar_exportacao(formato, query),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="alertas.{formato}"'}
+    )
+
+# Intervalo (s) entre comentários de keep-alive no stream SSE
+INTERVALO_KEEPALIVE_SSE = 15
+
+# Rota de feed em tempo real (Server-Sent Events) com os alertas criados, atualizados e removidos
+# (e os eventos "atualizados" e "removidos" da moderação em lote, com a lista de alertas do lote)
+# Filtros opcionais por tipo e por caixa; o cliente retoma de onde parou com o cabeçalho
+# Last-Event-ID (ou ?desde=) e recebe "reset" se os eventos perdidos já saíram do buffer
+# ou se o ID é de antes de um reinício do servidor (época diferente): nesse caso deve recarregar a lista
+@app.get("/alertas/stream")
+async def stream_alertas(
+    request: Request,
+    tipo: Optional[str] = None,
+    min_lat: Optional[float] = None,
+    min_lon: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    max_lon: Optional[float] = None,
+    desde: Optional[str] = None,
+):
+    if desde is None:
+        desde = request.headers.get("last-event-id") or None
+
+    caixa = (min_lat, min_lon, max_lat, max_lon)
+    usar_caixa = all(valor is not None for valor in caixa)
+
+    def aceita(dados):
+        if tipo is not None and dados.get("tipo") != tipo:
+            return False
+        if usar_caixa:
+            latitude, longitude = dados.get("latitude"), dados.get("longitude")
+            if latitude is None or longitude is None:
+                return False
+            return min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon
+        return True
+
+    # Eventos da moderação em lote trazem uma lista de alertas: enviar só os que passam no filtro
+    def filtrar(evento):
+        dados = evento["dados"]
+        if "alertas" in dados:
+            alertas = [alerta for alerta in dados["alertas"] if aceita(alerta)]
+            return {**dados, "alertas": alertas} if alertas else None
+        return dados if aceita(dados) else None
+
+    assinante = broker_alertas.assinar(asyncio.get_running_loop(), desde)
+
+    async def gerar():
+        try:
+            if assinante.perdeu_eventos:
+                yield "event: reset\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(assinante.fila.get(), timeout=INTERVALO_KEEPALIVE_SSE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if evento is None:
+                    break # Cliente ficou para trás e precisa reconectar
+                dados = filtrar(evento)
+                if dados is not None:
+                    dados = json.dumps(dados, ensure_ascii=False)
+                    yield f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
+        finally:
+            broker_alertas.cancelar(assinante)
+
+    return StreamingResponse(
+        gerar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Rota para listar os alertas num raio (km) em torno de um ponto, do mais próximo ao mais distante
+# Declarada antes de /alertas/{alerta_id} para não ser capturada por ela
+@app.get("/alertas/proximos", response_model=List[models.AlertaSchema])
+async def read_alertas_proximos(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    raio_km: float = Query(1.0, gt=0, le=500),
+    status: Optional[str] = None,
+    limit: int = Query(500, gt=0, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # O índice espacial só visita as células que cobrem o círculo
+    candidatos = indice_alertas.buscar_raio(lat, lon, raio_km, status)[:limit]
+    ids = [alerta_id for _, alerta_id in candidatos]
+    return resposta_alertas(await buscar_linhas_por_ids(ids, db))
+
+# Rota para listar os alertas dentro de uma caixa (viewport do mapa)
+@app.get("/alertas/area", response_model=List[models.AlertaSchema])
+async def read_alertas_area(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    status: Optional[str] = None,
+    limit: int = Query(500, gt=0, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Área inválida: os valores mínimos devem ser menores que os máximos")
+
+    candidatos = indice_alertas.buscar_area(min_lat, min_lon, max_lat, max_lon, status)
+    # Ordenar por ID para que a resposta seja determinística entre chamadas
+    ids = sorted(alerta_id for alerta_id, _, _ in candidatos)[:limit]
+    return resposta_alertas(await buscar_linhas_por_ids(ids, db))
+
+# Converter o parâmetro bbox "min_lon,min_lat,max_lon,max_lat" (mesma ordem do GeoJSON)
+# na caixa (min_lat, min_lon, max_lat, max_lon) usada pelos índices
+def ler_bbox(bbox):
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(valor) for valor in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox deve ser min_lon,min_lat,max_lon,max_lat")
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="Área inválida: os valores mínimos devem ser menores que os máximos")
+    return min_lat, min_lon, max_lat, max_lon
+
+# Clusters para o mapa: uma entrada por célula da grade do zoom (~32 px), já agregada em memória
+@app.get("/alertas/clusters", response_model=List[models.ClusterSchema])
+def read_alertas_clusters(
+    zoom: int = Query(..., ge=0, le=22),
+    bbox: str = Query(...)
+):
+    return grade_clusters.buscar(zoom, *ler_bbox(bbox))
+
+# Busca textual no título e na descrição, ordenada por relevância (BM25) pelo índice invertido em memória
+# Todos os termos precisam aparecer; acentos, maiúsculas e plurais são ignorados ("árvores" acha "arvore")
+# Filtros opcionais: status, tipo e bbox no formato "min_lon,min_lat,max_lon,max_lat"
+# A varredura do índice roda numa thread para não travar o loop de eventos com buscas longas
+@app.get("/alertas/busca", response_model=List[models.AlertaSchema])
+async def buscar_alertas(
+    q: str = Query(..., min_length=1, max_length=200),
+    status: Optional[str] = None,
+    tipo: Optional[str] = None,
+    bbox: Optional[str] = None,
+    limit: int = Query(50, gt=0, le=500),
+    offset: int = Query(0, ge=0, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    caixa = ler_bbox(bbox) if bbox is not None else None
+    resultados = await asyncio.to_thread(indice_busca.buscar, q, limit, offset, status, tipo, caixa)
+    ids = [alerta_id for alerta_id, _ in resultados]
+    return resposta_alertas(await buscar_linhas_por_ids(ids, db))
+
+# Alertas arquivados (encerrados há mais de ARQUIVAMENTO_IDADE_DIAS dias), lidos dos arquivos colunares
+# sem passar pelo banco; filtros por período, tipo e bbox ("min_lon,min_lat,max_lon,max_lat")
+# Mesma ordem e mesmo cursor (cabeçalho X-Proximo-Cursor) de GET /alertas/
+@app.get("/alertas/historico", response_model=List[models.AlertaSchema])
+def read_alertas_historico(
+    desde: Optional[datetime] = None,
+    ate: Optional[datetime] = None,
+    tipo: Optional[str] = None,
+    bbox: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, gt=0, le=5000)
+):
+    caixa = ler_bbox(bbox) if bbox is not None else None
+    cursor_decodificado = decodificar_cursor(cursor) if cursor is not None else None
+    linhas = arquivo_historico.consultar(desde, ate, caixa, tipo, cursor_decodificado, limit)
+
+    cabecalhos = None
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        ultimo = linhas[-1]
+        cabecalhos = {"X-Proximo-Cursor": codificar_cursor(ultimo[6], ultimo[0])}
+    return resposta_alertas(linhas, cabecalhos)
+
+# Rota administrativa para arquivar agora e expurgar os tombstones antigos (mesmo que python historico.py)
+# idade_dias substitui ARQUIVAMENTO_IDADE_DIAS
+@app.post("/alertas/historico/arquivar")
+def arquivar_alertas(idade_dias: Optional[int] = Query(None, ge=0), db: Session = Depends(get_db)):
+    try:
+        total = arquivo_historico.arquivar(db, idade_dias)
+        expurgados = expurgar_tombstones(db)
+    except Exception as e:
+        print(f"Erro ao arquivar alertas: {e}")
+        raise HTTPException(status_code=500, detail=f"Falha ao arquivar alertas: {e}")
+    return {"message": "Alertas arquivados", "arquivados": total, "tombstones_expurgados": expurgados}
+
+# Resumo para o painel lido dos contadores agregados (não percorre a tabela de alertas)
+# As séries por hora e por dia começam em `desde` (padrão: últimas 48 horas e 30 dias)
+@app.get("/alertas/estatisticas", response_model=models.EstatisticasAlertasSchema)
+async def read_alertas_estatisticas(desde: Optional[datetime] = None, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda sessao: estatisticas.consultar(sessao, desde))
+
+# Rota administrativa para recalcular os contadores a partir dos alertas (mesmo que python estatisticas.py)
+@app.post("/alertas/estatisticas/reconstruir")
+def reconstruir_estatisticas(db: Session = Depends(get_db)):
+    linhas = estatisticas.reconstruir(db, arquivo_historico.contagens())
+    return {"message": "Contadores de alertas reconstruídos", "contadores": linhas}
+
+# Sync incremental para o app: só o que mudou desde a versão que o cliente já tem (índice ix_alertas_versao)
+# Cada criação, alteração ou remoção grava uma nova versão no alerta (versoes.py). Com desde=0 vêm todos os
+# alertas ativos; depois, o cliente envia a versão recebida e, sem mudanças, a resposta é uma lista vazia.
+# Com mais=true há outras alterações além do limite: chamar de novo com a nova versão (e carga=true, se veio na resposta)
+# Versões de transações ainda abertas seguram a resposta: nada a partir da menor delas é entregue antes do commit
+# Os tombstones são expurgados depois de TOMBSTONES_RETENCAO_DIAS: um desde anterior ao horizonte do expurgo
+# recebe resincronizar=true (o cliente descarta o que tem e refaz a carga inicial com desde=0)
+@app.get("/alertas/sync", response_model=models.AlertaSyncSchema)
+async def sincronizar_alertas(
+    desde: int = Query(0, ge=0),
+    carga: bool = False, # Continuação da carga inicial (desde=0): só alertas ativos, sem horizonte de expurgo
+    limit: int = Query(1000, gt=0, le=5000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    horizonte = await db.scalar(select(models.Sequencia.valor).where(models.Sequencia.nome == SEQUENCIA_EXPURGO)) or 0
+    carga = carga or desde == 0
+    if not carga and desde < horizonte:
+        return ORJSONResponse({
+            "versao": 0, "alertas": [], "removidos": [], "arquivados": [], "mais": False, "carga": False,
+            "resincronizar": True, "desde_minimo": horizonte,
+        })
+
+    query = select(*COLUNAS_ALERTA, models.Alerta.versao, models.Alerta.removido_em).where(models.Alerta.versao > desde)
+    pendente = alocador_versoes.menor_pendente()
+    if pendente is not None:
+        query = query.where(models.Alerta.versao < pendente)
+    if carga:
+        query = query.where(models.Alerta.removido_em.is_(None)) # Carga inicial: os removidos não interessam
+    alteracoes = [
+        (linha.versao, linha) for linha in (await db.execute(query.order_by(models.Alerta.versao).limit(limit + 1))).all()
+    ]
+    # Alertas movidos para o arquivo histórico saíram da tabela alertas: os tombstones ficam em alertas_arquivados
+    if not carga:
+        query = select(models.AlertaArquivado.id, models.AlertaArquivado.versao).where(models.AlertaArquivado.versao > desde)
+        if pendente is not None:
+            query = query.where(models.AlertaArquivado.versao < pendente)
+        alteracoes += [
+            (versao, alerta_id)
+            for alerta_id, versao in (await db.execute(query.order_by(models.AlertaArquivado.versao).limit(limit + 1))).all()
+        ]
+        alteracoes.sort(key=lambda alteracao: alteracao[0])
+
+    mais = len(alteracoes) > limit
+    alteracoes = alteracoes[:limit]
+    alertas = []
+    removidos = []
+    arquivados = []
+    for _, linha in alteracoes:
+        if isinstance(linha, int):
+            arquivados.append(linha)
+        elif linha.removido_em is not None:
+            removidos.append(linha.id)
+        else:
+            alertas.append(formatar_linha_alerta(linha[:8]))
+    versao = alteracoes[-1][0] if alteracoes else desde
+    if carga and not mais:
+        # Fim da carga: as versões até o horizonte só tinham tombstones já expurgados, que a carga não precisa
+        versao = max(versao, horizonte)
+    return ORJSONResponse({
+        "versao": versao,
+        "alertas": alertas,
+        "removidos": removidos,
+        "arquivados": arquivados,
+        "mais": mais,
+        "carga": carga and mais,
+        "resincronizar": False,
+        "desde_minimo": horizonte,
+    })
 
 # Rota para obter um Alerta específico por ID
 @app.get("/alertas/{alerta_id}", response_model=models.AlertaSchema)
-def read_alerta(alerta_id: int, db: Session = Depends(get_db)):
-    alerta = db.query(models.Alerta).filter(models.Alerta.id == alerta_id).first()
-    if alerta is None:
+async def read_alerta(alerta_id: int, db: AsyncSession = Depends(get_async_db)):
+    linha = (await db.execute(
+        select(*COLUNAS_ALERTA).where(models.Alerta.id == alerta_id, models.Alerta.removido_em.is_(None))
+    )).first()
+    if linha is None:
         raise HTTPException(status_code=404, detail="Alerta não encontrado")
-    
-    # Formatar data_ocorrencia para string na resposta
-    alerta_dict = {
-        "id": alerta.id,
-        "tipo": alerta.tipo,
-        "descricao": alerta.descricao,
-        "latitude": alerta.latitude,
-        "longitude": alerta.longitude,
-        "status": alerta.status,
-        "data_ocorrencia": alerta.data_ocorrencia.strftime("%Y-%m-%d %H:%M:%S")
-    }
-    return models.AlertaSchema(**alerta_dict) # Retornar schema formatado
+    return ORJSONResponse(formatar_linha_alerta(linha))
+
+# Relatos anexados a um incidente (além do relato original, que é o próprio alerta)
+@app.get("/alertas/{alerta_id}/relatos", response_model=List[models.AlertaRelatoSchema])
+async def read_alerta_relatos(alerta_id: int, db: AsyncSession = Depends(get_async_db)):
+    relatos = (await db.scalars(
+        select(models.AlertaRelato)
+        .where(models.AlertaRelato.alerta_id == alerta_id)
+        .order_by(models.AlertaRelato.id)
+    )).all()
+    if not relatos:
+        alerta = await db.get(models.Alerta, alerta_id)
+        if alerta is None or alerta.removido_em is not None:
+            raise HTTPException(status_code=404, detail="Alerta não encontrado")
+    return [
+        models.AlertaRelatoSchema(
+            id=relato.id,
+            alerta_id=relato.alerta_id,
+            usuario_id=relato.usuario_id,
+            titulo=relato.titulo,
+            descricao=relato.descricao,
+            latitude=relato.latitude,
+            longitude=relato.longitude,
+            data_relato=relato.data_relato.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+        for relato in relatos
+    ]
+
+# Tentativas de uma troca de status (ou remoção) quando outra transação muda o alerta entre a leitura e o UPDATE
+TENTATIVAS_TROCA_STATUS = 3
 
 # Rota para atualizar o status de um Alerta
+# Compare-and-set: o UPDATE só vale se o status ainda é o lido (WHERE status = anterior), então os contadores
+# recebem exatamente uma transição por alteração mesmo com PUTs simultâneos (sem depender de SELECT FOR UPDATE,
+# que o SQLite ignora); se outra requisição mudou o alerta no meio, a leitura e o UPDATE são refeitos
 @app.put("/alertas/{alerta_id}/status", response_model=models.AlertaSchema)
-def update_alerta_status(alerta_id: int, status_update: models.AlertaUpdateStatus, db: Session = Depends(get_db)):
-    print(f"@@@ Received PUT request to update status for alerta {alerta_id} to {status_update.status} @@@")
-    
+async def update_alerta_status(alerta_id: int, status_update: models.AlertaUpdateStatus, db: AsyncSession = Depends(get_async_db)):
     try:
-        alerta = db.query(models.Alerta).filter(models.Alerta.id == alerta_id).first()
-        if alerta is None:
-            raise HTTPException(status_code=404, detail="Alerta não encontrado")
-        
-        alerta.status = status_update.status
-        db.commit()
-        db.refresh(alerta)
+        novo_status = status_update.status
+        versao = await db.run_sync(reservar_versoes)
+        for _ in range(TENTATIVAS_TROCA_STATUS):
+            # Colunas da resposta + autor
+            linha = (await db.execute(
+                select(*COLUNAS_ALERTA, models.Alerta.usuario_id)
+                .where(models.Alerta.id == alerta_id, models.Alerta.removido_em.is_(None))
+            )).first()
+            if linha is None:
+                raise HTTPException(status_code=404, detail="Alerta não encontrado")
+            alterados = (await db.execute(
+                update(models.Alerta)
+                .where(
+                    models.Alerta.id == alerta_id,
+                    models.Alerta.status == linha.status,
+                    models.Alerta.removido_em.is_(None),
+                )
+                .values(status=novo_status, versao=versao)
+                .execution_options(synchronize_session=False)
+            )).rowcount
+            if alterados == 1:
+                break
+        else:
+            raise HTTPException(status_code=409, detail="O alerta foi alterado por outra requisição; tente novamente")
+
+        tipo, status_anterior, usuario_id = linha.tipo, linha.status, linha.usuario_id
+        await db.run_sync(
+            estatisticas.aplicar_deltas, estatisticas.deltas_de_status(tipo, status_anterior, novo_status)
+        )
+
+        # Relato validado pelas autoridades conta para as conquistas do autor
+        estatistica = await db.run_sync(
+            conquistas.registrar_validacao, usuario_id, status_anterior, novo_status
+        )
+        if estatistica is not None:
+            await db.run_sync(
+                lambda sessao: verificar_conquistas(usuario_id, sessao, commit=False, estatistica=estatistica)
+            )
+
+        await db.commit()
+        if estatistica is not None:
+            cache_perfis.invalidar(usuario_id)
+        indice_alertas.atualizar_status(alerta_id, novo_status)
+        grade_clusters.atualizar_status(alerta_id, novo_status)
+        indice_busca.atualizar_status(alerta_id, novo_status)
+        if novo_status in STATUS_FECHADOS:
+            janela_duplicatas.remover(alerta_id) # Incidente resolvido não recebe mais relatos
         
-        # Formatar data_ocorrencia para string na resposta
-        alerta_dict = {
-            "id": alerta.id,
-            "tipo": alerta.tipo,
-            "descricao": alerta.descricao,
-            "latitude": alerta.latitude,
-            "longitude": alerta.longitude,
-            "status": alerta.status,
-            "data_ocorrencia": alerta.data_ocorrencia.strftime("%Y-%m-%d %H:%M:%S")
-        }
-        print(f"@@@ Successfully updated alerta {alerta_id} status to {alerta.status} @@@")
-        return models.AlertaSchema(**alerta_dict)
+        alerta_dict = formatar_linha_alerta(linha[:5] + (novo_status,) + linha[6:8])
+        broker_alertas.publicar("atualizado", alerta_dict)
+        evento("status_atualizado", alerta_id=alerta_id, anterior=status_anterior, novo=novo_status)
+        return ORJSONResponse(alerta_dict)
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        print(f"@@@ Error updating alerta status: {str(e)} @@@")
-        db.rollback()
+        print(f"Erro ao atualizar status do alerta {alerta_id}: {e}")
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar status do alerta: {str(e)}")
 
 # Rota para deletar um Alerta
+# A linha fica como tombstone (removido_em e nova versão) para o GET /alertas/sync avisar os clientes;
+# as leituras ignoram alertas com removido_em preenchido
 @app.delete("/alertas/{alerta_id}")
-def delete_alerta(
+async def delete_alerta(
     alerta_id: int,
-    db: Session = Depends(get_db) # Injetar dependência
+    db: AsyncSession = Depends(get_async_db) # Injetar dependência
 ):
-    alerta = db.query(models.Alerta).filter(models.Alerta.id == alerta_id).first() # Consultar por ID
-    if alerta is None:
-        raise HTTPException(status_code=404, detail="Alerta não encontrado")
-    
-    db.delete(alerta) # Deletar o objeto
-    db.commit() # Commitar a transação
+    # Versão reservada antes de qualquer escrita (no SQLite, um bloco novo de versões usa outra conexão)
+    versao = await db.run_sync(reservar_versoes)
+    # Compare-and-set como na troca de status: os contadores descontam o status que o alerta tinha ao sair
+    for _ in range(TENTATIVAS_TROCA_STATUS):
+        alerta = (await db.execute(
+            select(
+                models.Alerta.tipo, models.Alerta.latitude, models.Alerta.longitude, models.Alerta.status,
+                models.Alerta.data_ocorrencia, models.Alerta.usuario_id,
+            ).where(models.Alerta.id == alerta_id, models.Alerta.removido_em.is_(None))
+        )).first()
+        if alerta is None:
+            raise HTTPException(status_code=404, detail="Alerta não encontrado")
+        removidos = (await db.execute(
+            update(models.Alerta)
+            .where(
+                models.Alerta.id == alerta_id,
+                models.Alerta.status == alerta.status,
+                models.Alerta.removido_em.is_(None),
+            )
+            .values(removido_em=datetime.now(), versao=versao)
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        if removidos == 1:
+            break
+    else:
+        raise HTTPException(status_code=409, detail="O alerta foi alterado por outra requisição; tente novamente")
+
+    # Dados mínimos para os assinantes do feed aplicarem seus filtros
+    evento_remocao = {"id": alerta_id, "tipo": alerta.tipo, "latitude": alerta.latitude, "longitude": alerta.longitude}
+    usuario_autor_id = alerta.usuario_id
+
+    # A associação com as regiões e os relatos anexados saem de vez; só o alerta fica como tombstone
+    regiao_ids = (await db.scalars(
+        select(models.AlertaRegiao.regiao_id).where(models.AlertaRegiao.alerta_id == alerta_id)
+    )).all()
+    await db.execute(delete(models.AlertaRegiao).where(models.AlertaRegiao.alerta_id == alerta_id))
+    await db.execute(delete(models.AlertaRelato).where(models.AlertaRelato.alerta_id == alerta_id))
+    await db.run_sync(estatisticas.aplicar_deltas, estatisticas.deltas_do_alerta(
+        alerta.tipo, alerta.status, alerta.data_ocorrencia, regiao_ids, sinal=-1
+    ))
+    await db.commit() # Commitar a transação
+    indice_alertas.remover(alerta_id) # Manter o índice espacial em sincronia
+    grade_clusters.remover(alerta_id)
+    indice_busca.remover(alerta_id)
+    janela_duplicatas.remover(alerta_id)
+    for regiao_id in regiao_ids:
+        rankings_regioes.somar(regiao_id, usuario_autor_id, -1)
+    broker_alertas.publicar("removido", evento_remocao)
     return {"message": f"Alerta com ID {alerta_id} deletado"}
 
+# Moderação em lote: no máximo MAX_ALERTAS_MODERACAO alertas por chamada
+MAX_ALERTAS_MODERACAO = 5000
+
+# Colunas lidas dos alertas selecionados: as da resposta + autor (contadores, conquistas e rankings)
+COLUNAS_MODERACAO = (*COLUNAS_ALERTA, models.Alerta.usuario_id)
+
+# UPDATEs da moderação executados uma vez para o lote todo (executemany), cada alerta com a sua versão
+# Compare-and-set por alerta: só valem se o status ainda é o lido na seleção (b_anterior)
+_tabela_alertas = models.Alerta.__table__
+_atualizar_status_lote = (
+    update(_tabela_alertas)
+    .where(
+        _tabela_alertas.c.id == bindparam("b_id"),
+        _tabela_alertas.c.status == bindparam("b_anterior"),
+        _tabela_alertas.c.removido_em.is_(None),
+    )
+    .values(status=bindparam("b_status"), versao=bindparam("b_versao"))
+)
+_remover_alertas_lote = (
+    update(_tabela_alertas)
+    .where(
+        _tabela_alertas.c.id == bindparam("b_id"),
+        _tabela_alertas.c.status == bindparam("b_anterior"),
+        _tabela_alertas.c.removido_em.is_(None),
+    )
+    .values(removido_em=bindparam("b_removido_em"), versao=bindparam("b_versao"))
+)
+
+# Executa um dos UPDATEs acima e devolve os IDs em que ele foi aplicado. Com todas as linhas alteradas
+# basta o rowcount; senão, as aplicadas são as que ficaram com a versão reservada para elas
+async def _executar_moderacao(instrucao, parametros, db: AsyncSession):
+    versoes_por_id = {parametro["b_id"]: parametro["b_versao"] for parametro in parametros}
+    alterados = (await db.execute(instrucao, parametros)).rowcount
+    if alterados == len(parametros) and db.bind.dialect.supports_sane_multi_rowcount:
+        return versoes_por_id.keys()
+    ids = list(versoes_por_id)
+    aplicados = set()
+    for inicio in range(0, len(ids), 1000):
+        for alerta_id, versao in await db.execute(
+            select(models.Alerta.id, models.Alerta.versao).where(models.Alerta.id.in_(ids[inicio:inicio + 1000]))
+        ):
+            if versao == versoes_por_id[alerta_id]:
+                aplicados.add(alerta_id)
+    return aplicados
+
+# Aplica a moderação às linhas selecionadas e devolve as que foram de fato alteradas (com o status anterior
+# que valeu para os contadores). Alertas mudados por outra transação entre a leitura e o UPDATE são lidos
+# de novo e tentados outra vez; `incluir` decide se uma linha relida ainda deve ser alterada
+async def aplicar_moderacao(instrucao, linhas, parametros, db: AsyncSession, incluir=None):
+    aplicadas = []
+    pendentes = linhas
+    for _ in range(TENTATIVAS_TROCA_STATUS):
+        aplicados = await _executar_moderacao(instrucao, [parametros(linha) for linha in pendentes], db)
+        aplicadas.extend(linha for linha in pendentes if linha.id in aplicados)
+        ids = [linha.id for linha in pendentes if linha.id not in aplicados]
+        if not ids:
+            break
+        pendentes = []
+        for inicio in range(0, len(ids), 1000):
+            pendentes.extend(
+                linha for linha in await db.execute(
+                    select(*COLUNAS_MODERACAO)
+                    .where(models.Alerta.id.in_(ids[inicio:inicio + 1000]), models.Alerta.removido_em.is_(None))
+                )
+                if incluir is None or incluir(linha)
+            )
+        if not pendentes:
+            break
+    return aplicadas
+
+# Alertas ativos da seleção (IDs e/ou filtros)
+# Retorna as linhas (COLUNAS_MODERACAO) e os IDs pedidos que não foram encontrados
+async def carregar_selecao(selecao: models.SelecaoAlertas, db: AsyncSession):
+    filtros = (selecao.tipo, selecao.regiao_id, selecao.status_atual, selecao.antes_de)
+    if selecao.ids is None and all(filtro is None for filtro in filtros):
+        raise HTTPException(status_code=400, detail="Informe os IDs ou ao menos um filtro (tipo, regiao_id, status_atual, antes_de)")
+    if selecao.ids is not None and len(selecao.ids) > MAX_ALERTAS_MODERACAO:
+        raise HTTPException(status_code=413, detail=f"No máximo {MAX_ALERTAS_MODERACAO} alertas por chamada")
+
+    query = select(*COLUNAS_MODERACAO).where(models.Alerta.removido_em.is_(None))
+    if selecao.tipo is not None:
+        query = query.where(models.Alerta.tipo == selecao.tipo)
+    if selecao.status_atual is not None:
+        query = query.where(models.Alerta.status == selecao.status_atual)
+    if selecao.antes_de is not None:
+        query = query.where(models.Alerta.data_ocorrencia < selecao.antes_de)
+    if selecao.regiao_id is not None:
+        query = query.where(models.Alerta.id.in_(
+            select(models.AlertaRegiao.alerta_id).where(models.AlertaRegiao.regiao_id == selecao.regiao_id)
+        ))
+
+    if selecao.ids is None:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        if total > MAX_ALERTAS_MODERACAO:
+            raise HTTPException(
+                status_code=413, detail=f"O filtro seleciona {total} alertas; o máximo por chamada é {MAX_ALERTAS_MODERACAO}"
+            )
+        return (await db.execute(query.order_by(models.Alerta.id))).all(), []
+
+    ids = list(dict.fromkeys(selecao.ids))
+    linhas = []
+    # O Oracle limita listas IN a 1000 elementos
+    for inicio in range(0, len(ids), 1000):
+        linhas.extend(await db.execute(
+            query.where(models.Alerta.id.in_(ids[inicio:inicio + 1000])).order_by(models.Alerta.id)
+        ))
+    encontrados = {linha.id for linha in linhas}
+    return linhas, [alerta_id for alerta_id in ids if alerta_id not in encontrados]
+
+# Rota para alterar o status de vários alertas de uma vez (moderação depois de um grande evento)
+# Uma transação para o lote: um SELECT, um UPDATE em lote (compare-and-set), os contadores do painel somados
+# e as conquistas de validação avaliadas uma vez por autor; índices, caches e feed são avisados uma vez
+@app.put("/alertas/status", response_model=models.ResultadoModeracao)
+async def update_alertas_status(atualizacao: models.AlertaUpdateStatusLote, db: AsyncSession = Depends(get_async_db)):
+    novo_status = atualizacao.status
+    validacoes = Counter()
+    try:
+        linhas, nao_encontrados = await carregar_selecao(atualizacao, db)
+        alteradas = [linha for linha in linhas if linha.status != novo_status]
+        if alteradas:
+            primeira_versao = await db.run_sync(reservar_versoes, len(alteradas))
+            versoes_por_id = {linha.id: primeira_versao + deslocamento for deslocamento, linha in enumerate(alteradas)}
+            alteradas = await aplicar_moderacao(
+                _atualizar_status_lote,
+                alteradas,
+                lambda linha: {"b_id": linha.id, "b_anterior": linha.status, "b_status": novo_status, "b_versao": versoes_por_id[linha.id]},
+                db,
+                incluir=lambda linha: linha.status != novo_status,
+            )
+
+            deltas = Counter()
+            for linha in alteradas:
+                deltas.update(estatisticas.deltas_de_status(linha.tipo, linha.status, novo_status))
+                if conquistas.eh_validacao(linha.status, novo_status):
+                    validacoes[linha.usuario_id] += 1
+            await db.run_sync(estatisticas.aplicar_deltas, deltas)
+
+            # Relatos validados contam para as conquistas dos autores: um UPDATE em lote para todos os
+            # autores e uma avaliação das conquistas para todos juntos (não algumas consultas por autor)
+            if validacoes:
+                estatisticas_autores = await db.run_sync(conquistas.registrar_validacoes_lote, validacoes)
+                await db.run_sync(verificar_conquistas_lote, estatisticas_autores)
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        print(f"Erro ao atualizar status em lote: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao atualizar status dos alertas: {e}")
+
+    for usuario_id in validacoes:
+        cache_perfis.invalidar(usuario_id)
+    alertas_dict = []
+    for linha in alteradas:
+        indice_alertas.atualizar_status(linha.id, novo_status)
+        grade_clusters.atualizar_status(linha.id, novo_status)
+        indice_busca.atualizar_status(linha.id, novo_status)
+        if novo_status in STATUS_FECHADOS:
+            janela_duplicatas.remover(linha.id)
+        alertas_dict.append(formatar_linha_alerta(linha[:5] + (novo_status,) + linha[6:8]))
+    if alertas_dict:
+        broker_alertas.publicar("atualizados", {"status": novo_status, "alertas": alertas_dict})
+    return models.ResultadoModeracao(alterados=len(alteradas), nao_encontrados=nao_encontrados)
+
+# Rota para remover vários alertas de uma vez (mesma seleção de PUT /alertas/status)
+# Os alertas ficam como tombstones, como em DELETE /alertas/{alerta_id}
+@app.delete("/alertas", response_model=models.ResultadoModeracao)
+async def delete_alertas(selecao: models.SelecaoAlertas, db: AsyncSession = Depends(get_async_db)):
+    regioes_por_alerta = defaultdict(list)
+    try:
+        linhas, nao_encontrados = await carregar_selecao(selecao, db)
+        if linhas:
+            primeira_versao = await db.run_sync(reservar_versoes, len(linhas)) # Antes de qualquer escrita
+            versoes_por_id = {linha.id: primeira_versao + deslocamento for deslocamento, linha in enumerate(linhas)}
+            agora = datetime.now()
+            linhas = await aplicar_moderacao(
+                _remover_alertas_lote,
+                linhas,
+                lambda linha: {"b_id": linha.id, "b_anterior": linha.status, "b_removido_em": agora, "b_versao": versoes_por_id[linha.id]},
+                db,
+            )
+
+            ids = [linha.id for linha in linhas]
+            for inicio in range(0, len(ids), 1000):
+                lote = ids[inicio:inicio + 1000]
+                for alerta_id, regiao_id in await db.execute(
+                    select(models.AlertaRegiao.alerta_id, models.AlertaRegiao.regiao_id)
+                    .where(models.AlertaRegiao.alerta_id.in_(lote))
+                ):
+                    regioes_por_alerta[alerta_id].append(regiao_id)
+                await db.execute(delete(models.AlertaRegiao).where(models.AlertaRegiao.alerta_id.in_(lote)))
+                await db.execute(delete(models.AlertaRelato).where(models.AlertaRelato.alerta_id.in_(lote)))
+
+            deltas = Counter()
+            for linha in linhas:
+                deltas.update(estatisticas.deltas_do_alerta(
+                    linha.tipo, linha.status, linha.data_ocorrencia, regioes_por_alerta[linha.id], sinal=-1
+                ))
+            await db.run_sync(estatisticas.aplicar_deltas, deltas)
+        await db.commit()
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        print(f"Erro ao remover alertas em lote: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao remover alertas: {e}")
+
+    alertas_por_regiao = Counter()
+    for linha in linhas:
+        indice_alertas.remover(linha.id)
+        grade_clusters.remover(linha.id)
+        indice_busca.remover(linha.id)
+        janela_duplicatas.remover(linha.id)
+        for regiao_id in regioes_por_alerta[linha.id]:
+            alertas_por_regiao[(regiao_id, linha.usuario_id)] += 1
+    for (regiao_id, usuario_id), quantidade in alertas_por_regiao.items():
+        rankings_regioes.somar(regiao_id, usuario_id, -quantidade)
+    if linhas:
+        broker_alertas.publicar("removidos", {"alertas": [
+            {"id": linha.id, "tipo": linha.tipo, "latitude": linha.latitude, "longitude": linha.longitude}
+            for linha in linhas
+        ]})
+    return models.ResultadoModeracao(alterados=len(linhas), nao_encontrados=nao_encontrados)
+
 # Rotas CRUD para Usuários
 
+# Opções de carregamento para trazer as conquistas junto com os usuários
+# Nas rotas assíncronas não há carregamento preguiçoso: tudo o que a resposta usa precisa vir na consulta
+CARREGAR_CONQUISTAS = selectinload(models.Usuario.conquistas).selectinload(models.UsuarioConquista.conquista)
+
+# Montar o UsuarioSchema (conquistas como ConquistaSchema) a partir de um Usuario já carregado
+def montar_usuario_schema(usuario):
+    return models.UsuarioSchema(
+        id=usuario.id,
+        nome=usuario.nome,
+        email=usuario.email,
+        nivel=usuario.nivel,
+        pontos=usuario.pontos,
+        conquistas=[
+            models.ConquistaSchema.model_validate(uc.conquista)
+            for uc in usuario.conquistas
+            if uc.conquista is not None
+        ]
+    )
+
 @app.post("/usuarios/", response_model=models.UsuarioSchema)
-def create_usuario(usuario: models.UsuarioCreate, db: Session = Depends(get_db)):
+async def create_usuario(usuario: models.UsuarioCreate, db: AsyncSession = Depends(get_async_db)):
     db_usuario = models.Usuario(
         nome=usuario.nome,
         email=usuario.email,
-        senha_hashed=usuario.senha  # Em produção, deve-se usar hash da senha
+        senha_hashed=usuario.senha,  # Em produção, deve-se usar hash da senha
+        nivel=1,
+        pontos=0
     )
     db.add(db_usuario)
-    db.commit()
-    db.refresh(db_usuario)
-    return db_usuario
+    await db.commit()
+    ranking_usuarios.definir(db_usuario.id, db_usuario.pontos)
+    # Usuário novo ainda não tem conquistas
+    return models.UsuarioSchema(
+        id=db_usuario.id,
+        nome=db_usuario.nome,
+        email=db_usuario.email,
+        nivel=db_usuario.nivel,
+        pontos=db_usuario.pontos
+    )
 
 @app.get("/usuarios/", response_model=List[models.UsuarioSchema])
-def read_usuarios(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    query = select(models.Usuario).offset(skip).limit(limit)
-    result = db.execute(query)
+async def read_usuarios(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    query = select(models.Usuario).options(CARREGAR_CONQUISTAS).order_by(models.Usuario.id).offset(skip).limit(limit)
+    result = await db.execute(query)
     usuarios = result.scalars().all()
-    return usuarios
+    return [montar_usuario_schema(usuario) for usuario in usuarios]
 
 @app.get("/usuarios/{usuario_id}", response_model=models.UsuarioSchema)
-def read_usuario(usuario_id: int, db: Session = Depends(get_db)):
-    query = select(models.Usuario).where(models.Usuario.id == usuario_id)
-    result = db.execute(query)
+async def read_usuario(usuario_id: int, db: AsyncSession = Depends(get_async_db)):
+    query = select(models.Usuario).options(CARREGAR_CONQUISTAS).where(models.Usuario.id == usuario_id)
+    result = await db.execute(query)
     usuario = result.scalar_one_or_none()
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
-    return usuario
+    return montar_usuario_schema(usuario)
 
 @app.put("/usuarios/{usuario_id}", response_model=models.UsuarioSchema)
-def update_usuario(
+async def update_usuario(
     usuario_id: int,
     usuario_update: models.UsuarioCreate, # Usar modelo Create para entrada (inclui senha)
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
+    query = select(models.Usuario).options(CARREGAR_CONQUISTAS).where(models.Usuario.id == usuario_id)
+    usuario = (await db.execute(query)).scalar_one_or_none()
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
@@ -222,39 +1558,122 @@ def update_usuario(
     usuario.email = usuario_update.email
     usuario.senha_hashed = usuario_update.senha # !!! LEMBRE-SE DE FAZER HASH !!!
 
-    db.commit() # Commitar a transação
-    db.refresh(usuario) # Atualizar o objeto
-    return usuario
+    await db.commit() # Commitar a transação
+    cache_perfis.invalidar(usuario_id)
+    return montar_usuario_schema(usuario)
 
 @app.delete("/usuarios/{usuario_id}")
-def delete_usuario(
+async def delete_usuario(
     usuario_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
+    usuario = await db.get(models.Usuario, usuario_id)
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    db.delete(usuario)
-    db.commit()
+    await db.delete(usuario)
+    await db.commit()
+    cache_perfis.invalidar(usuario_id)
+    ranking_usuarios.remover(usuario_id)
+    rankings_regioes.remover_usuario(usuario_id)
     return {"message": f"Usuário com ID {usuario_id} deletado"}
 
+# Caches das tabelas de referência (mudam só em escritas administrativas)
+cache_regioes = CacheReferencia("regioes")
+cache_conquistas = CacheReferencia("conquistas")
+
+# Responder com o corpo em cache e o ETag, ou 304 se o cliente já tem essa versão (If-None-Match)
+def resposta_com_etag(request: Request, corpo: bytes, etag: str):
+    cabecalhos = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etags_cliente = [valor.strip() for valor in if_none_match.split(",")]
+        if "*" in etags_cliente or etag in etags_cliente or f"W/{etag}" in etags_cliente:
+            return Response(status_code=304, headers=cabecalhos)
+    return Response(content=corpo, media_type="application/json", headers=cabecalhos)
+
+# Validar a geometria recebida e convertê-la no texto gravado em Regiao.geometria
+def geometria_para_texto(geometria):
+    if geometria is None:
+        return None
+    try:
+        normalizar_geometria(geometria)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Geometria inválida: {e}")
+    return json.dumps(geometria)
+
+# Refazer a associação alerta_regiao de uma região cuja geometria mudou
+# Os candidatos vêm do índice espacial dos alertas (caixa da região); só eles passam pelo teste do polígono
+# Os alertas arquivados (fora do índice) continuam contando para a região pelos totais de regiao_usuarios_arquivados
+def reassociar_alertas_da_regiao(regiao_id: int, geometria, db: Session):
+    db.execute(delete(models.AlertaRegiao).where(models.AlertaRegiao.regiao_id == regiao_id))
+    arquivados = db.scalar(
+        select(func.coalesce(func.sum(models.RegiaoUsuarioArquivado.alertas), 0))
+        .where(models.RegiaoUsuarioArquivado.regiao_id == regiao_id)
+    )
+    if not geometria:
+        estatisticas.definir_contador(db, "regiao", regiao_id, arquivados)
+        return 0
+    poligonos = normalizar_geometria(geometria)
+    min_lon, min_lat, max_lon, max_lat = caixa_da_geometria(poligonos)
+    associacoes = [
+        {"alerta_id": alerta_id, "regiao_id": regiao_id}
+        for alerta_id, latitude, longitude in indice_alertas.buscar_area(min_lat, min_lon, max_lat, max_lon)
+        if ponto_na_geometria(latitude, longitude, poligonos)
+    ]
+    if associacoes:
+        db.execute(insert(models.AlertaRegiao), associacoes)
+    estatisticas.definir_contador(db, "regiao", regiao_id, arquivados + len(associacoes))
+    return len(associacoes)
+
+# Remontar o ranking de uma região depois que os alertas associados a ela mudaram
+def recarregar_ranking_regiao(regiao_id: int, db: Session):
+    contagens = Counter(dict(db.execute(
+        select(models.RegiaoUsuarioArquivado.usuario_id, models.RegiaoUsuarioArquivado.alertas)
+        .where(models.RegiaoUsuarioArquivado.regiao_id == regiao_id)
+    ).tuples().all()))
+    for usuario_id, total in db.execute(
+        select(models.Alerta.usuario_id, func.count())
+        .join(models.AlertaRegiao, models.AlertaRegiao.alerta_id == models.Alerta.id)
+        .where(models.AlertaRegiao.regiao_id == regiao_id)
+        .group_by(models.Alerta.usuario_id)
+    ):
+        contagens[usuario_id] += total
+    rankings_regioes.carregar_regiao(regiao_id, contagens.items())
+
 # Rotas CRUD para Regiões
 
 @app.post("/regioes/", response_model=models.RegiaoSchema)
 def create_regiao(regiao: models.RegiaoCreate, db: Session = Depends(get_db)):
-    db_regiao = models.Regiao(nome=regiao.nome)
+    db_regiao = models.Regiao(nome=regiao.nome, geometria=geometria_para_texto(regiao.geometria))
     db.add(db_regiao)
+    db.flush()
+    if db_regiao.geometria:
+        reassociar_alertas_da_regiao(db_regiao.id, db_regiao.geometria, db)
     db.commit()
+    indice_regioes.definir(db_regiao.id, db_regiao.geometria)
+    recarregar_ranking_regiao(db_regiao.id, db)
+    cache_regioes.invalidar()
     db.refresh(db_regiao)
     return db_regiao
 
+# Regiões por página em GET /regioes/ (cada página distinta ocupa uma entrada de cache_regioes)
+MAX_REGIOES_PAGINA = 1000
+
 @app.get("/regioes/", response_model=List[models.RegiaoSchema])
-def read_regioes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    query = select(models.Regiao).offset(skip).limit(limit)
-    result = db.execute(query)
-    regioes = result.scalars().all()
-    return regioes
+def read_regioes(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, gt=0, le=MAX_REGIOES_PAGINA),
+    db: Session = Depends(get_db)
+):
+    def carregar():
+        query = select(models.Regiao).order_by(models.Regiao.id).offset(skip).limit(limit)
+        regioes = db.execute(query).scalars().all()
+        return LISTA_REGIOES.dump_json([models.RegiaoSchema.model_validate(regiao) for regiao in regioes])
+
+    corpo, etag = cache_regioes.obter((skip, limit), carregar)
+    return resposta_com_etag(request, corpo, etag)
 
 @app.get("/regioes/{regiao_id}", response_model=models.RegiaoSchema)
 def read_regiao(regiao_id: int, db: Session = Depends(get_db)):
@@ -265,6 +1684,29 @@ def read_regiao(regiao_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Região não encontrada")
     return regiao
 
+# Alertas de uma região, do mais recente ao mais antigo, lidos da associação alerta_regiao
+# (índice regiao_id, alerta_id); a próxima página começa antes do menor ID recebido (antes_de)
+@app.get("/regioes/{regiao_id}/alertas", response_model=List[models.AlertaSchema])
+async def read_alertas_da_regiao(
+    regiao_id: int,
+    antes_de: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    query = (
+        select(*COLUNAS_ALERTA)
+        .join(models.AlertaRegiao, models.AlertaRegiao.alerta_id == models.Alerta.id)
+        .where(models.AlertaRegiao.regiao_id == regiao_id, models.Alerta.removido_em.is_(None))
+        .order_by(models.AlertaRegiao.alerta_id.desc())
+        .limit(limit)
+    )
+    if antes_de is not None:
+        query = query.where(models.AlertaRegiao.alerta_id < antes_de)
+    linhas = (await db.execute(query)).all()
+    if not linhas and await db.get(models.Regiao, regiao_id) is None:
+        raise HTTPException(status_code=404, detail="Região não encontrada")
+    return resposta_alertas(linhas)
+
 @app.put("/regioes/{regiao_id}", response_model=models.RegiaoSchema)
 def update_regiao(
     regiao_id: int,
@@ -277,8 +1719,16 @@ def update_regiao(
     
     # Atualizar campos
     regiao.nome = regiao_update.nome
+    geometria_alterada = "geometria" in regiao_update.model_fields_set
+    if geometria_alterada:
+        regiao.geometria = geometria_para_texto(regiao_update.geometria)
+        reassociar_alertas_da_regiao(regiao.id, regiao.geometria, db)
 
     db.commit() # Commitar a transação
+    if geometria_alterada:
+        indice_regioes.definir(regiao_id, regiao_update.geometria)
+        recarregar_ranking_regiao(regiao_id, db)
+    cache_regioes.invalidar()
     db.refresh(regiao) # Atualizar o objeto
     return regiao
 
@@ -291,74 +1741,88 @@ def delete_regiao(
     if regiao is None:
         raise HTTPException(status_code=404, detail="Região não encontrada")
     
+    db.execute(delete(models.AlertaRegiao).where(models.AlertaRegiao.regiao_id == regiao_id))
+    db.execute(delete(models.RegiaoUsuarioArquivado).where(models.RegiaoUsuarioArquivado.regiao_id == regiao_id))
+    estatisticas.definir_contador(db, "regiao", regiao_id, 0)
     db.delete(regiao)
     db.commit()
+    indice_regioes.remover(regiao_id)
+    rankings_regioes.remover_regiao(regiao_id)
+    cache_regioes.invalidar()
     return {"message": f"Região com ID {regiao_id} deletada"}
 
 # Rotas para o sistema de gamificação
 
-@app.get("/usuarios/{usuario_id}/perfil", response_model=models.UsuarioSchema)
-def get_usuario_perfil(usuario_id: int, db: Session = Depends(get_db)):
-    print(f"@@@ Acessando rota de perfil para usuario_id: {usuario_id} @@@") # Log de debug
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
-    if usuario is None:
-        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+# Cache dos perfis já montados, por usuário
+# Invalidado sempre que os pontos, o nível ou as conquistas do usuário mudam
+cache_perfis = CacheLocal(max_itens=10000)
 
-    # Formatar o objeto usuario do SQLAlchemy para o Pydantic UsuarioSchema
-    # Precisamos garantir que a lista de conquistas contenha objetos ConquistaSchema
-    conquistas_schema = []
-    for uc in usuario.conquistas:
-        # uc é um objeto UsuarioConquista, precisamos do objeto Conquista associado
-        conquista = db.query(models.Conquista).filter(models.Conquista.id == uc.conquista_id).first()
-        if conquista:
-            conquistas_schema.append(models.ConquistaSchema(**conquista.__dict__))
-
-    usuario_schema = models.UsuarioSchema(
-        id=usuario.id,
-        nome=usuario.nome,
-        email=usuario.email,
-        nivel=usuario.nivel,
-        pontos=usuario.pontos,
-        conquistas=conquistas_schema
+# Carregar usuário e conquistas em uma única consulta (JOIN) e montar o UsuarioSchema
+async def carregar_perfil(usuario_id: int, db: AsyncSession):
+    query = (
+        select(models.Usuario)
+        .options(joinedload(models.Usuario.conquistas).joinedload(models.UsuarioConquista.conquista))
+        .where(models.Usuario.id == usuario_id)
     )
+    usuario = (await db.execute(query)).unique().scalar_one_or_none()
+    evento("perfil_carregado", usuario_id=usuario_id, encontrado=usuario is not None) # Só quando o cache não tinha o perfil
+    if usuario is None:
+        return None
+    return montar_usuario_schema(usuario)
+
+@app.get("/usuarios/{usuario_id}/perfil", response_model=models.UsuarioSchema)
+async def get_usuario_perfil(usuario_id: int, db: AsyncSession = Depends(get_async_db)):
+    usuario_schema = await cache_perfis.obter_ou_carregar_async(usuario_id, lambda: carregar_perfil(usuario_id, db))
+    if usuario_schema is None:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
     return usuario_schema # Retorna o objeto Pydantic formatado
 
 @app.post("/usuarios/{usuario_id}/pontos", response_model=models.UsuarioSchema)
-def adicionar_pontos(usuario_id: int, pontos: int, db: Session = Depends(get_db)):
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
+async def adicionar_pontos(usuario_id: int, pontos: int, db: AsyncSession = Depends(get_async_db)):
+    usuario = await db.get(models.Usuario, usuario_id)
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    usuario.pontos += pontos
-    # Atualizar nível baseado nos pontos (exemplo: 100 pontos por nível)
-    usuario.nivel = (usuario.pontos // 100) + 1
+    # Soma e nível (100 pontos por nível) calculados no banco, com o lançamento no extrato
+    pontos_usuario, _ = await db.run_sync(creditar, usuario_id, pontos, "manual")
     
-    db.commit()
-    db.refresh(usuario)
-    return usuario
+    await db.commit()
+    cache_perfis.invalidar(usuario_id)
+    ranking_usuarios.definir(usuario_id, pontos_usuario)
+    # Responder com o perfil completo (as conquistas precisam vir como ConquistaSchema)
+    return await carregar_perfil(usuario_id, db)
 
 @app.get("/conquistas/", response_model=List[models.ConquistaSchema])
-def listar_conquistas(db: Session = Depends(get_db)):
-    return db.query(models.Conquista).all()
+def listar_conquistas(request: Request, db: Session = Depends(get_db)):
+    def carregar():
+        conquistas_db = db.query(models.Conquista).order_by(models.Conquista.id).all()
+        return LISTA_CONQUISTAS.dump_json([models.ConquistaSchema.model_validate(c) for c in conquistas_db])
+
+    corpo, etag = cache_conquistas.obter("todas", carregar)
+    return resposta_com_etag(request, corpo, etag)
+
+# Rota administrativa para descartar os caches de conquistas depois de rodar insert_conquistas.sql
+@app.post("/conquistas/recarregar")
+def recarregar_conquistas():
+    cache_conquistas.invalidar()
+    conquistas.invalidar_catalogo()
+    return {"message": "Catálogo de conquistas recarregado", "versao": cache_conquistas.versao}
 
 @app.post("/usuarios/{usuario_id}/conquistas/{conquista_id}")
-def atribuir_conquista(usuario_id: int, conquista_id: int, db: Session = Depends(get_db)):
+async def atribuir_conquista(usuario_id: int, conquista_id: int, db: AsyncSession = Depends(get_async_db)):
     # Verificar se usuário existe
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
+    usuario = await db.get(models.Usuario, usuario_id)
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
     # Verificar se conquista existe
-    conquista = db.query(models.Conquista).filter(models.Conquista.id == conquista_id).first()
+    conquista = await db.get(models.Conquista, conquista_id)
     if conquista is None:
         raise HTTPException(status_code=404, detail="Conquista não encontrada")
     
     # Verificar se usuário já tem a conquista
-    usuario_conquista = db.query(models.UsuarioConquista).filter(
-        models.UsuarioConquista.usuario_id == usuario_id,
-        models.UsuarioConquista.conquista_id == conquista_id
-    ).first()
+    usuario_conquista = await db.get(models.UsuarioConquista, (usuario_id, conquista_id))
     
     if usuario_conquista is not None:
         raise HTTPException(status_code=400, detail="Usuário já possui esta conquista")
@@ -371,35 +1835,63 @@ def atribuir_conquista(usuario_id: int, conquista_id: int, db: Session = Depends
     db.add(nova_conquista)
     
     # Adicionar pontos da conquista
-    usuario.pontos += conquista.pontos_necessarios
-    usuario.nivel = (usuario.pontos // 100) + 1
+    pontos_usuario, _ = await db.run_sync(creditar, usuario_id, conquista.pontos_necessarios or 0, "conquista", conquista_id)
     
-    db.commit()
+    await db.commit()
+    cache_perfis.invalidar(usuario_id)
+    ranking_usuarios.definir(usuario_id, pontos_usuario)
     return {"message": "Conquista atribuída com sucesso"}
 
+# Ranking geral por pontos ou, com regiao_id, pelo número de alertas abertos na região
+# As posições vêm da skip list em memória; o banco só é consultado para os nomes da página
+@app.get("/ranking", response_model=List[models.RankingItemSchema])
+async def read_ranking(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    regiao_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    ranking = ranking_usuarios if regiao_id is None else rankings_regioes.consultar(regiao_id)
+    linhas = ranking.topo(limit, offset)
+    nomes = dict((await db.execute(
+        select(models.Usuario.id, models.Usuario.nome).where(models.Usuario.id.in_([linha[1] for linha in linhas]))
+    )).all()) if linhas else {}
+    campo = "pontos" if regiao_id is None else "alertas"
+    return [
+        models.RankingItemSchema(posicao=posicao, usuario_id=usuario_id, nome=nomes.get(usuario_id), **{campo: valor})
+        for posicao, usuario_id, valor in linhas
+    ]
+
+@app.get("/usuarios/{usuario_id}/ranking", response_model=models.RankingUsuarioSchema)
+def read_usuario_ranking(usuario_id: int, regiao_id: Optional[int] = None):
+    ranking = ranking_usuarios if regiao_id is None else rankings_regioes.consultar(regiao_id)
+    encontrado = ranking.posicao(usuario_id)
+    if encontrado is None:
+        raise HTTPException(status_code=404, detail="Usuário não está no ranking")
+    posicao, valor = encontrado
+    campo = "pontos" if regiao_id is None else "alertas"
+    return models.RankingUsuarioSchema(
+        posicao=posicao, usuario_id=usuario_id, participantes=len(ranking), **{campo: valor}
+    )
+
 # Função auxiliar para verificar e atribuir conquistas automaticamente
-def verificar_conquistas(usuario_id: int, db: Session):
+# As regras e o catálogo ficam em conquistas.py; aqui só carregamos o usuário e delegamos
+def verificar_conquistas(usuario_id: int, db: Session, commit: bool = True, estatistica=None):
     usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
     if usuario is None:
-        return
-    
-    # Exemplo de regras para conquistas
-    conquistas = db.query(models.Conquista).all()
-    for conquista in conquistas:
-        # Verificar se usuário já tem a conquista
-        usuario_conquista = db.query(models.UsuarioConquista).filter(
-            models.UsuarioConquista.usuario_id == usuario_id,
-            models.UsuarioConquista.conquista_id == conquista.id
-        ).first()
-        
-        if usuario_conquista is None and usuario.pontos >= conquista.pontos_necessarios:
-            # Atribuir conquista
-            nova_conquista = models.UsuarioConquista(
-                usuario_id=usuario_id,
-                conquista_id=conquista.id
-            )
-            db.add(nova_conquista)
-    
-    db.commit()
+        return []
 
+    novas = conquistas.avaliar(db, usuario, estatistica)
+
+    # Quem chama pode deixar o commit para o fim da sua própria transação
+    if commit:
+        db.commit()
+    return novas
 
+# verificar_conquistas para vários usuários de uma vez ({usuario_id: estatistica}), sem commit
+def verificar_conquistas_lote(db: Session, estatisticas_usuarios):
+    ids = list(estatisticas_usuarios)
+    usuarios = []
+    for inicio in range(0, len(ids), conquistas.LOTE_IN):
+        usuarios.extend(db.scalars(select(models.Usuario).where(models.Usuario.id.in_(ids[inicio:inicio + conquistas.LOTE_IN]))))
+    return conquistas.avaliar_lote(db, usuarios, estatisticas_usuarios)
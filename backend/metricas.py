@@ -0,0 +1,216 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Limites (s) dos buckets dos histogramas de latência
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Estatísticas de banco da requisição em andamento (preenchidas pelos eventos do SQLAlchemy)
+# O valor é um objeto mutável: sessões síncronas (threadpool) e assíncronas (greenlet)
+# recebem uma cópia do contexto, mas todas apontam para o mesmo objeto
+_requisicao_atual = contextvars.ContextVar("metricas_requisicao", default=None)
+
+
+class EstatisticasRequisicao:
+    __slots__ = ("consultas", "tempo_db", "instrucoes", "eventos", "inicio")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.instrucoes = {} # SQL -> [execuções, segundos] (repetições indicam N+1, ver rastreamento.py)
+        self.eventos = None  # eventos da rota (rastreamento.evento), criados só quando usados
+        self.inicio = time.perf_counter()
+
+
+class Histograma:
+    def __init__(self, buckets=BUCKETS_LATENCIA):
+        self.buckets = buckets
+        self.contagens = [0] * (len(buckets) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.buckets, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+def _rotulos(**rotulos):
+    return ",".join(f'{nome}="{valor}"' for nome, valor in rotulos.items())
+
+
+class Metricas:
+    """Registro das métricas do processo, exportado no formato texto do Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencia_rotas = {}    # (método, rota) -> Histograma
+        self.consultas_rotas = {}   # (método, rota) -> [consultas, segundos]
+        self.espera_pool = {}       # nome do engine -> Histograma
+        self.engines = {}           # nome do engine -> Engine
+        self.coletores = []         # funções extras que devolvem linhas de texto
+        self.observadores = []      # funções chamadas ao fim de cada requisição (método, rota, status, duração, estatísticas)
+
+    def registrar_requisicao(self, metodo, rota, duracao, estatisticas):
+        chave = (metodo, rota)
+        with self._lock:
+            histograma = self.latencia_rotas.get(chave)
+            if histograma is None:
+                histograma = self.latencia_rotas[chave] = Histograma()
+            histograma.observar(duracao)
+            acumulado = self.consultas_rotas.setdefault(chave, [0, 0.0])
+            acumulado[0] += estatisticas.consultas
+            acumulado[1] += estatisticas.tempo_db
+
+    def registrar_espera_pool(self, nome, segundos):
+        with self._lock:
+            histograma = self.espera_pool.get(nome)
+            if histograma is None:
+                histograma = self.espera_pool[nome] = Histograma()
+            histograma.observar(segundos)
+
+    def _histograma_texto(self, nome, rotulos, histograma, linhas):
+        acumulado = 0
+        for limite, contagem in zip(histograma.buckets, histograma.contagens):
+            acumulado += contagem
+            linhas.append(f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+        linhas.append(f'{nome}_bucket{{{rotulos},le="+Inf"}} {histograma.total}')
+        linhas.append(f"{nome}_sum{{{rotulos}}} {histograma.soma}")
+        linhas.append(f"{nome}_count{{{rotulos}}} {histograma.total}")
+
+    def exportar(self):
+        linhas = []
+        with self._lock:
+            linhas.append("# HELP rede_alerta_http_requisicao_segundos Latência das requisições por rota")
+            linhas.append("# TYPE rede_alerta_http_requisicao_segundos histogram")
+            for (metodo, rota), histograma in sorted(self.latencia_rotas.items()):
+                self._histograma_texto(
+                    "rede_alerta_http_requisicao_segundos", _rotulos(metodo=metodo, rota=rota), histograma, linhas
+                )
+
+            linhas.append("# HELP rede_alerta_db_consultas_total Consultas SQL executadas por rota")
+            linhas.append("# TYPE rede_alerta_db_consultas_total counter")
+            for (metodo, rota), (consultas, _) in sorted(self.consultas_rotas.items()):
+                linhas.append(f"rede_alerta_db_consultas_total{{{_rotulos(metodo=metodo, rota=rota)}}} {consultas}")
+
+            linhas.append("# HELP rede_alerta_db_consultas_segundos_total Tempo gasto em consultas SQL por rota")
+            linhas.append("# TYPE rede_alerta_db_consultas_segundos_total counter")
+            for (metodo, rota), (_, segundos) in sorted(self.consultas_rotas.items()):
+                linhas.append(f"rede_alerta_db_consultas_segundos_total{{{_rotulos(metodo=metodo, rota=rota)}}} {segundos}")
+
+            linhas.append("# HELP rede_alerta_pool_espera_segundos Tempo de espera por uma conexão do pool")
+            linhas.append("# TYPE rede_alerta_pool_espera_segundos histogram")
+            for nome, histograma in sorted(self.espera_pool.items()):
+                self._histograma_texto("rede_alerta_pool_espera_segundos", _rotulos(engine=nome), histograma, linhas)
+
+        for titulo, metodo in (
+            ("rede_alerta_pool_conexoes_em_uso", "checkedout"),
+            ("rede_alerta_pool_overflow", "overflow"),
+            ("rede_alerta_pool_tamanho", "size"),
+        ):
+            linhas.append(f"# TYPE {titulo} gauge")
+            for nome, engine in sorted(self.engines.items()):
+                leitura = getattr(engine.pool, metodo, None)
+                if leitura is not None:
+                    # overflow() fica negativo enquanto o pool ainda não abriu pool_size conexões
+                    linhas.append(f"{titulo}{{{_rotulos(engine=nome)}}} {max(0, leitura())}")
+
+        for coletor in self.coletores:
+            linhas.extend(coletor())
+        return "\n".join(linhas) + "\n"
+
+
+metricas = Metricas()
+
+
+def _medir_espera(nome, obter):
+    inicio = time.perf_counter()
+    try:
+        return obter()
+    finally:
+        metricas.registrar_espera_pool(nome, time.perf_counter() - inicio)
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mede o tempo de espera por uma conexão livre."""
+
+    nome_metricas = "sync"
+
+    def _do_get(self):
+        return _medir_espera(self.nome_metricas, super()._do_get)
+
+
+class PoolAssincronoMedido(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool que mede o tempo de espera por uma conexão livre."""
+
+    nome_metricas = "async"
+
+    def _do_get(self):
+        return _medir_espera(self.nome_metricas, super()._do_get)
+
+
+def _antes_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    # O início fica no contexto da execução, não em uma pilha da conexão: uma consulta que falha
+    # (sem after_cursor_execute) não deixa sobra para as medições seguintes
+    if context is not None and _requisicao_atual.get() is not None:
+        context._metricas_inicio = time.perf_counter()
+
+
+def _depois_da_consulta(conn, cursor, statement, parameters, context, executemany):
+    estatisticas = _requisicao_atual.get()
+    if estatisticas is not None:
+        inicio = getattr(context, "_metricas_inicio", None)
+        duracao = time.perf_counter() - inicio if inicio is not None else 0.0
+        estatisticas.tempo_db += duracao
+        estatisticas.consultas += 1
+        # O texto do SQL tem os parâmetros separados, então a mesma consulta com outro id cai na mesma chave
+        acumulado = estatisticas.instrucoes.get(statement)
+        if acumulado is None:
+            estatisticas.instrucoes[statement] = [1, duracao]
+        else:
+            acumulado[0] += 1
+            acumulado[1] += duracao
+
+
+def instrumentar_engine(nome, engine):
+    """Registra os eventos de consulta do engine (síncrono; para async use engine.sync_engine)."""
+    metricas.engines[nome] = engine
+    event.listen(engine, "before_cursor_execute", _antes_da_consulta)
+    event.listen(engine, "after_cursor_execute", _depois_da_consulta)
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI que mede a latência e as consultas de cada requisição HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        estatisticas = EstatisticasRequisicao()
+        token = _requisicao_atual.set(estatisticas)
+        codigo = 500 # Se a rota falhar antes de responder
+
+        async def enviar(mensagem):
+            nonlocal codigo
+            if mensagem["type"] == "http.response.start":
+                codigo = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracao = time.perf_counter() - estatisticas.inicio
+            _requisicao_atual.reset(token)
+            # Usar o molde da rota (/alertas/{alerta_id}) e não o caminho, para não explodir a cardinalidade
+            rota = scope.get("route")
+            rota = rota.path if rota is not None else "desconhecida"
+            metricas.registrar_requisicao(scope["method"], rota, duracao, estatisticas)
+            for observador in metricas.observadores:
+                observador(scope["method"], rota, codigo, duracao, estatisticas)
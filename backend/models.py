@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from typing import List, Optional
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from typing import Dict, List, Optional
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Index, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.types import TIMESTAMP
 from sqlalchemy.orm import relationship
@@ -22,6 +22,41 @@ class Alerta(Base):
     status = Column(String(50), default="Em análise")
     data_ocorrencia = Column(TIMESTAMP)
     usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
+    geocelula = Column(String(12), index=True) # Geohash da posição (ver espacial.py)
+    relatos = Column(Integer, default=1, nullable=False) # Relatos do mesmo incidente (o original + os anexados)
+    versao = Column(Integer, default=0, nullable=False) # Versão da última alteração (ver versoes.py e GET /alertas/sync)
+    removido_em = Column(TIMESTAMP) # Tombstone: alertas removidos ficam na tabela para o sync dos clientes
+
+    # Índices compostos para a paginação por cursor (data_ocorrencia, id) com e sem filtros
+    # e índice da versão para o sync incremental (versao > desde)
+    __table_args__ = (
+        Index("ix_alertas_data_id", "data_ocorrencia", "id"),
+        Index("ix_alertas_status_data_id", "status", "data_ocorrencia", "id"),
+        Index("ix_alertas_tipo_data_id", "tipo", "data_ocorrencia", "id"),
+        Index("ix_alertas_versao", "versao"),
+    )
+
+# Tombstones dos alertas movidos para o arquivo histórico (ver historico.py): a linha sai de alertas
+# e fica só o necessário para o GET /alertas/sync avisar os clientes
+class AlertaArquivado(Base):
+    __tablename__ = "alertas_arquivados"
+
+    id = Column(Integer, primary_key=True) # Mesmo ID que o alerta tinha
+    versao = Column(Integer, nullable=False, index=True)
+    arquivado_em = Column(TIMESTAMP, nullable=False)
+
+# Relatos duplicados anexados a um incidente já existente (ver duplicatas.py)
+class AlertaRelato(Base):
+    __tablename__ = "alerta_relatos"
+
+    id = Column(Integer, primary_key=True, index=True)
+    alerta_id = Column(Integer, ForeignKey('alertas.id', ondelete="CASCADE"), nullable=False, index=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
+    titulo = Column(String(255), nullable=False)
+    descricao = Column(String(500))
+    latitude = Column(Float)
+    longitude = Column(Float)
+    data_relato = Column(TIMESTAMP)
 
 # Definir o modelo SQLAlchemy (Tabela) para Conquista
 class Conquista(Base):
@@ -58,7 +93,77 @@ class Usuario(Base):
     pontos = Column(Integer, default=0)
 
     # Relacionamento com conquistas
-    conquistas = relationship("UsuarioConquista", back_populates="usuario")
+    # delete-orphan: ao remover o usuário, remover também suas conquistas (ON DELETE CASCADE no Oracle)
+    conquistas = relationship("UsuarioConquista", back_populates="usuario", cascade="all, delete-orphan")
+
+# Extrato de pontos: um lançamento por crédito, só com inserções (ver pontos.py)
+# Usuario.pontos é a soma dos lançamentos, mantida com UPDATE pontos = pontos + n
+class PontoLancamento(Base):
+    __tablename__ = "pontos_lancamentos"
+
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id', ondelete="CASCADE"), nullable=False, index=True)
+    pontos = Column(Integer, nullable=False)
+    motivo = Column(String(50), nullable=False) # relato, relato_anexado, conquista ou manual
+    referencia_id = Column(Integer) # Alerta, relato anexado ou conquista que gerou os pontos
+    data_lancamento = Column(TIMESTAMP, default=datetime.now)
+
+    # Relatos de antes de relatos_processados: o lançamento (motivo, referencia_id) indica que já foram processados
+    __table_args__ = (
+        Index("ix_pontos_lanc_motivo_ref", "motivo", "referencia_id"),
+    )
+
+# Relatos já processados pela gamificação (regiões, pontos e conquistas): a marca de idempotência dos jobs
+# Fica separada do extrato porque, com o write-behind dos pontos, o lançamento só é gravado depois
+class RelatoProcessado(Base):
+    __tablename__ = "relatos_processados"
+
+    tipo = Column(String(20), primary_key=True) # relato (alerta) ou relato_anexado
+    referencia_id = Column(Integer, primary_key=True) # ID do alerta ou do relato anexado
+    processado_em = Column(TIMESTAMP, default=datetime.now)
+
+# Contadores por usuário usados pelas regras de conquistas (ver conquistas.py)
+# São mantidos de forma incremental a cada relato, em vez de recalculados a partir de alertas
+class UsuarioEstatistica(Base):
+    __tablename__ = "usuario_estatisticas"
+
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), primary_key=True)
+    relatos = Column(Integer, default=0, nullable=False)
+    relatos_noturnos = Column(Integer, default=0, nullable=False)
+    relatos_validados = Column(Integer, default=0, nullable=False)
+    regioes_distintas = Column(Integer, default=0, nullable=False)
+    dias_distintos = Column(Integer, default=0, nullable=False)
+
+# Regiões em que cada usuário já relatou (base do contador regioes_distintas)
+class UsuarioRegiao(Base):
+    __tablename__ = "usuario_regioes"
+
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), primary_key=True)
+    regiao = Column(String(20), primary_key=True)
+
+# Dias (AAAA-MM-DD) em que cada usuário já relatou (base do contador dias_distintos)
+class UsuarioDia(Base):
+    __tablename__ = "usuario_dias"
+
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'), primary_key=True)
+    dia = Column(String(10), primary_key=True)
+
+# Contadores agregados dos alertas para o painel (ver estatisticas.py)
+# dimensao: total, status, tipo, abertos_tipo, regiao, dia ou hora; chave: o valor da dimensão
+# Atualizados na mesma transação que cria, altera ou remove o alerta
+class AlertaContador(Base):
+    __tablename__ = "alerta_contadores"
+
+    dimensao = Column(String(20), primary_key=True)
+    chave = Column(String(255), primary_key=True)
+    total = Column(Integer, default=0, nullable=False)
+
+# Contadores monotônicos por nome (ex.: "alertas", a versão das alterações de alertas; ver versoes.py)
+class Sequencia(Base):
+    __tablename__ = "sequencias"
+
+    nome = Column(String(50), primary_key=True)
+    valor = Column(Integer, default=0, nullable=False)
 
 # Definir o modelo SQLAlchemy (Tabela) para Região
 class Regiao(Base):
@@ -66,6 +171,28 @@ class Regiao(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String(100), unique=True, index=True)
+    geometria = Column(Text) # GeoJSON (Polygon ou MultiPolygon) com o contorno da região (ver regioes.py)
+
+# Associação entre Alertas e Regiões, preenchida na inserção do alerta a partir do índice de regiões
+class AlertaRegiao(Base):
+    __tablename__ = "alerta_regiao"
+
+    alerta_id = Column(Integer, ForeignKey('alertas.id', ondelete="CASCADE"), primary_key=True)
+    regiao_id = Column(Integer, ForeignKey('regioes.id', ondelete="CASCADE"), primary_key=True)
+
+    # A chave primária começa por alerta_id; os alertas de uma região são lidos por (regiao_id, alerta_id)
+    __table_args__ = (
+        Index("ix_alerta_regiao_regiao_alerta", "regiao_id", "alerta_id"),
+    )
+
+# Alertas arquivados por região e usuário: as associações saem de alerta_regiao junto com o alerta,
+# e os contadores do painel e os rankings das regiões continuam com os totais históricos
+class RegiaoUsuarioArquivado(Base):
+    __tablename__ = "regiao_usuarios_arquivados"
+
+    regiao_id = Column(Integer, ForeignKey('regioes.id', ondelete="CASCADE"), primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id', ondelete="CASCADE"), primary_key=True)
+    alertas = Column(Integer, default=0, nullable=False)
 
 # --- Modelos Pydantic (Schemas) --- #
 
@@ -110,10 +237,57 @@ class AlertaSchema(AlertaBase):
     id: int
     status: str
     data_ocorrencia: str
+    relatos: int = 1 # Quantos relatos foram agrupados neste incidente
+
+    class Config:
+        from_attributes = True
+
+# Relato anexado a um incidente (GET /alertas/{id}/relatos)
+class AlertaRelatoSchema(BaseModel):
+    id: int
+    alerta_id: int
+    usuario_id: int
+    titulo: str
+    descricao: Optional[str] = None
+    latitude: float
+    longitude: float
+    data_relato: str
 
     class Config:
         from_attributes = True
 
+# Cluster de alertas de uma célula do mapa (GET /alertas/clusters)
+class ClusterSchema(BaseModel):
+    latitude: float # Centroide dos alertas da célula
+    longitude: float
+    contagem: int
+    tipo: Optional[str] = None # Tipo mais frequente
+    status: Optional[str] = None # Pior status presente (ver clusters.ORDEM_STATUS)
+    alerta_id: Optional[int] = None # Preenchido quando a célula tem um único alerta
+
+# Resumo dos alertas para o painel (GET /alertas/estatisticas)
+class EstatisticasAlertasSchema(BaseModel):
+    total: int
+    abertos: int
+    por_status: Dict[str, int]
+    por_tipo: Dict[str, int]
+    abertos_por_tipo: Dict[str, int]
+    por_regiao: Dict[str, int] # Chave: ID da região
+    por_dia: Dict[str, int] # Chave: AAAA-MM-DD
+    por_hora: Dict[str, int] # Chave: AAAA-MM-DD HH
+
+# Linha do ranking (GET /ranking): pontos no ranking geral, alertas abertos no ranking de uma região
+class RankingItemSchema(BaseModel):
+    posicao: int
+    usuario_id: int
+    nome: Optional[str] = None
+    pontos: Optional[int] = None
+    alertas: Optional[int] = None
+
+# Posição de um usuário (GET /usuarios/{id}/ranking)
+class RankingUsuarioSchema(RankingItemSchema):
+    participantes: int # Quantos usuários estão no ranking
+
 class UsuarioBase(BaseModel):
     nome: str
     email: str
@@ -134,7 +308,7 @@ class RegiaoBase(BaseModel):
     nome: str
 
 class RegiaoCreate(RegiaoBase):
-    pass
+    geometria: Optional[dict] = None # GeoJSON Polygon ou MultiPolygon, coordenadas em [longitude, latitude]
 
 class RegiaoSchema(RegiaoBase):
     id: int
@@ -150,4 +324,53 @@ class RelatoCreate(BaseModel):
     tipo: str
     descricao: str
     latitude: float
-    longitude: float 
\ No newline at end of file
+    longitude: float 
+
+# Alterações desde uma versão (GET /alertas/sync)
+class AlertaSyncSchema(BaseModel):
+    versao: int # Versão a enviar como ?desde= na próxima chamada
+    alertas: List[AlertaSchema] # Criados ou alterados desde a versão pedida
+    removidos: List[int] # IDs dos alertas removidos desde a versão pedida
+    arquivados: List[int] = [] # IDs dos alertas movidos para o histórico (GET /alertas/historico) desde a versão pedida
+    mais: bool # Há mais alterações: chamar de novo com a nova versão
+    carga: bool = False # Página da carga inicial: a próxima chamada também leva carga=true
+    resincronizar: bool = False # desde anterior ao expurgo dos tombstones: descartar os alertas locais e chamar com desde=0
+    desde_minimo: int = 0 # Menor desde aceito sem resincronizar (versões até ele já tiveram os tombstones expurgados)
+
+class ResultadoItemLote(BaseModel):
+    indice: int # Posição do item na lista enviada
+    id: Optional[int] = None # ID do alerta criado, se o item foi aceito
+    erro: Optional[str] = None # Motivo da rejeição, se o item foi recusado
+
+class ResultadoLote(BaseModel):
+    inseridos: int
+    rejeitados: int
+    resultados: List[ResultadoItemLote]
+
+# Seleção de alertas para a moderação em lote (PUT /alertas/status e DELETE /alertas)
+# Por lista de IDs e/ou por filtro; todos os critérios informados precisam ser atendidos
+class SelecaoAlertas(BaseModel):
+    ids: Optional[List[int]] = None
+    tipo: Optional[str] = None
+    regiao_id: Optional[int] = None
+    status_atual: Optional[str] = None
+    antes_de: Optional[datetime] = None # Só alertas com data_ocorrencia anterior (idade mínima)
+
+class AlertaUpdateStatusLote(SelecaoAlertas):
+    status: str # Novo status
+
+class ResultadoModeracao(BaseModel):
+    alterados: int
+    nao_encontrados: List[int] = [] # IDs pedidos que não existem ou já foram removidos
+
+# Estado da fila local de jobs (GET /jobs/status)
+class FilaJobsStatusSchema(BaseModel):
+    ativa: bool
+    workers: int
+    pendentes: int = 0
+    executando: int = 0
+    concluidos: int = 0
+    falhos: int = 0
+    por_tipo: Dict[str, int] = {} # Jobs pendentes ou em execução por tipo
+    atraso_s: float = 0.0 # Idade do job pendente mais antigo
+    falhas_recentes: List[dict] = []
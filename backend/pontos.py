@@ -0,0 +1,184 @@
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+import database
+import models
+import conquistas
+
+# Pontos ganhos por relato enviado
+PONTOS_POR_RELATO = 10
+
+# Pontos por nível (nível = pontos // PONTOS_POR_NIVEL + 1)
+PONTOS_POR_NIVEL = 100
+
+# Write-behind: com PONTOS_WRITE_BEHIND=1 os pontos dos relatos são acumulados em memória
+# e gravados a cada PONTOS_INTERVALO_S segundos, uma atualização por usuário
+WRITE_BEHIND = os.getenv("PONTOS_WRITE_BEHIND", "false").lower() in ("1", "true", "sim", "yes")
+INTERVALO_S = float(os.getenv("PONTOS_INTERVALO_S", "1.0"))
+
+_usuarios = models.Usuario.__table__
+
+# pontos = pontos + n e o nível recalculado no próprio banco, sem ler o valor antes
+_somar_pontos = (
+    update(_usuarios)
+    .where(_usuarios.c.id == bindparam("b_id"))
+    .values(
+        pontos=_usuarios.c.pontos + bindparam("b_pontos"),
+        nivel=(_usuarios.c.pontos + bindparam("b_pontos")) // PONTOS_POR_NIVEL + 1,
+    )
+)
+
+
+def nivel_de(pontos):
+    return (pontos or 0) // PONTOS_POR_NIVEL + 1
+
+
+def creditar(db: Session, usuario_id: int, pontos: int, motivo: str, referencia_id=None):
+    """Soma pontos ao usuário com um UPDATE atômico e registra o lançamento (sem commit).
+
+    Retorna (pontos, nivel) depois da soma, ou None se o usuário não existe.
+    """
+    linha = db.execute(
+        _somar_pontos.returning(_usuarios.c.pontos, _usuarios.c.nivel),
+        {"b_id": usuario_id, "b_pontos": pontos}
+    ).first()
+    if linha is None:
+        return None
+    db.execute(insert(models.PontoLancamento), [{
+        "usuario_id": usuario_id,
+        "pontos": pontos,
+        "motivo": motivo,
+        "referencia_id": referencia_id,
+        "data_lancamento": datetime.now(),
+    }])
+
+    # Manter o objeto já carregado na sessão coerente com o banco, sem marcá-lo como alterado
+    usuario = db.identity_map.get(identity_key(models.Usuario, usuario_id))
+    if usuario is not None:
+        set_committed_value(usuario, "pontos", linha[0])
+        set_committed_value(usuario, "nivel", linha[1])
+    return linha[0], linha[1]
+
+
+def creditar_lancamentos(db: Session, lancamentos):
+    """Grava vários lançamentos [(usuario_id, pontos, motivo, referencia_id)] de uma vez (sem commit).
+
+    Um INSERT em lote no extrato e um UPDATE por usuário (executemany), com as somas já agregadas.
+    Lançamentos de usuários que não existem são descartados. Retorna os IDs dos usuários creditados.
+    """
+    if not lancamentos:
+        return []
+    ids = {usuario_id for usuario_id, _, _, _ in lancamentos}
+    existentes = set(db.scalars(select(models.Usuario.id).where(models.Usuario.id.in_(ids))))
+    lancamentos = [lancamento for lancamento in lancamentos if lancamento[0] in existentes]
+    if not lancamentos:
+        return []
+
+    somas = defaultdict(int)
+    agora = datetime.now()
+    linhas = []
+    for usuario_id, pontos, motivo, referencia_id in lancamentos:
+        somas[usuario_id] += pontos
+        linhas.append({
+            "usuario_id": usuario_id,
+            "pontos": pontos,
+            "motivo": motivo,
+            "referencia_id": referencia_id,
+            "data_lancamento": agora,
+        })
+    db.execute(insert(models.PontoLancamento), linhas)
+    db.execute(_somar_pontos, [{"b_id": usuario_id, "b_pontos": total} for usuario_id, total in somas.items()])
+
+    # Objetos já carregados na sessão passam a refletir o banco na próxima leitura
+    for usuario_id in somas:
+        usuario = db.identity_map.get(identity_key(models.Usuario, usuario_id))
+        if usuario is not None:
+            db.expire(usuario, ["pontos", "nivel"])
+    return list(somas)
+
+
+class AgregadorPontos:
+    """Write-behind dos pontos: junta os lançamentos pequenos e grava um UPDATE por usuário a cada intervalo.
+
+    O usuário padrão (id 1) recebe todos os relatos; em vez de uma atualização (e um
+    bloqueio da linha dele) por relato, há uma por intervalo. Os lançamentos ainda não
+    gravados ficam só na memória do processo: uma queda perde no máximo um intervalo.
+    Depois de cada gravação as conquistas por pontos são reavaliadas e
+    `ao_descarregar({usuario_id: pontos})` é chamado para atualizar caches e ranking.
+    """
+
+    def __init__(self, intervalo_s=INTERVALO_S, ativo=WRITE_BEHIND):
+        self.intervalo_s = intervalo_s
+        self.ativo = ativo
+        self.ao_descarregar = None
+        self._pendentes = []
+        self._lock = threading.Lock()
+        self._tarefa = None
+
+    def __len__(self):
+        return len(self._pendentes)
+
+    def registrar(self, usuario_id, pontos, motivo, referencia_id=None):
+        with self._lock:
+            self._pendentes.append((usuario_id, pontos, motivo, referencia_id))
+
+    def descarregar(self):
+        """Grava os lançamentos pendentes em uma transação; retorna quantos foram gravados."""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, []
+        if not pendentes:
+            return 0
+
+        db = database.SessionLocal()
+        try:
+            ids = creditar_lancamentos(db, pendentes)
+            totais = {}
+            if ids:
+                for usuario in db.scalars(select(models.Usuario).where(models.Usuario.id.in_(ids))):
+                    conquistas.avaliar(db, usuario)
+                    totais[usuario.id] = usuario.pontos
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # Devolver os lançamentos para a próxima tentativa, antes dos que chegaram depois
+            with self._lock:
+                self._pendentes[:0] = pendentes
+            print(f"Erro ao gravar pontos acumulados: {e}")
+            return 0
+        finally:
+            db.close()
+
+        if self.ao_descarregar is not None and totais:
+            self.ao_descarregar(totais)
+        return len(pendentes)
+
+    async def _executar(self):
+        while True:
+            await asyncio.sleep(self.intervalo_s)
+            await asyncio.to_thread(self.descarregar)
+
+    def iniciar(self):
+        if self.ativo and self._tarefa is None:
+            self._tarefa = asyncio.get_running_loop().create_task(self._executar())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        await asyncio.to_thread(self.descarregar)
+
+
+# Agregador global usado pelas rotas de relatos
+agregador_pontos = AgregadorPontos()
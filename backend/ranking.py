@@ -0,0 +1,225 @@
+import random
+import threading
+
+# Níveis da skip list: com p = 1/2, 24 níveis atendem bem até ~16 milhões de usuários
+NIVEL_MAXIMO = 24
+
+
+class _No:
+    __slots__ = ("chave", "proximos", "larguras")
+
+    def __init__(self, chave, niveis):
+        self.chave = chave
+        self.proximos = [None] * niveis
+        # larguras[n]: quantos passos no nível 0 até proximos[n] (ou até o fim da lista)
+        self.larguras = [1] * niveis
+
+
+class ListaIndexavel:
+    """Skip list indexável: inserir, remover, posição de uma chave e acesso por índice em O(log n).
+
+    Cada ligação guarda quantos elementos ela pula, então a posição de uma chave é a
+    soma das larguras percorridas até ela. As chaves devem ser únicas e comparáveis.
+    """
+
+    def __init__(self, semente=None):
+        self._cabeca = _No(None, NIVEL_MAXIMO)
+        self._tamanho = 0
+        self._aleatorio = random.Random(semente)
+
+    def __len__(self):
+        return self._tamanho
+
+    def _sortear_niveis(self):
+        niveis = 1
+        while niveis < NIVEL_MAXIMO and self._aleatorio.random() < 0.5:
+            niveis += 1
+        return niveis
+
+    def _antecessores(self, chave):
+        # Para cada nível, o último nó com chave < chave e o passo (posição + 1) em que ele está
+        anteriores = [None] * NIVEL_MAXIMO
+        passos = [0] * NIVEL_MAXIMO
+        atual = self._cabeca
+        passo = 0
+        for nivel in reversed(range(NIVEL_MAXIMO)):
+            proximo = atual.proximos[nivel]
+            while proximo is not None and proximo.chave < chave:
+                passo += atual.larguras[nivel]
+                atual = proximo
+                proximo = atual.proximos[nivel]
+            anteriores[nivel] = atual
+            passos[nivel] = passo
+        return anteriores, passos
+
+    def inserir(self, chave):
+        anteriores, passos = self._antecessores(chave)
+        no = _No(chave, self._sortear_niveis())
+        passo_novo = passos[0] + 1
+        for nivel in range(NIVEL_MAXIMO):
+            anterior = anteriores[nivel]
+            if nivel < len(no.proximos):
+                # Tudo depois do nó novo anda uma posição
+                no.proximos[nivel] = anterior.proximos[nivel]
+                no.larguras[nivel] = passos[nivel] + anterior.larguras[nivel] + 1 - passo_novo
+                anterior.proximos[nivel] = no
+                anterior.larguras[nivel] = passo_novo - passos[nivel]
+            else:
+                anterior.larguras[nivel] += 1
+        self._tamanho += 1
+
+    def remover(self, chave):
+        anteriores, _ = self._antecessores(chave)
+        no = anteriores[0].proximos[0]
+        if no is None or no.chave != chave:
+            raise KeyError(chave)
+        for nivel in range(NIVEL_MAXIMO):
+            anterior = anteriores[nivel]
+            if anterior.proximos[nivel] is no:
+                anterior.larguras[nivel] += no.larguras[nivel] - 1
+                anterior.proximos[nivel] = no.proximos[nivel]
+            else:
+                anterior.larguras[nivel] -= 1
+        self._tamanho -= 1
+
+    def contar_menores(self, chave):
+        """Quantas chaves da lista são menores que `chave` (= posição 0-based dela)."""
+        _, passos = self._antecessores(chave)
+        return passos[0]
+
+    def fatia(self, inicio, quantidade):
+        """As `quantidade` chaves a partir da posição `inicio` (0-based)."""
+        if inicio >= self._tamanho or quantidade <= 0:
+            return []
+        alvo = inicio + 1
+        atual = self._cabeca
+        passo = 0
+        for nivel in reversed(range(NIVEL_MAXIMO)):
+            while atual.proximos[nivel] is not None and passo + atual.larguras[nivel] <= alvo:
+                passo += atual.larguras[nivel]
+                atual = atual.proximos[nivel]
+        chaves = []
+        while atual is not None and len(chaves) < quantidade:
+            chaves.append(atual.chave)
+            atual = atual.proximos[0]
+        return chaves
+
+
+class Ranking:
+    """Classificação de usuários por um valor (maior primeiro), com empates na mesma posição.
+
+    A chave na skip list é (-valor, usuario_id), então a posição de um usuário é
+    1 + quantos usuários têm valor maior que o dele ("1, 2, 2, 4").
+    """
+
+    def __init__(self):
+        self._lista = ListaIndexavel()
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._valores)
+
+    def definir(self, usuario_id, valor):
+        valor = valor or 0
+        with self._lock:
+            anterior = self._valores.get(usuario_id)
+            if anterior == valor:
+                return
+            if anterior is not None:
+                self._lista.remover((-anterior, usuario_id))
+            self._lista.inserir((-valor, usuario_id))
+            self._valores[usuario_id] = valor
+
+    def somar(self, usuario_id, delta):
+        with self._lock:
+            anterior = self._valores.get(usuario_id)
+            if anterior is not None:
+                self._lista.remover((-anterior, usuario_id))
+            valor = (anterior or 0) + delta
+            if valor > 0:
+                self._lista.inserir((-valor, usuario_id))
+                self._valores[usuario_id] = valor
+            else:
+                self._valores.pop(usuario_id, None)
+
+    def remover(self, usuario_id):
+        with self._lock:
+            anterior = self._valores.pop(usuario_id, None)
+            if anterior is not None:
+                self._lista.remover((-anterior, usuario_id))
+
+    def posicao(self, usuario_id):
+        """Retorna (posição, valor) do usuário, ou None se ele não está no ranking."""
+        with self._lock:
+            valor = self._valores.get(usuario_id)
+            if valor is None:
+                return None
+            # IDs são positivos: (-valor, 0) fica antes de todos os usuários com esse valor
+            return self._lista.contar_menores((-valor, 0)) + 1, valor
+
+    def topo(self, limite, deslocamento=0):
+        """Retorna [(posição, usuario_id, valor)] a partir da posição deslocamento + 1."""
+        with self._lock:
+            chaves = self._lista.fatia(deslocamento, limite)
+            resultado = []
+            for indice, (valor_negativo, usuario_id) in enumerate(chaves):
+                if resultado and resultado[-1][2] == -valor_negativo:
+                    posicao = resultado[-1][0]
+                elif indice == 0:
+                    posicao = self._lista.contar_menores((valor_negativo, 0)) + 1
+                else:
+                    posicao = deslocamento + indice + 1
+                resultado.append((posicao, usuario_id, -valor_negativo))
+            return resultado
+
+
+class RankingsPorRegiao:
+    """Um Ranking por região, pelo número de alertas que cada usuário abriu nela."""
+
+    def __init__(self):
+        self._rankings = {}
+        self._lock = threading.Lock()
+
+    def obter(self, regiao_id):
+        with self._lock:
+            ranking = self._rankings.get(regiao_id)
+            if ranking is None:
+                ranking = self._rankings[regiao_id] = Ranking()
+            return ranking
+
+    def consultar(self, regiao_id):
+        # Para leitura: não registra um ranking novo para uma região desconhecida
+        with self._lock:
+            ranking = self._rankings.get(regiao_id)
+        return ranking if ranking is not None else Ranking()
+
+    def somar(self, regiao_id, usuario_id, delta):
+        self.obter(regiao_id).somar(usuario_id, delta)
+
+    def carregar_regiao(self, regiao_id, contagens):
+        """Substitui o ranking da região; contagens é um iterável de (usuario_id, alertas)."""
+        ranking = Ranking()
+        for usuario_id, total in contagens:
+            ranking.definir(usuario_id, total)
+        with self._lock:
+            self._rankings[regiao_id] = ranking
+
+    def remover_regiao(self, regiao_id):
+        with self._lock:
+            self._rankings.pop(regiao_id, None)
+
+    def remover_usuario(self, usuario_id):
+        with self._lock:
+            rankings = list(self._rankings.values())
+        for ranking in rankings:
+            ranking.remover(usuario_id)
+
+    def limpar(self):
+        with self._lock:
+            self._rankings.clear()
+
+
+# Rankings globais usados pelas rotas da API
+ranking_usuarios = Ranking()
+rankings_regioes = RankingsPorRegiao()
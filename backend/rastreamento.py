@@ -0,0 +1,166 @@
+import contextlib
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import orjson
+
+from metricas import EstatisticasRequisicao, _requisicao_atual, _rotulos, metricas
+
+# Rastreamento estruturado das requisições (uma linha JSON por rastro), configurável pelo .env
+# RASTREAMENTO_ATIVO: liga/desliga os rastros (as métricas de /metrics continuam)
+# RASTREAMENTO_ARQUIVO: arquivo JSON Lines dos rastros; vazio grava na saída padrão
+# RASTREAMENTO_LENTO_MS: requisições acima deste tempo sempre geram rastro
+# RASTREAMENTO_AMOSTRAGEM: fração (0 a 1) das demais requisições que também geram rastro
+# LIMITE_N_MAIS_1: execuções da mesma instrução SQL numa requisição a partir das quais ela é marcada como N+1
+RASTREAMENTO_ATIVO = os.getenv("RASTREAMENTO_ATIVO", "true").lower() in ("1", "true", "sim", "yes")
+RASTREAMENTO_ARQUIVO = os.getenv("RASTREAMENTO_ARQUIVO", "")
+RASTREAMENTO_LENTO_MS = float(os.getenv("RASTREAMENTO_LENTO_MS", "500"))
+RASTREAMENTO_AMOSTRAGEM = float(os.getenv("RASTREAMENTO_AMOSTRAGEM", "0"))
+LIMITE_N_MAIS_1 = int(os.getenv("LIMITE_N_MAIS_1", "10"))
+
+# Rastros esperando a gravação; com a fila cheia os novos são descartados (a requisição nunca espera pelo disco)
+TAMANHO_FILA_RASTROS = 10000
+
+# Tamanho máximo do SQL copiado para o rastro
+MAX_CARACTERES_SQL = 300
+
+
+def evento(nome, **campos):
+    """Anota um evento no rastro da requisição em andamento (sem I/O; ignorado fora de requisições)."""
+    estatisticas = _requisicao_atual.get()
+    if estatisticas is None:
+        return
+    if estatisticas.eventos is None:
+        estatisticas.eventos = []
+    campos["evento"] = nome
+    campos["em_ms"] = round((time.perf_counter() - estatisticas.inicio) * 1000, 3) # desde o início da requisição
+    estatisticas.eventos.append(campos)
+
+
+def suspeitas_n_mais_1(estatisticas, limite=LIMITE_N_MAIS_1):
+    """Instruções SQL executadas limite vezes ou mais na mesma requisição, da mais repetida à menos."""
+    if estatisticas.consultas < limite:
+        return []
+    return [
+        {"sql": sql[:MAX_CARACTERES_SQL], "vezes": vezes, "db_ms": round(segundos * 1000, 3)}
+        for sql, (vezes, segundos) in sorted(estatisticas.instrucoes.items(), key=lambda item: -item[1][0])
+        if vezes >= limite
+    ]
+
+
+class Rastreador:
+    """Decide quais requisições geram rastro e grava os rastros numa thread própria.
+
+    O caminho da requisição só monta um dicionário e o coloca na fila; a serialização e a
+    escrita (arquivo ou stdout) ficam com a thread de gravação.
+    """
+
+    def __init__(self, arquivo=RASTREAMENTO_ARQUIVO, lento_ms=RASTREAMENTO_LENTO_MS, amostragem=RASTREAMENTO_AMOSTRAGEM):
+        self.arquivo = arquivo
+        self.lento_s = lento_ms / 1000
+        self.amostragem = amostragem
+        self._fila = queue.Queue(maxsize=TAMANHO_FILA_RASTROS)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.gravados = 0
+        self.descartados = 0
+        self.n_mais_1 = Counter() # (tipo, nome) -> requisições/jobs com suspeita de N+1
+
+    def observar(self, metodo, rota, codigo, duracao, estatisticas):
+        self.finalizar("http", f"{metodo} {rota}", duracao, estatisticas, codigo=codigo)
+
+    def finalizar(self, tipo, nome, duracao, estatisticas, **campos):
+        suspeitas = suspeitas_n_mais_1(estatisticas)
+        if suspeitas:
+            motivo = "n_mais_1"
+            self.n_mais_1[(tipo, nome)] += 1
+        elif campos.get("codigo", 200) >= 500 or "erro" in campos:
+            motivo = "erro"
+        elif duracao >= self.lento_s:
+            motivo = "lenta"
+        elif self.amostragem and random.random() < self.amostragem:
+            motivo = "amostra"
+        else:
+            return
+
+        rastro = {
+            "momento": datetime.now().isoformat(timespec="milliseconds"),
+            "tipo": tipo,
+            "nome": nome,
+            **campos,
+            "motivo": motivo,
+            "ms": round(duracao * 1000, 3),
+            "consultas": estatisticas.consultas,
+            "db_ms": round(estatisticas.tempo_db * 1000, 3),
+        }
+        if suspeitas:
+            rastro["n_mais_1"] = suspeitas
+        if estatisticas.eventos:
+            rastro["eventos"] = estatisticas.eventos
+        self._enfileirar(rastro)
+
+    def _enfileirar(self, rastro):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._gravar, name="rastreamento", daemon=True)
+                    self._thread.start()
+        try:
+            self._fila.put_nowait(rastro)
+        except queue.Full:
+            self.descartados += 1
+
+    def _gravar(self):
+        saida = open(self.arquivo, "ab") if self.arquivo else sys.stdout.buffer
+        while True:
+            rastro = self._fila.get()
+            saida.write(orjson.dumps(rastro) + b"\n")
+            self.gravados += 1
+            if self._fila.empty():
+                saida.flush()
+
+    def exportar_metricas(self):
+        linhas = [
+            "# HELP rede_alerta_n_mais_1_total Requisições e jobs com a mesma instrução SQL repetida (suspeita de N+1)",
+            "# TYPE rede_alerta_n_mais_1_total counter",
+        ]
+        for (tipo, nome), total in sorted(self.n_mais_1.items()):
+            linhas.append(f"rede_alerta_n_mais_1_total{{{_rotulos(tipo=tipo, nome=nome)}}} {total}")
+        linhas.append("# TYPE rede_alerta_rastros_gravados_total counter")
+        linhas.append(f"rede_alerta_rastros_gravados_total {self.gravados}")
+        linhas.append("# TYPE rede_alerta_rastros_descartados_total counter")
+        linhas.append(f"rede_alerta_rastros_descartados_total {self.descartados}")
+        return linhas
+
+
+rastreador = Rastreador()
+
+
+@contextlib.contextmanager
+def rastrear(tipo, nome):
+    """Rastreia uma unidade de trabalho fora do HTTP (ex.: um job da fila) como se fosse uma requisição."""
+    if not RASTREAMENTO_ATIVO:
+        yield
+        return
+    estatisticas = EstatisticasRequisicao()
+    token = _requisicao_atual.set(estatisticas)
+    campos = {}
+    try:
+        yield
+    except Exception as e:
+        campos["erro"] = repr(e)[:MAX_CARACTERES_SQL]
+        raise
+    finally:
+        _requisicao_atual.reset(token)
+        rastreador.finalizar(tipo, nome, time.perf_counter() - estatisticas.inicio, estatisticas, **campos)
+
+
+if RASTREAMENTO_ATIVO:
+    metricas.observadores.append(rastreador.observar)
+    metricas.coletores.append(rastreador.exportar_metricas)
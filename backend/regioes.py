@@ -0,0 +1,185 @@
+import json
+import math
+import threading
+
+# Máximo de filhos por nó da árvore de regiões
+CAPACIDADE_NO = 16
+
+
+def normalizar_geometria(geometria):
+    """Converte uma geometria GeoJSON (Polygon ou MultiPolygon) em [polígono], polígono = [anel], anel = [(lon, lat)].
+
+    Aceita o dict ou o texto JSON gravado em Regiao.geometria. Levanta ValueError se a geometria for inválida.
+    """
+    if isinstance(geometria, str):
+        geometria = json.loads(geometria)
+    if not isinstance(geometria, dict):
+        raise ValueError("A geometria deve ser um objeto GeoJSON")
+
+    tipo = geometria.get("type")
+    coordenadas = geometria.get("coordinates")
+    if tipo == "Polygon":
+        coordenadas = [coordenadas]
+    elif tipo != "MultiPolygon":
+        raise ValueError("A geometria deve ser do tipo Polygon ou MultiPolygon")
+
+    poligonos = []
+    try:
+        for poligono in coordenadas:
+            aneis = []
+            for anel in poligono:
+                pontos = [(float(ponto[0]), float(ponto[1])) for ponto in anel]
+                if len(pontos) < 3:
+                    raise ValueError("Cada anel do polígono precisa de pelo menos 3 pontos")
+                aneis.append(pontos)
+            if not aneis:
+                raise ValueError("Polígono sem anéis")
+            poligonos.append(aneis)
+    except (TypeError, IndexError):
+        raise ValueError("Coordenadas da geometria em formato inválido")
+    if not poligonos:
+        raise ValueError("A geometria não tem polígonos")
+    return poligonos
+
+
+def _ponto_no_anel(lon, lat, anel):
+    # Teste do raio (ray casting): conta quantas arestas o raio horizontal a partir do ponto cruza
+    dentro = False
+    x_anterior, y_anterior = anel[-1]
+    for x, y in anel:
+        if (y > lat) != (y_anterior > lat):
+            x_cruzamento = x + (lat - y) * (x_anterior - x) / (y_anterior - y)
+            if lon < x_cruzamento:
+                dentro = not dentro
+        x_anterior, y_anterior = x, y
+    return dentro
+
+
+def ponto_na_geometria(latitude, longitude, poligonos):
+    for aneis in poligonos:
+        # Dentro do contorno externo e fora de todos os buracos
+        if _ponto_no_anel(longitude, latitude, aneis[0]) and not any(
+            _ponto_no_anel(longitude, latitude, buraco) for buraco in aneis[1:]
+        ):
+            return True
+    return False
+
+
+def caixa_da_geometria(poligonos):
+    # (min_lon, min_lat, max_lon, max_lat) dos contornos externos
+    pontos = [ponto for aneis in poligonos for ponto in aneis[0]]
+    return (
+        min(ponto[0] for ponto in pontos),
+        min(ponto[1] for ponto in pontos),
+        max(ponto[0] for ponto in pontos),
+        max(ponto[1] for ponto in pontos),
+    )
+
+
+def _caixa_do_grupo(caixas):
+    return (
+        min(caixa[0] for caixa in caixas),
+        min(caixa[1] for caixa in caixas),
+        max(caixa[2] for caixa in caixas),
+        max(caixa[3] for caixa in caixas),
+    )
+
+
+def _empacotar(itens, capacidade):
+    # Sort-Tile-Recursive: fatias verticais pelo centro x, e dentro de cada fatia grupos pelo centro y
+    # itens são (caixa, conteúdo); devolve os nós do nível de cima no mesmo formato
+    total_nos = math.ceil(len(itens) / capacidade)
+    tamanho_fatia = capacidade * math.ceil(math.sqrt(total_nos))
+    itens = sorted(itens, key=lambda item: item[0][0] + item[0][2])
+    nos = []
+    for inicio in range(0, len(itens), tamanho_fatia):
+        fatia = sorted(itens[inicio:inicio + tamanho_fatia], key=lambda item: item[0][1] + item[0][3])
+        for inicio_grupo in range(0, len(fatia), capacidade):
+            grupo = fatia[inicio_grupo:inicio_grupo + capacidade]
+            nos.append((_caixa_do_grupo([item[0] for item in grupo]), grupo))
+    return nos
+
+
+class IndiceRegioes:
+    """Árvore de caixas envolventes (R-tree montada por STR) sobre as geometrias das regiões.
+
+    A busca de um ponto desce só pelos nós cuja caixa contém o ponto e faz o teste
+    ponto-no-polígono apenas nas regiões candidatas. Regiões mudam pouco (escritas
+    administrativas), então toda alteração remonta a árvore inteira, que é trocada
+    de uma vez: as consultas nunca veem uma árvore pela metade.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_NO):
+        self.capacidade = capacidade
+        self._geometrias = {}   # regiao_id -> [polígono]
+        self._raiz = None       # (caixa, filhos, altura, geometrias); altura 0 = folha com (caixa, regiao_id)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._geometrias)
+
+    def carregar(self, regioes):
+        """Substitui o conteúdo do índice; regioes é um iterável de (id, geometria)."""
+        geometrias = {}
+        for regiao_id, geometria in regioes:
+            if geometria:
+                geometrias[regiao_id] = normalizar_geometria(geometria)
+        with self._lock:
+            self._geometrias = geometrias
+            self._remontar()
+
+    def definir(self, regiao_id, geometria):
+        poligonos = normalizar_geometria(geometria) if geometria else None
+        with self._lock:
+            # Copiar em vez de alterar: consultas em andamento seguem com o dicionário antigo
+            geometrias = dict(self._geometrias)
+            if poligonos is None:
+                geometrias.pop(regiao_id, None)
+            else:
+                geometrias[regiao_id] = poligonos
+            self._geometrias = geometrias
+            self._remontar()
+
+    def remover(self, regiao_id):
+        self.definir(regiao_id, None)
+
+    def geometria(self, regiao_id):
+        return self._geometrias.get(regiao_id)
+
+    def _remontar(self):
+        # Chamado com o lock; a raiz e as geometrias são publicadas juntas em uma tupla
+        nivel = [(caixa_da_geometria(poligonos), regiao_id) for regiao_id, poligonos in self._geometrias.items()]
+        if not nivel:
+            self._raiz = None
+            return
+        altura = 0
+        nivel = _empacotar(nivel, self.capacidade)
+        while len(nivel) > 1:
+            altura += 1
+            nivel = _empacotar(nivel, self.capacidade)
+        caixa, filhos = nivel[0]
+        self._raiz = (caixa, filhos, altura, self._geometrias)
+
+    def localizar(self, latitude, longitude):
+        """Retorna os IDs (ordenados) das regiões que contêm o ponto."""
+        raiz = self._raiz
+        if raiz is None or latitude is None or longitude is None:
+            return []
+        geometrias = raiz[3]
+        encontradas = []
+        pilha = [(raiz[1], raiz[2])]
+        while pilha:
+            filhos, altura = pilha.pop()
+            for caixa, conteudo in filhos:
+                if not (caixa[0] <= longitude <= caixa[2] and caixa[1] <= latitude <= caixa[3]):
+                    continue
+                if altura > 0:
+                    pilha.append((conteudo, altura - 1))
+                elif ponto_na_geometria(latitude, longitude, geometrias[conteudo]):
+                    encontradas.append(conteudo)
+        encontradas.sort()
+        return encontradas
+
+
+# Índice global das regiões usado pelas rotas da API
+indice_regioes = IndiceRegioes()
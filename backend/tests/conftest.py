@@ -0,0 +1,30 @@
+"""Ambiente dos testes: a API apontada para um SQLite temporário (WAL), como nos benchmarks.
+
+Os módulos leem a configuração do ambiente ao serem importados, então as variáveis abaixo
+precisam estar definidas antes do primeiro "import main" (feito uma vez por sessão de testes).
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+PASTA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PASTA_BACKEND not in sys.path:
+    sys.path.insert(0, PASTA_BACKEND)
+
+PASTA_TESTES = tempfile.mkdtemp(prefix="rede_alerta_testes_")
+os.environ.setdefault("DB_SQLITE_ARQUIVO", os.path.join(PASTA_TESTES, "testes.db"))
+os.environ.setdefault("FILA_JOBS_ATIVA", "0") # Jobs executados na hora: o resultado já está no banco na resposta
+os.environ.setdefault("FILA_JOBS_ARQUIVO", os.path.join(PASTA_TESTES, "fila_jobs.db"))
+os.environ.setdefault("ADMISSAO_ATIVA", "0")
+os.environ.setdefault("ARQUIVO_HISTORICO_DIR", os.path.join(PASTA_TESTES, "historico"))
+os.environ.setdefault("RASTREAMENTO_ARQUIVO", os.path.join(PASTA_TESTES, "rastros.jsonl"))
+
+from benchmarks._ambiente import preparar_api
+
+
+@pytest.fixture(scope="session")
+def api():
+    """Módulo main com as tabelas criadas e os dados iniciais (conquistas e usuário padrão)."""
+    return preparar_api(os.environ["DB_SQLITE_ARQUIVO"])
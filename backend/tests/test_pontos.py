@@ -0,0 +1,78 @@
+import threading
+
+from sqlalchemy import func, insert, select
+
+CREDITOS_POR_THREAD = 50
+THREADS = 8
+
+
+def _criar_usuario(database, models, email):
+    with database.SessionLocal() as db:
+        usuario_id = db.execute(
+            insert(models.Usuario).values(nome="Teste", email=email, senha_hashed="x", pontos=0, nivel=1)
+            .returning(models.Usuario.id)
+        ).scalar_one()
+        db.commit()
+    return usuario_id
+
+
+def _pontos_e_extrato(database, models, usuario_id):
+    with database.SessionLocal() as db:
+        pontos = db.scalar(select(models.Usuario.pontos).where(models.Usuario.id == usuario_id))
+        extrato = db.scalar(
+            select(func.coalesce(func.sum(models.PontoLancamento.pontos), 0))
+            .where(models.PontoLancamento.usuario_id == usuario_id)
+        )
+    return pontos, extrato
+
+
+def test_creditos_simultaneos_com_agregador_batem_com_o_extrato(api):
+    """creditar em várias threads e o write-behind gravando ao mesmo tempo: usuarios.pontos == SUM(pontos_lancamentos)."""
+    import database
+    import models
+    import pontos
+
+    usuario_id = _criar_usuario(database, models, "concorrencia.pontos@teste.local")
+    agregador = pontos.AgregadorPontos(ativo=True)
+    erros = []
+    parar = threading.Event()
+
+    def creditar_direto(thread):
+        try:
+            for credito in range(CREDITOS_POR_THREAD):
+                with database.SessionLocal() as db:
+                    pontos.creditar(db, usuario_id, pontos.PONTOS_POR_RELATO, "teste", thread * 1000 + credito)
+                    db.commit()
+        except Exception as e:
+            erros.append(e)
+
+    def creditar_agregado(thread):
+        for credito in range(CREDITOS_POR_THREAD):
+            agregador.registrar(usuario_id, pontos.PONTOS_POR_RELATO, "teste_agregado", thread * 1000 + credito)
+
+    def descarregar_sempre():
+        # Gravações do agregador disputando o banco com os créditos diretos (uma falha devolve os pendentes)
+        while not parar.is_set():
+            agregador.descarregar()
+
+    threads = [
+        threading.Thread(target=creditar_direto if indice % 2 else creditar_agregado, args=(indice,))
+        for indice in range(THREADS)
+    ]
+    descarga = threading.Thread(target=descarregar_sempre)
+    descarga.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    parar.set()
+    descarga.join()
+    for _ in range(10):
+        if not len(agregador):
+            break
+        agregador.descarregar()
+
+    assert not erros, erros
+    assert len(agregador) == 0
+    esperado = THREADS * CREDITOS_POR_THREAD * pontos.PONTOS_POR_RELATO
+    assert _pontos_e_extrato(database, models, usuario_id) == (esperado, esperado)
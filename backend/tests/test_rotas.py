@@ -0,0 +1,281 @@
+"""Testes das rotas exercitadas pelo benchmark de carga (benchmarks/bench_carga.py, CENARIOS).
+
+Cada rota é chamada sobre um banco pequeno e precisa responder com o código esperado; os caminhos
+otimizados (cursor, ETag, duplicatas, contadores, sync, arquivo histórico e ranking) também têm o
+conteúdo das respostas conferido. O desempenho continua sendo medido pelo benchmark.
+"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Centro dos dados de teste (São Paulo) e uma caixa de ~2 km em volta
+LAT, LON = -23.55, -46.63
+CAIXA = (LAT - 0.01, LON - 0.01, LAT + 0.01, LON + 0.01)
+TIPOS = ["Enchente", "Incêndio", "Deslizamento", "Queda de árvore"]
+
+
+def _bbox(min_lat, min_lon, max_lat, max_lon):
+    # Formato do parâmetro bbox das rotas: min_lon,min_lat,max_lon,max_lat
+    return f"{min_lon},{min_lat},{max_lon},{max_lat}"
+
+
+BBOX = _bbox(*CAIXA)
+
+
+def _poligono(min_lat, min_lon, max_lat, max_lon):
+    return {"type": "Polygon", "coordinates": [[
+        [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat],
+    ]]}
+
+
+def _relato(indice):
+    # Relatos do mesmo tipo a ~500 m um do outro (mais que RAIO_DUPLICATA_KM): nenhum é anexado a outro
+    return {
+        "titulo": f"Alagamento {indice}",
+        "tipo": TIPOS[indice % len(TIPOS)],
+        "descricao": f"Rua alagada perto da praça {indice}",
+        "latitude": LAT - 0.0045 + 0.0045 * (indice // len(TIPOS) % 3),
+        "longitude": LON - 0.0045 + 0.0045 * (indice // len(TIPOS) // 3 % 3),
+    }
+
+
+@pytest.fixture(scope="module")
+def cliente(api):
+    with TestClient(api.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture(scope="module")
+def dados(cliente):
+    regiao = cliente.post("/regioes/", json={"nome": "Centro (testes)", "geometria": _poligono(*CAIXA)})
+    assert regiao.status_code == 200, regiao.text
+    alertas = [cliente.post("/alertas/", json=_relato(indice)) for indice in range(9)]
+    assert all(resposta.status_code == 200 for resposta in alertas), [resposta.text for resposta in alertas]
+    assert len({resposta.json()["id"] for resposta in alertas}) == len(alertas) # Nenhum anexado como duplicata
+    usuario = cliente.post("/usuarios/", json={"nome": "Rotas", "email": "rotas@teste.local", "senha": "x"})
+    assert usuario.status_code == 200, usuario.text
+    return SimpleNamespace(
+        regiao_id=regiao.json()["id"],
+        alerta_ids=[resposta.json()["id"] for resposta in alertas],
+        usuario_id=usuario.json()["id"],
+    )
+
+
+LEITURAS = [
+    ("/", {}),
+    ("/metrics", {}),
+    ("/jobs/status", {}),
+    ("/alertas/", {}),
+    ("/alertas/", {"tipo": "Enchente", "limit": 50}),
+    ("/alertas/export", {"formato": "ndjson"}),
+    ("/alertas/export", {"formato": "csv"}),
+    ("/alertas/proximos", {"lat": LAT, "lon": LON, "raio_km": 1, "limit": 100}),
+    ("/alertas/area", {"min_lat": CAIXA[0], "min_lon": CAIXA[1], "max_lat": CAIXA[2], "max_lon": CAIXA[3]}),
+    ("/alertas/clusters", {"zoom": 12, "bbox": BBOX}),
+    ("/alertas/busca", {"q": "alagada praça", "limit": 20}),
+    ("/alertas/historico", {"limit": 50}),
+    ("/alertas/estatisticas", {}),
+    ("/alertas/sync", {"desde": 0, "limit": 500}),
+    ("/alertas/{alerta_id}", {}),
+    ("/alertas/{alerta_id}/relatos", {}),
+    ("/usuarios/", {"limit": 50}),
+    ("/usuarios/{usuario_id}", {}),
+    ("/usuarios/{usuario_id}/perfil", {}),
+    ("/usuarios/1/ranking", {}),
+    ("/ranking", {}),
+    ("/ranking", {"regiao_id": "{regiao_id}"}),
+    ("/regioes/", {}),
+    ("/regioes/{regiao_id}", {}),
+    ("/regioes/{regiao_id}/alertas", {}),
+    ("/conquistas/", {}),
+]
+# GET /alertas/stream fica de fora: o SSE não termina, e o TestClient só devolve a resposta completa
+
+
+@pytest.mark.parametrize("rota,parametros", LEITURAS)
+def test_leituras(cliente, dados, rota, parametros):
+    valores = {"alerta_id": dados.alerta_ids[0], "usuario_id": dados.usuario_id, "regiao_id": dados.regiao_id}
+    parametros = {nome: str(valor).format(**valores) for nome, valor in parametros.items()}
+    resposta = cliente.get(rota.format(**valores), params=parametros)
+    assert resposta.status_code == 200, resposta.text
+
+
+def test_clusters_da_caixa(cliente, dados):
+    clusters = cliente.get("/alertas/clusters", params={"zoom": 12, "bbox": BBOX}).json()
+    assert sum(cluster["contagem"] for cluster in clusters) >= len(dados.alerta_ids)
+    # No zoom máximo, o relato 8 é o único na sua posição: a célula aponta para o próprio alerta
+    relato = _relato(8)
+    em_volta = _bbox(relato["latitude"] - 0.0001, relato["longitude"] - 0.0001, relato["latitude"] + 0.0001, relato["longitude"] + 0.0001)
+    clusters = cliente.get("/alertas/clusters", params={"zoom": 22, "bbox": em_volta}).json()
+    assert [cluster["alerta_id"] for cluster in clusters] == [dados.alerta_ids[8]]
+
+
+def test_relato_duplicado_e_anexado_ao_incidente(cliente, dados):
+    # Mesmo tipo e mesma posição do relato 7, dentro da janela de duplicatas: vira relato do incidente existente
+    duplicado = dict(_relato(7), titulo="Alagamento 7 (de novo)")
+    resposta = cliente.post("/alertas/", json=duplicado)
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.json()["id"] == dados.alerta_ids[7] and resposta.json()["relatos"] >= 2
+    relatos = cliente.get(f"/alertas/{dados.alerta_ids[7]}/relatos").json()
+    assert duplicado["titulo"] in [relato["titulo"] for relato in relatos]
+
+
+def test_paginacao_por_cursor(cliente, dados):
+    # O lote grava todos com a mesma data_ocorrencia: a ordem e o cursor dependem do desempate por id
+    tipo = "Paginação (testes)"
+    lote = cliente.post("/alertas/lote", json=[
+        dict(_relato(indice), tipo=tipo, latitude=LAT + 0.5 + 0.01 * indice) for indice in range(25)
+    ])
+    ids = sorted((resultado["id"] for resultado in lote.json()["resultados"]), reverse=True)
+
+    def paginar(**filtros):
+        vistos, cursor = [], None
+        while True:
+            parametros = dict(filtros, limit=7, **({"cursor": cursor} if cursor else {}))
+            resposta = cliente.get("/alertas/", params=parametros)
+            assert resposta.status_code == 200, resposta.text
+            vistos += [alerta["id"] for alerta in resposta.json()]
+            cursor = resposta.headers.get("X-Proximo-Cursor")
+            if cursor is None:
+                return vistos
+
+    assert paginar(tipo=tipo) == ids
+    todos = paginar()
+    assert len(todos) == len(set(todos))
+    assert todos == [alerta["id"] for alerta in cliente.get("/alertas/", params={"limit": 1000}).json()]
+
+
+def test_etag_das_regioes(cliente, dados):
+    primeira = cliente.get("/regioes/")
+    etag = primeira.headers["ETag"]
+    assert cliente.get("/regioes/", headers={"If-None-Match": etag}).status_code == 304
+
+    regiao_id = cliente.post("/regioes/", json={"nome": "ETag (testes)"}).json()["id"]
+    depois = cliente.get("/regioes/", headers={"If-None-Match": etag})
+    assert depois.status_code == 200 and depois.headers["ETag"] != etag
+    assert regiao_id in [regiao["id"] for regiao in depois.json()]
+    cliente.delete(f"/regioes/{regiao_id}")
+
+
+def test_estatisticas_acompanham_status_e_remocao(cliente, dados):
+    tipo, regiao = "Estatística (testes)", str(dados.regiao_id)
+    antes = cliente.get("/alertas/estatisticas").json()
+    criado = cliente.post("/alertas/", json=dict(_relato(0), tipo=tipo, latitude=LAT + 0.008)).json()
+
+    depois = cliente.get("/alertas/estatisticas").json()
+    assert depois["total"] == antes["total"] + 1 and depois["abertos"] == antes["abertos"] + 1
+    assert depois["por_tipo"][tipo] == 1 and depois["abertos_por_tipo"][tipo] == 1
+    assert depois["por_status"][criado["status"]] == antes["por_status"].get(criado["status"], 0) + 1
+    assert depois["por_regiao"][regiao] == antes["por_regiao"].get(regiao, 0) + 1
+
+    cliente.put(f"/alertas/{criado['id']}/status", json={"status": "Resolvido"})
+    resolvido = cliente.get("/alertas/estatisticas").json()
+    assert resolvido["total"] == depois["total"] and resolvido["abertos"] == antes["abertos"]
+    assert resolvido["por_status"]["Resolvido"] == antes["por_status"].get("Resolvido", 0) + 1
+    assert resolvido["abertos_por_tipo"].get(tipo, 0) == 0
+
+    cliente.delete(f"/alertas/{criado['id']}")
+    removido = cliente.get("/alertas/estatisticas").json()
+    assert removido["total"] == antes["total"] and removido["por_tipo"].get(tipo, 0) == 0
+    assert removido["por_status"].get("Resolvido", 0) == antes["por_status"].get("Resolvido", 0)
+    assert removido["por_regiao"].get(regiao, 0) == antes["por_regiao"].get(regiao, 0)
+
+
+def test_ranking_depois_de_creditar_pontos(cliente, dados):
+    primeiro, segundo = (
+        cliente.post("/usuarios/", json={"nome": nome, "email": f"{nome.lower()}@teste.local", "senha": "x"}).json()["id"]
+        for nome in ("Primeiro", "Segundo")
+    )
+    cliente.post(f"/usuarios/{segundo}/pontos", params={"pontos": 1_000_000})
+    cliente.post(f"/usuarios/{primeiro}/pontos", params={"pontos": 2_000_000})
+
+    topo = cliente.get("/ranking", params={"limit": 2}).json()
+    assert [(item["posicao"], item["usuario_id"], item["pontos"]) for item in topo] == [
+        (1, primeiro, 2_000_000), (2, segundo, 1_000_000),
+    ]
+    assert cliente.get(f"/usuarios/{segundo}/ranking").json()["posicao"] == 2
+    for usuario_id in (primeiro, segundo):
+        cliente.delete(f"/usuarios/{usuario_id}")
+
+
+def test_lote_e_moderacao(cliente, dados):
+    lote = cliente.post("/alertas/lote", json=[_relato(indice) for indice in range(20)] + [{"titulo": "incompleto"}])
+    assert lote.status_code == 200, lote.text
+    resultados = lote.json()["resultados"]
+    ids = [resultado["id"] for resultado in resultados if resultado["id"] is not None]
+    assert len(ids) == 20 and resultados[-1]["erro"]
+
+    um = cliente.put(f"/alertas/{ids[0]}/status", json={"status": "Em andamento"})
+    assert um.status_code == 200, um.text
+    varios = cliente.put("/alertas/status", json={"ids": ids[1:10] + dados.alerta_ids[:2], "status": "Resolvido"})
+    assert varios.status_code == 200, varios.text
+
+    removido = cliente.delete(f"/alertas/{ids[10]}")
+    assert removido.status_code == 200, removido.text
+    removidos = cliente.request("DELETE", "/alertas", json={"ids": ids[11:20]})
+    assert removidos.status_code == 200, removidos.text
+    assert cliente.get(f"/alertas/{ids[10]}").status_code == 404
+
+    sync = cliente.get("/alertas/sync", params={"desde": 1, "limit": 5000}).json()
+    assert set(ids[10:20]) <= set(sync["removidos"])
+    assert not set(ids[10:20]) & {alerta["id"] for alerta in sync["alertas"]}
+    assert {alerta["id"]: alerta["status"] for alerta in sync["alertas"] if alerta["id"] in ids[:2]} == {
+        ids[0]: "Em andamento", ids[1]: "Resolvido",
+    }
+
+
+def test_usuarios_e_regioes(cliente, dados):
+    usuario = cliente.post("/usuarios/", json={"nome": "Temporário", "email": "temporario@teste.local", "senha": "x"})
+    assert usuario.status_code == 200, usuario.text
+    usuario_id = usuario.json()["id"]
+    alterado = cliente.put(f"/usuarios/{usuario_id}", json={"nome": "Alterado", "email": "alterado@teste.local", "senha": "x"})
+    assert alterado.status_code == 200, alterado.text
+    assert cliente.post(f"/usuarios/{usuario_id}/pontos", params={"pontos": 10}).status_code == 200
+    assert cliente.post(f"/usuarios/{usuario_id}/conquistas/1").status_code in (200, 400)
+    assert cliente.delete(f"/usuarios/{usuario_id}").status_code == 200
+
+    regiao = cliente.post("/regioes/", json={"nome": "Temporária", "geometria": _poligono(*CAIXA)})
+    assert regiao.status_code == 200, regiao.text
+    regiao_id = regiao.json()["id"]
+    alterada = cliente.put(f"/regioes/{regiao_id}", json={"nome": "Temporária alterada", "geometria": _poligono(*CAIXA)})
+    assert alterada.status_code == 200, alterada.text
+    assert cliente.delete(f"/regioes/{regiao_id}").status_code == 200
+
+
+@pytest.mark.parametrize("rota", [
+    "/conquistas/recarregar",
+    "/alertas/estatisticas/reconstruir",
+    "/alertas/historico/arquivar",
+])
+def test_manutencao(cliente, dados, rota):
+    resposta = cliente.post(rota)
+    assert resposta.status_code == 200, resposta.text
+
+
+def test_arquivamento_no_sync_e_no_historico(cliente, dados):
+    # Por último: idade_dias=0 arquiva todos os alertas já resolvidos
+    tipo, latitude, longitude = "Arquivamento (testes)", LAT + 0.008, LON - 0.008
+    alerta_id = cliente.post("/alertas/", json=dict(_relato(0), tipo=tipo, latitude=latitude, longitude=longitude)).json()["id"]
+    cliente.put(f"/alertas/{alerta_id}/status", json={"status": "Resolvido"})
+    estatisticas = cliente.get("/alertas/estatisticas").json()
+    ranking_regiao = cliente.get("/ranking", params={"regiao_id": dados.regiao_id}).json()
+
+    arquivados = cliente.post("/alertas/historico/arquivar", params={"idade_dias": 0}).json()["arquivados"]
+    assert arquivados >= 1
+    assert cliente.get(f"/alertas/{alerta_id}").status_code == 404
+    sync = cliente.get("/alertas/sync", params={"desde": 1, "limit": 5000}).json()
+    assert alerta_id in sync["arquivados"] and alerta_id not in [alerta["id"] for alerta in sync["alertas"]]
+
+    def historico(**filtros):
+        return [alerta["id"] for alerta in cliente.get("/alertas/historico", params=dict(filtros, limit=5000)).json()]
+
+    assert historico(tipo=tipo) == [alerta_id]
+    em_volta = _bbox(latitude - 0.001, longitude - 0.001, latitude + 0.001, longitude + 0.001)
+    assert alerta_id in historico(bbox=em_volta)
+    assert historico(tipo=tipo, bbox=_bbox(LAT + 0.5, LON, LAT + 0.6, LON + 0.1)) == []
+    assert alerta_id not in historico(tipo=TIPOS[0])
+
+    # Contadores do painel e rankings das regiões são totais históricos: o arquivamento não muda nada
+    assert cliente.get("/alertas/estatisticas").json() == estatisticas
+    assert cliente.get("/ranking", params={"regiao_id": dados.regiao_id}).json() == ranking_regiao
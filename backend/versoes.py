@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+import models
+
+# Nome da sequência com a versão das alterações de alertas (linha criada junto com a tabela sequencias)
+SEQUENCIA_ALERTAS = "alertas"
+
+# Maior versão de tombstone já expurgada (linha criada junto com a tabela sequencias; ver expurgar_tombstones)
+SEQUENCIA_EXPURGO = "alertas_expurgo"
+
+# Dias que os tombstones (alertas removidos e arquivados) ficam para o sync dos clientes, configurável pelo .env
+# Um cliente que não sincroniza há mais tempo que isso recebe resincronizar=true e refaz a carga inicial
+TOMBSTONES_RETENCAO_DIAS = int(os.getenv("TOMBSTONES_RETENCAO_DIAS", "30"))
+
+# Versões tiradas do banco de uma vez: uma transação curta em sequencias a cada BLOCO_VERSOES alterações
+BLOCO_VERSOES = int(os.getenv("BLOCO_VERSOES", "100"))
+
+# Reserva sem commit nem rollback há mais que isso (sessão abandonada) deixa de segurar o sync
+VERSAO_PENDENTE_MAXIMA_S = 60
+
+# Chave em Session.info com as reservas da transação em andamento
+_CHAVE_SESSAO = "versoes_reservadas"
+
+
+class AlocadorVersoes:
+    """Versões das alterações de alertas, em ordem crescente, sem travar a transação de negócio.
+
+    Os blocos de versões saem da linha de sequencias numa transação própria (outra conexão do
+    pool, commit imediato), então nenhuma escrita fica esperando o commit de outra. Como as
+    versões passam a ser confirmadas fora de ordem, o alocador guarda as reservas ainda abertas:
+    o sync só entrega versões menores que a menor delas (menor_pendente), e um cliente que
+    sincronizou até V nunca perde uma versão menor confirmada depois.
+
+    As reservas abertas ficam na memória do processo: a garantia vale para um processo só
+    (o Procfile sobe um worker do uvicorn, como pedem os demais índices em memória).
+    """
+
+    def __init__(self, bloco=BLOCO_VERSOES):
+        self.bloco = bloco
+        self._proxima = 1
+        self._ultima = 0 # Última versão do bloco atual (0: nenhum bloco ainda)
+        self._pendentes = {} # Primeira versão de cada reserva aberta -> instante da reserva
+        self._lock = threading.Lock()
+
+    def _novo_bloco(self, db: Session, tamanho):
+        with db.get_bind().connect() as conexao:
+            ultima = conexao.scalar(
+                update(models.Sequencia)
+                .where(models.Sequencia.nome == SEQUENCIA_ALERTAS)
+                .values(valor=models.Sequencia.valor + tamanho)
+                .returning(models.Sequencia.valor)
+            )
+            conexao.commit()
+        if ultima is None:
+            raise RuntimeError(f"Sequência '{SEQUENCIA_ALERTAS}' ausente da tabela sequencias (ver create_tables.sql)")
+        return ultima - tamanho + 1, ultima
+
+    def reservar(self, db: Session, quantidade=1):
+        """Reserva `quantidade` versões consecutivas para a transação da sessão e devolve a primeira.
+
+        A reserva fica aberta até o fim da transação (commit, rollback ou close da sessão).
+        """
+        while True:
+            with self._lock:
+                if self._ultima - self._proxima + 1 >= quantidade:
+                    primeira = self._proxima
+                    self._proxima += quantidade
+                    self._pendentes[primeira] = time.monotonic()
+                    break
+            # Fora do lock: a rota async chega aqui pelo run_sync e a consulta devolve o loop
+            inicio, fim = self._novo_bloco(db, max(self.bloco, quantidade))
+            with self._lock:
+                # Blocos pedidos ao mesmo tempo: ficar com o mais alto (versões nunca voltam para trás)
+                if inicio > self._ultima:
+                    self._proxima, self._ultima = inicio, fim
+
+        if not db.in_transaction():
+            db.begin()
+        db.info.setdefault(_CHAVE_SESSAO, []).append(primeira)
+        return primeira
+
+    def liberar(self, primeiras):
+        with self._lock:
+            for primeira in primeiras:
+                self._pendentes.pop(primeira, None)
+
+    def menor_pendente(self, agora=None):
+        """Menor versão reservada por uma transação ainda aberta (None se não há nenhuma)."""
+        agora = time.monotonic() if agora is None else agora
+        with self._lock:
+            for primeira, instante in list(self._pendentes.items()):
+                if agora - instante > VERSAO_PENDENTE_MAXIMA_S:
+                    del self._pendentes[primeira]
+            return min(self._pendentes, default=None)
+
+
+# Alocador global usado pelas rotas de alertas e pelo arquivamento
+alocador_versoes = AlocadorVersoes()
+
+
+def reservar_versoes(db: Session, quantidade: int = 1):
+    """Reserva `quantidade` versões consecutivas de alertas para a transação da sessão e devolve a primeira."""
+    return alocador_versoes.reservar(db, quantidade)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _liberar_versoes(sessao, transacao):
+    # Só o fim da transação principal (não de um SAVEPOINT) encerra as reservas
+    if transacao.parent is None and _CHAVE_SESSAO in sessao.info:
+        alocador_versoes.liberar(sessao.info.pop(_CHAVE_SESSAO))
+
+
+def expurgar_tombstones(db: Session, agora=None, retencao_dias=TOMBSTONES_RETENCAO_DIAS):
+    """Apaga os tombstones mais antigos que `retencao_dias` (alertas removidos e arquivados) e faz commit.
+
+    A maior versão apagada passa a ser o horizonte (sequência SEQUENCIA_EXPURGO): um cliente com
+    desde menor pode ter perdido uma remoção, e o GET /alertas/sync pede que ele ressincronize.
+    Retorna quantos tombstones foram apagados.
+    """
+    limite = (agora or datetime.now()) - timedelta(days=retencao_dias)
+    horizonte = max(
+        db.scalar(select(func.max(models.Alerta.versao)).where(models.Alerta.removido_em < limite)) or 0,
+        db.scalar(select(func.max(models.AlertaArquivado.versao)).where(models.AlertaArquivado.arquivado_em < limite)) or 0,
+    )
+    if not horizonte:
+        return 0
+    # Horizonte e remoção na mesma transação: nenhum sync vê os tombstones sumirem antes do horizonte subir
+    db.execute(
+        update(models.Sequencia)
+        .where(models.Sequencia.nome == SEQUENCIA_EXPURGO, models.Sequencia.valor < horizonte)
+        .values(valor=horizonte)
+    )
+    total = db.execute(delete(models.Alerta).where(models.Alerta.removido_em < limite)).rowcount
+    total += db.execute(delete(models.AlertaArquivado).where(models.AlertaArquivado.arquivado_em < limite)).rowcount
+    db.commit()
+    return total
@@ -41,9 +41,66 @@ CREATE TABLE alertas (
     data_ocorrencia TIMESTAMP WITH TIME ZONE NOT NULL,
     status VARCHAR2(50) DEFAULT 'Aberto' NOT NULL,
     usuario_id NUMBER NOT NULL,
+    geocelula VARCHAR2(12), -- Geohash da posição, usado pelo índice espacial
+    relatos NUMBER DEFAULT 1 NOT NULL, -- Relatos agrupados neste incidente
+    versao NUMBER DEFAULT 0 NOT NULL, -- Versão da última alteração (sync incremental do app)
+    removido_em TIMESTAMP, -- Tombstone: preenchido quando o alerta é removido
     FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
 );
 
+-- Índice para consultas por célula de geohash
+CREATE INDEX ix_alertas_geocelula ON alertas (geocelula);
+
+-- Índices compostos para a paginação por cursor (data_ocorrencia, id) com filtros de status e tipo
+CREATE INDEX ix_alertas_data_id ON alertas (data_ocorrencia, id);
+CREATE INDEX ix_alertas_status_data_id ON alertas (status, data_ocorrencia, id);
+CREATE INDEX ix_alertas_tipo_data_id ON alertas (tipo, data_ocorrencia, id);
+
+-- Índice para o sync incremental (GET /alertas/sync: versao > desde)
+CREATE INDEX ix_alertas_versao ON alertas (versao);
+
+-- Dropar a tabela alertas_arquivados se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE alertas_arquivados CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Tombstones dos alertas movidos para o arquivo histórico (a linha sai de alertas; o sync só precisa do ID e da versão)
+CREATE TABLE alertas_arquivados (
+    id NUMBER PRIMARY KEY,
+    versao NUMBER NOT NULL,
+    arquivado_em TIMESTAMP NOT NULL
+);
+
+CREATE INDEX ix_alertas_arquivados_versao ON alertas_arquivados (versao);
+
+-- Dropar a tabela sequencias se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE sequencias CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Contadores monotônicos (ex.: versão das alterações de alertas), incrementados em blocos numa transação própria
+CREATE TABLE sequencias (
+    nome VARCHAR2(50) PRIMARY KEY,
+    valor NUMBER DEFAULT 0 NOT NULL
+);
+
+-- As linhas já nascem com a tabela: a aplicação só faz UPDATE (nenhuma escrita disputa o INSERT inicial)
+INSERT INTO sequencias (nome, valor) VALUES ('alertas', 0);
+INSERT INTO sequencias (nome, valor) VALUES ('alertas_expurgo', 0);
+COMMIT;
+
 -- Dropar a tabela regioes se existir (ignora erro se não existir)
 BEGIN
    EXECUTE IMMEDIATE 'DROP TABLE regioes CASCADE CONSTRAINTS';
@@ -58,7 +115,8 @@ END;
 -- Criar a tabela regioes
 CREATE TABLE regioes (
     id NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
-    nome VARCHAR2(100) NOT NULL UNIQUE
+    nome VARCHAR2(100) NOT NULL UNIQUE,
+    geometria CLOB -- GeoJSON (Polygon ou MultiPolygon) com o contorno da região
 );
 
 -- Tabela de associação entre Alertas e Regiões (Muitos-para-Muitos)
@@ -81,6 +139,30 @@ CREATE TABLE alerta_regiao (
     FOREIGN KEY (regiao_id) REFERENCES regioes(id) ON DELETE CASCADE
 );
 
+-- Índice para listar os alertas de uma região (GET /regioes/{id}/alertas)
+CREATE INDEX ix_alerta_regiao_regiao_alerta ON alerta_regiao (regiao_id, alerta_id);
+
+-- Dropar a tabela regiao_usuarios_arquivados se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE regiao_usuarios_arquivados CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Alertas arquivados por região e usuário (totais históricos do painel e dos rankings das regiões)
+CREATE TABLE regiao_usuarios_arquivados (
+    regiao_id NUMBER NOT NULL,
+    usuario_id NUMBER NOT NULL,
+    alertas NUMBER DEFAULT 0 NOT NULL,
+    PRIMARY KEY (regiao_id, usuario_id),
+    FOREIGN KEY (regiao_id) REFERENCES regioes(id) ON DELETE CASCADE,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
 -- Dropar a tabela conquistas se existir (ignora erro se não existir)
 BEGIN
    EXECUTE IMMEDIATE 'DROP TABLE conquistas CASCADE CONSTRAINTS';
@@ -121,4 +203,154 @@ CREATE TABLE usuario_conquista (
     PRIMARY KEY (usuario_id, conquista_id),
     FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE,
     FOREIGN KEY (conquista_id) REFERENCES conquistas(id) ON DELETE CASCADE
-); 
\ No newline at end of file
+); 
+
+-- Dropar a tabela usuario_estatisticas se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE usuario_estatisticas CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Contadores por usuário usados pelas regras de conquistas
+CREATE TABLE usuario_estatisticas (
+    usuario_id NUMBER PRIMARY KEY,
+    relatos NUMBER DEFAULT 0 NOT NULL,
+    relatos_noturnos NUMBER DEFAULT 0 NOT NULL,
+    relatos_validados NUMBER DEFAULT 0 NOT NULL,
+    regioes_distintas NUMBER DEFAULT 0 NOT NULL,
+    dias_distintos NUMBER DEFAULT 0 NOT NULL,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
+-- Dropar a tabela usuario_regioes se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE usuario_regioes CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Regiões em que cada usuário já relatou
+CREATE TABLE usuario_regioes (
+    usuario_id NUMBER NOT NULL,
+    regiao VARCHAR2(20) NOT NULL,
+    PRIMARY KEY (usuario_id, regiao),
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
+-- Dropar a tabela usuario_dias se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE usuario_dias CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Dias em que cada usuário já relatou
+CREATE TABLE usuario_dias (
+    usuario_id NUMBER NOT NULL,
+    dia VARCHAR2(10) NOT NULL,
+    PRIMARY KEY (usuario_id, dia),
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
+-- Dropar a tabela alerta_contadores se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE alerta_contadores CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Contadores agregados dos alertas (por status, tipo, região, dia e hora) para o painel
+CREATE TABLE alerta_contadores (
+    dimensao VARCHAR2(20) NOT NULL,
+    chave VARCHAR2(255) NOT NULL,
+    total NUMBER DEFAULT 0 NOT NULL,
+    PRIMARY KEY (dimensao, chave)
+);
+
+-- Dropar a tabela alerta_relatos se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE alerta_relatos CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Relatos duplicados anexados a um incidente já existente
+CREATE TABLE alerta_relatos (
+    id NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
+    alerta_id NUMBER NOT NULL,
+    usuario_id NUMBER NOT NULL,
+    titulo VARCHAR2(255) NOT NULL,
+    descricao VARCHAR2(500),
+    latitude NUMBER,
+    longitude NUMBER,
+    data_relato TIMESTAMP,
+    FOREIGN KEY (alerta_id) REFERENCES alertas(id) ON DELETE CASCADE,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+);
+
+CREATE INDEX ix_alerta_relatos_alerta_id ON alerta_relatos (alerta_id);
+
+-- Dropar a tabela pontos_lancamentos se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE pontos_lancamentos CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Extrato de pontos: um lançamento por crédito; usuarios.pontos é a soma deles
+CREATE TABLE pontos_lancamentos (
+    id NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
+    usuario_id NUMBER NOT NULL,
+    pontos NUMBER NOT NULL,
+    motivo VARCHAR2(50) NOT NULL,
+    referencia_id NUMBER,
+    data_lancamento TIMESTAMP DEFAULT SYSTIMESTAMP,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+);
+
+CREATE INDEX ix_pontos_lanc_usuario_id ON pontos_lancamentos (usuario_id);
+CREATE INDEX ix_pontos_lanc_motivo_ref ON pontos_lancamentos (motivo, referencia_id);
+
+-- Dropar a tabela relatos_processados se existir (ignora erro se não existir)
+BEGIN
+   EXECUTE IMMEDIATE 'DROP TABLE relatos_processados CASCADE CONSTRAINTS';
+EXCEPTION
+   WHEN OTHERS THEN
+      IF SQLCODE != -942 THEN
+         RAISE;
+      END IF;
+END;
+/
+
+-- Relatos já processados pelos jobs de gamificação (marca de idempotência, separada do extrato de pontos)
+CREATE TABLE relatos_processados (
+    tipo VARCHAR2(20) NOT NULL,
+    referencia_id NUMBER NOT NULL,
+    processado_em TIMESTAMP DEFAULT SYSTIMESTAMP,
+    PRIMARY KEY (tipo, referencia_id)
+);
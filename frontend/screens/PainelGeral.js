@@ -8,16 +8,29 @@ import { useCallback } from 'react';
 
 const PainelGeral = ({ navigation }) => {
   const [alertas, setAlertas] = useState([]);
+  const [proximoCursor, setProximoCursor] = useState(null);
+  const [carregandoMais, setCarregandoMais] = useState(false);
+
+  // Busca uma página de alertas (mais recentes primeiro); o backend devolve o cursor da próxima no header X-Proximo-Cursor
+  const buscarPagina = async (cursor) => {
+    const params = cursor ? `?limit=20&cursor=${encodeURIComponent(cursor)}` : '?limit=20';
+    const response = await fetch(`http://192.168.0.236:8000/alertas/${params}`);
+    if (!response.ok) {
+      throw new Error(`Erro ${response.status} ao buscar alertas`);
+    }
+    const data = await response.json();
+    return { data, cursor: response.headers.get('X-Proximo-Cursor') };
+  };
 
   useFocusEffect(
     useCallback(() => {
       const fetchAlertas = async () => {
         console.log('Buscando alertas...');
         try {
-          const response = await fetch('http://192.168.0.236:8000/alertas/');
-          const data = await response.json();
+          const { data, cursor } = await buscarPagina(null);
           console.log('Alertas recebidos:', data);
           setAlertas(data);
+          setProximoCursor(cursor);
         } catch (error) {
           console.error('Erro ao buscar alertas:', error);
         }
@@ -31,6 +44,23 @@ const PainelGeral = ({ navigation }) => {
     }, [])
   );
 
+  const handleCarregarMais = async () => {
+    if (!proximoCursor || carregandoMais) {
+      return;
+    }
+    setCarregandoMais(true);
+    try {
+      const { data, cursor } = await buscarPagina(proximoCursor);
+      setAlertas(anteriores => [...anteriores, ...data]);
+      setProximoCursor(cursor);
+    } catch (error) {
+      console.error('Erro ao carregar mais alertas:', error);
+      Alert.alert('Erro', `Falha ao carregar mais alertas: ${error.message}`);
+    } finally {
+      setCarregandoMais(false);
+    }
+  };
+
   const handleDeleteAlerta = async (id) => {
     console.log(`Deletando alerta com ID: ${id}`);
     try {
@@ -165,6 +195,13 @@ const PainelGeral = ({ navigation }) => {
               </View>
             ))
           )}
+          {proximoCursor && (
+            <TouchableOpacity onPress={handleCarregarMais} style={styles.loadMoreButton} disabled={carregandoMais}>
+              <Text style={styles.loadMoreButtonText}>
+                {carregandoMais ? 'Carregando...' : 'Carregar mais'}
+              </Text>
+            </TouchableOpacity>
+          )}
         </View>
 
       </ScrollView>
@@ -253,6 +290,17 @@ const styles = StyleSheet.create({
   deleteButton: {
     marginLeft: 5,
   },
+  loadMoreButton: {
+    backgroundColor: '#64B5F6',
+    paddingVertical: 10,
+    borderRadius: 10,
+    alignItems: 'center',
+  },
+  loadMoreButtonText: {
+    fontSize: 16,
+    fontWeight: 'bold',
+    color: '#FFFFFF',
+  },
 });
 
 export default PainelGeral; 
\ No newline at end of file